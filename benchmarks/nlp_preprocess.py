@@ -0,0 +1,95 @@
+"""
+Compares the throughput of the NLP preprocessing of comments, text by text with the full
+spaCy pipelines as before, and by batches with the unused components excluded.
+
+Needs the en_core_web_md and fr_core_news_md models and the NLTK stop words.
+Run from the root of the project:
+
+    python -m benchmarks.nlp_preprocess --texts 2000 --batch-size 64 --n-process 1
+"""
+import argparse
+import random
+import time
+
+import spacy
+from nltk.corpus import stopwords
+
+from utils.nlp import NlpPreprocess
+
+SAMPLES = {
+    "en": [
+        "The new dashboard is great, but the export button is hard to find.",
+        "It crashed twice while I was uploading my files, please fix it!",
+        "I like how fast the search results show up now.",
+        "Not sure what this feature is for, the documentation does not explain it.",
+    ],
+    "fr": [
+        "La nouvelle page est très claire, merci pour le travail.",
+        "Impossible de valider le formulaire, le bouton ne répond pas.",
+        "Les filtres sont pratiques mais un peu lents à charger.",
+        "Je ne trouve plus l'historique de mes commandes depuis la mise à jour.",
+    ],
+}
+
+
+def per_text(texts, pipelines, stop_words):
+    # The preprocessing as it was done before the batch API
+    results = []
+    for text, lang in texts:
+        doc = pipelines[lang](text)
+        results.append(
+            [t.lemma_ for t in doc if t.lemma_ not in stop_words[lang] and t.pos_ != "PUNCT"]
+        )
+    return results
+
+
+def measure(name, function, count):
+    start = time.perf_counter()
+    result = function()
+    duration = time.perf_counter() - start
+    print(f"{name:<30} {duration:8.2f} s {count / duration:10.1f} texts/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--n-process", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(0)
+    texts = []
+    for _ in range(args.texts):
+        lang = random.choice(list(SAMPLES))
+        texts.append((random.choice(SAMPLES[lang]), lang))
+
+    full_pipelines = {
+        lang: spacy.load(model) for lang, (model, _) in NlpPreprocess.LANGUAGES.items()
+    }
+    stop_words = {
+        lang: set(stopwords.words(nltk_lang))
+        for lang, (_, nltk_lang) in NlpPreprocess.LANGUAGES.items()
+    }
+    nlp_preprocess = NlpPreprocess(
+        {"use_nlp_preprocess": True, "nlp_batch_size": args.batch_size}
+    )
+
+    expected = measure(
+        "per text, full pipelines", lambda: per_text(texts, full_pipelines, stop_words), len(texts)
+    )
+    measure(
+        "per text, trimmed pipelines",
+        lambda: [nlp_preprocess.text_preprocess(text, lang) for text, lang in texts],
+        len(texts),
+    )
+    result = measure(
+        f"batches of {args.batch_size}, {args.n_process} process",
+        lambda: nlp_preprocess.texts_preprocess(texts, args.n_process),
+        len(texts),
+    )
+    print("Same lemmas:", result == expected)
+
+
+if __name__ == "__main__":
+    main()
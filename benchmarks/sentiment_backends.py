@@ -0,0 +1,102 @@
+"""
+Compares the sentiment analysis backends: the TensorFlow models as downloaded,
+their ONNX export and their ONNX export with int8 weights.
+
+Each backend is loaded in its own process, to measure the memory it needs.
+Needs the models downloaded by main.init_nlp under the models folder, TensorFlow
+and ONNX Runtime. The ONNX models are exported on the first run.
+Run from the root of the project:
+
+    python -m benchmarks.sentiment_backends --models-folder ./data/sentiment_models --texts 200 --batch-size 8
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import time
+
+import numpy as np
+
+from benchmarks.nlp_preprocess import SAMPLES
+from utils.nlp import SentimentAnalysis
+from utils.onnx_sentiment import export_onnx_model
+
+BACKENDS = {
+    "tensorflow": {"sentiment_analysis_backend": "tensorflow"},
+    "onnx": {"sentiment_analysis_backend": "onnx", "sentiment_onnx_quantize": False},
+    "onnx int8": {"sentiment_analysis_backend": "onnx", "sentiment_onnx_quantize": True},
+}
+
+
+def run_backend(name, models_folder, texts, batch_size, results):
+    start = time.perf_counter()
+    analysis = SentimentAnalysis(
+        {"use_sentiment_analysis": True, "sentiment_analysis_models_folder": models_folder, **BACKENDS[name]}
+    )
+    load = time.perf_counter() - start
+
+    latencies = []
+    labels = []
+    for text, lang in texts:
+        start = time.perf_counter()
+        labels.append(analysis.analyze(text, lang)[0])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for lang in SentimentAnalysis.LANGUAGES:
+        lang_texts = [text for text, text_lang in texts if text_lang == lang]
+        for i in range(0, len(lang_texts), batch_size):
+            analysis.analyze_batch(lang_texts[i:i + batch_size], lang)
+    batched = time.perf_counter() - start
+
+    results[name] = {
+        "load": load,
+        "p50": np.percentile(latencies, 50) * 1000,
+        "p95": np.percentile(latencies, 95) * 1000,
+        "throughput": len(texts) / batched,
+        # Peak resident memory of the process, in kilobytes on Linux
+        "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "labels": labels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--models-folder", default="./data/sentiment_models")
+    parser.add_argument("--texts", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    random.seed(0)
+    texts = []
+    for _ in range(args.texts):
+        lang = random.choice(list(SAMPLES))
+        texts.append((random.choice(SAMPLES[lang]), lang))
+
+    for language_folder in SentimentAnalysis.LANGUAGES.values():
+        export_onnx_model(os.path.join(args.models_folder, language_folder), True)
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Manager().dict()
+    for name in BACKENDS:
+        process = context.Process(
+            target=run_backend, args=(name, args.models_folder, texts, args.batch_size, results)
+        )
+        process.start()
+        process.join()
+
+    print(f"{'backend':<12} {'load':>8} {'p50':>9} {'p95':>9} {'batches of ' + str(args.batch_size):>16} {'peak RSS':>10}")
+    for name, result in results.items():
+        print(
+            f"{name:<12} {result['load']:7.1f}s {result['p50']:7.1f}ms {result['p95']:7.1f}ms "
+            f"{result['throughput']:10.1f} texts/s {result['rss']:7.0f} MB"
+        )
+    expected = results["tensorflow"]["labels"]
+    for name, result in results.items():
+        same = sum(label == expected_label for label, expected_label in zip(result["labels"], expected))
+        print(f"{name}: {same}/{len(expected)} labels identical to tensorflow")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import argparse
 import asyncio
 from dotenv import load_dotenv
 from fastapi import FastAPI
@@ -6,7 +7,7 @@ from dependency_injector.wiring import Provide, inject
 from models.display import Display
 import uvicorn
 from sqlalchemy.exc import ArgumentError
-from pydbantic import Database
+from repository.sqlite_pragmas import PragmaDatabase
 import logging
 import nltk
 import os
@@ -22,15 +23,50 @@ from routes.rules import router as rule_router
 from routes.security import router as security_router
 from routes.projects import router as project_router
 from routes.report import router as report_router
+from routes.metrics import router as metrics_router
+from routes.static import STATIC_PATH, router as static_router
+from survey_logic.projects import load_encryptions
 from utils.container import Container
-from utils.formatter import str_to_bool
+from utils.formatter import preprocess_comments, str_to_bool
+from utils.onnx_sentiment import export_onnx_model
 
 
 @inject
-def init_fastapi(prefix="/api/v1", config=Provide[Container.config]) -> FastAPI:
+def init_fastapi(
+    prefix="/api/v1",
+    config=Provide[Container.config],
+    display_queue=Provide[Container.display_queue],
+    sentiment_scheduler=Provide[Container.sentiment_scheduler],
+    model_unloader=Provide[Container.model_unloader],
+    sentiment_cache=Provide[Container.sentiment_cache],
+    sentiment_queue=Provide[Container.sentiment_queue],
+    inference_pool=Provide[Container.inference_pool],
+    static_assets=Provide[Container.static_assets],
+) -> FastAPI:
     logging.info("Init FastAPI app")
     # Creates the FastAPI instance inside the function to be able to use the config provider
     app = FastAPI(debug=config["debug_mode"])
+    # Forks the inference workers in the process serving the requests, once the models are loaded
+    app.add_event_handler("startup", inference_pool.start)
+    # The queue task has to run in the event loop of the server
+    app.add_event_handler("startup", display_queue.start)
+    # Writes the displays still in the queue before exiting
+    app.add_event_handler("shutdown", display_queue.stop)
+    # Drops the cached sentiments of previous models, if persisted
+    app.add_event_handler("startup", sentiment_cache.start)
+    # Runs the sentiment analysis by batches, the waiting texts are analyzed before exiting
+    app.add_event_handler("startup", sentiment_scheduler.start)
+    # Analyzes the comments saved without their sentiment, if enabled
+    app.add_event_handler("startup", sentiment_queue.start)
+    app.add_event_handler("shutdown", sentiment_queue.stop)
+    app.add_event_handler("shutdown", sentiment_scheduler.stop)
+    # Saves the last analyzed texts in the persistent tier, if enabled
+    app.add_event_handler("shutdown", sentiment_cache.stop)
+    # Stopped once nothing is left to analyze
+    app.add_event_handler("shutdown", inference_pool.stop)
+    # Frees the models of the languages not received lately, if enabled
+    app.add_event_handler("startup", model_unloader.start)
+    app.add_event_handler("shutdown", model_unloader.stop)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=config["cors_allow_origins"].split(","),
@@ -43,6 +79,10 @@ def init_fastapi(prefix="/api/v1", config=Provide[Container.config]) -> FastAPI:
     app.include_router(rule_router, prefix=prefix)
     app.include_router(project_router, prefix=prefix)
     app.include_router(report_router, prefix=prefix)
+    app.include_router(metrics_router, prefix=prefix)
+    app.include_router(static_router, prefix=prefix)
+    # The URLs of the assets in the reports follow the prefix of their router
+    static_assets.url_path = prefix + STATIC_PATH
     # OAuth security is disabled if no key is present
     if config["secret_key"] != "":
         logging.info("Enabling OAuth2 security")
@@ -54,8 +94,19 @@ def init_fastapi(prefix="/api/v1", config=Provide[Container.config]) -> FastAPI:
 
 
 @inject
-async def main(config=Provide[Container.config]):
+async def main(
+    config=Provide[Container.config],
+    rules_config=Provide[Container.rules_config],
+):
     await init_db()
+    # Picks up the modifications of the rules file without any request having to parse it
+    if config["rules_reload_interval"] > 0:
+        rules_watcher = asyncio.create_task(
+            rules_config.watchRulesFile(config["rules_reload_interval"])
+        )
+    else:
+        rules_watcher = None
+        logging.warning("Rules file hot reload is disabled")
     # Running the uvicorn server in the function to be able to use the config provider
     config = uvicorn.Config(
         "main:app",
@@ -70,6 +121,9 @@ async def main(config=Provide[Container.config]):
     logging.info("Starting uvicorn server")
     await server.serve()
 
+    if rules_watcher is not None:
+        rules_watcher.cancel()
+
 
 @inject
 async def init_db(
@@ -77,18 +131,28 @@ async def init_db(
     rules_config=Provide[Container.rules_config],
     sqlite_repo=Provide[Container.sqlite_repo],
 ):
+    # The connections of pydbantic get the same settings as the ones of the repository
     try:
-        db = await Database.create(
-            config["survey_db"], tables=[Project, Comment, ProjectEncryption, Display]
+        db = await PragmaDatabase.create(
+            config["survey_db"],
+            tables=[Project, Comment, ProjectEncryption, Display],
+            pragmas=sqlite_repo.pragmas,
         )
         logging.info("Database ready")
     except ArgumentError as e:
         logging.error("Error initialising the database")
         raise Exception(f"Error from sqlalchemy : {str(e)}")
+    logging.info(f"SQLite settings: {await sqlite_repo.get_pragmas()}")
+    await sqlite_repo.create_indexes()
+    await sqlite_repo.create_search_index()
+    await sqlite_repo.create_summary_triggers()
+    await sqlite_repo.create_lemma_table()
+    await sqlite_repo.create_sentiment_queue()
 
     project_names = rules_config.getProjectNames()
     for project_name in project_names:
         await sqlite_repo.create_project(Project(name=project_name))
+    await load_encryptions()
 
 
 @inject
@@ -136,6 +200,10 @@ def init_nlp(config=Provide[Container.config]):
             tokenizer.save_pretrained(french_path)
             logging.info("French sentiment analysis model downloaded and saved")
 
+        if config["sentiment_analysis_backend"] == "onnx":
+            for path in [english_path, french_path]:
+                export_onnx_model(path, config["sentiment_onnx_quantize"])
+
         logging.info("Loading sentiment analysis models into RAM...")
         load_sentiment_models()
         load_nlp_models()
@@ -167,6 +235,17 @@ container.config.survey_db.from_env(
     as_=lambda x: x if x != "" else "sqlite:///data/survey.sqlite3",
     default="sqlite:///data/survey.sqlite3",
 )
+container.config.survey_db_profile.from_env(
+    "SURVEY_DB_PROFILE",
+    as_=lambda x: x if x != "" else "default",
+    default="default",
+)
+container.config.survey_db_pragmas.from_env("SURVEY_DB_PRAGMAS", default="")
+container.config.survey_db_threads.from_env(
+    "SURVEY_DB_THREADS",
+    as_=lambda x: int(x) if x != "" else 4,
+    default="4",
+)
 container.config.use_fingerprint.from_env(
     "USE_FINGERPRINT",
     required=True,
@@ -179,6 +258,71 @@ container.config.use_sentiment_analysis.from_env(
     as_=lambda x: str_to_bool(x) if x != "" else False,
     default="False",
 )
+container.config.sentiment_analysis_mode.from_env(
+    "SENTIMENT_ANALYSIS_MODE",
+    as_=lambda x: x.lower() if x != "" else "sync",
+    default="sync",
+)
+container.config.sentiment_batch_size.from_env(
+    "SENTIMENT_BATCH_SIZE",
+    as_=lambda x: int(x) if x != "" else 16,
+    default="16",
+)
+container.config.sentiment_analysis_backend.from_env(
+    "SENTIMENT_ANALYSIS_BACKEND",
+    as_=lambda x: x.lower() if x != "" else "tensorflow",
+    default="tensorflow",
+)
+container.config.sentiment_onnx_quantize.from_env(
+    "SENTIMENT_ONNX_QUANTIZE",
+    as_=lambda x: str_to_bool(x) if x != "" else True,
+    default="True",
+)
+container.config.sentiment_inference_batch_size.from_env(
+    "SENTIMENT_INFERENCE_BATCH_SIZE",
+    as_=lambda x: int(x) if x != "" else 8,
+    default="8",
+)
+container.config.sentiment_inference_timeout_ms.from_env(
+    "SENTIMENT_INFERENCE_TIMEOUT_MS",
+    as_=lambda x: int(x) if x != "" else 20,
+    default="20",
+)
+container.config.sentiment_cache_size.from_env(
+    "SENTIMENT_CACHE_SIZE",
+    as_=lambda x: int(x) if x != "" else 10000,
+    default="10000",
+)
+container.config.sentiment_cache_persistent.from_env(
+    "SENTIMENT_CACHE_PERSISTENT",
+    as_=lambda x: str_to_bool(x) if x != "" else False,
+    default="False",
+)
+container.config.sentiment_cache_persistent_size.from_env(
+    "SENTIMENT_CACHE_PERSISTENT_SIZE",
+    as_=lambda x: int(x) if x != "" else 100000,
+    default="100000",
+)
+container.config.nlp_preload_languages.from_env(
+    "NLP_PRELOAD_LANGUAGES",
+    as_=lambda x: [lang.strip() for lang in x.split(",") if lang.strip()],
+    default="en,fr",
+)
+container.config.nlp_models_ttl.from_env(
+    "NLP_MODELS_TTL",
+    as_=lambda x: int(x) if x != "" else 0,
+    default="0",
+)
+container.config.inference_workers.from_env(
+    "INFERENCE_WORKERS",
+    as_=lambda x: int(x) if x != "" else 0,
+    default="0",
+)
+container.config.inference_timeout.from_env(
+    "INFERENCE_TIMEOUT",
+    as_=lambda x: int(x) if x != "" else 60,
+    default="60",
+)
 container.config.sentiment_analysis_models_folder.from_env(
     "SENTIMENT_ANALYSIS_MODELS_FOLDER",
     required=True,
@@ -190,6 +334,41 @@ container.config.use_nlp_preprocess.from_env(
     as_=lambda x: str_to_bool(x) if x != "" else False,
     default="False",
 )
+container.config.nlp_batch_size.from_env(
+    "NLP_BATCH_SIZE",
+    as_=lambda x: int(x) if x != "" else 64,
+    default="64",
+)
+container.config.nlp_n_process.from_env(
+    "NLP_N_PROCESS",
+    as_=lambda x: int(x) if x != "" else 1,
+    default="1",
+)
+container.config.rules_reload_interval.from_env(
+    "RULES_RELOAD_INTERVAL",
+    as_=lambda x: float(x) if x != "" else 5.0,
+    default="5",
+)
+container.config.rules_cache_size.from_env(
+    "RULES_CACHE_SIZE",
+    as_=lambda x: int(x) if x != "" else 1024,
+    default="1024",
+)
+container.config.display_batch_size.from_env(
+    "DISPLAY_BATCH_SIZE",
+    as_=lambda x: int(x) if x != "" else 100,
+    default="100",
+)
+container.config.display_flush_interval_ms.from_env(
+    "DISPLAY_FLUSH_INTERVAL_MS",
+    as_=lambda x: int(x) if x != "" else 200,
+    default="200",
+)
+container.config.display_queue_size.from_env(
+    "DISPLAY_QUEUE_SIZE",
+    as_=lambda x: int(x) if x != "" else 10000,
+    default="10000",
+)
 container.config.cors_allow_origins.from_env("CORS_ALLOW_ORIGINS", default="*")
 container.config.cors_allow_credentials.from_env(
     "CORS_ALLOW_CREDENTIALS",
@@ -225,6 +404,57 @@ init_nlp()
 app = init_fastapi()
 app.container = container
 
+@inject
+async def rebuild_summaries(sqlite_repo=Provide[Container.sqlite_repo]):
+    """
+    Recomputes the statistics of the summary tables from all the comments and displays
+    """
+    await init_db()
+    await sqlite_repo.rebuild_summary_tables()
+
+
+@inject
+async def backfill_lemmas(
+    batch_size: int = 500,
+    sqlite_repo=Provide[Container.sqlite_repo],
+    nlp_preprocess=Provide[Container.nlp_preprocess],
+):
+    """
+    Stores the NLP preprocessing of the comments that were never preprocessed,
+    instead of preprocessing them the first time they are read
+    """
+    await init_db()
+    if not nlp_preprocess.nlp_enabled:
+        logging.error("NLP preprocessing is disabled, set USE_NLP_PREPROCESS=True")
+        return
+
+    after_id, total = 0, 0
+    while comments := await sqlite_repo.get_comments_without_lemmas(after_id, batch_size):
+        await sqlite_repo.save_comment_lemmas(
+            preprocess_comments(comments, nlp_preprocess, nlp_preprocess.n_process)
+        )
+        after_id = comments[-1].id
+        total += len(comments)
+        logging.info(f"Lemmas of {total} comments stored")
+
+
 # Start the async event loop and ASGI server.
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Survey back-end API")
+    parser.add_argument(
+        "--rebuild-summaries",
+        action="store_true",
+        help="rebuild the rating and display summary tables, then exit",
+    )
+    parser.add_argument(
+        "--backfill-lemmas",
+        action="store_true",
+        help="store the NLP preprocessing of the comments that do not have it yet, then exit",
+    )
+    args = parser.parse_args()
+    if args.rebuild_summaries:
+        asyncio.run(rebuild_summaries())
+    elif args.backfill_lemmas:
+        asyncio.run(backfill_lemmas())
+    else:
+        asyncio.run(main())
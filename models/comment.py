@@ -11,6 +11,11 @@ class SentimentEnum(Enum):
     NEGATIVE = "NEGATIVE"
 
 
+class SearchModeEnum(Enum):
+    REGEX = "regex" # Regular expression, checked on every comment
+    TEXT = "text" # Words and "quoted phrases", looked up in the full-text index
+
+
 class CommentPostBody(DataBaseModel):
     """
     Comment model for validating the body received on POST request
@@ -5,10 +5,10 @@ T = TypeVar("T")
 
 class Pagination(Generic[T], BaseModel):
     results: List[T]
-    total_pages: int
+    total_pages: Optional[int]
     page: int
     page_size: int
-    total: int
+    total: Optional[int]
     next_page: Optional[str]
     previous_page: Optional[str]
 
@@ -17,11 +17,12 @@ class Pagination(Generic[T], BaseModel):
         cls,
         results: List[T],
         page: int,
-        total: int,
-        total_pages: int,
+        total: Optional[int],
+        total_pages: Optional[int],
         resource_url: str,
         request_filters: Optional[Dict[str, Union[str, int]]] = None,
         page_size: Optional[int] = None,
+        next_cursor: Optional[str] = None,
     ) -> 'Pagination[T]':
         """
         Create a paginated result for the API
@@ -29,11 +30,12 @@ class Pagination(Generic[T], BaseModel):
         Args:
             - results: list of items to return on this page
             - page: the number of the page
-            - total: the total number of items across all pages
-            - total_pages: the total number of pages
+            - total: the total number of items across all pages, None when paginating with cursors
+            - total_pages: the total number of pages, None when paginating with cursors
             - resource_url: the URL of the request without the query string
-            - request_filters: a dictionary representing the additional params in the request URL, apart from page and page_size
+            - request_filters: a dictionary representing the additional params in the request URL, apart from page, page_size and cursor
             - page_size: the number of items to display in one page, defaults to len(results)
+            - next_cursor: the cursor of the next page when paginating with cursors, None on the last page
         
         Returns:
             A Pagination object
@@ -42,17 +44,26 @@ class Pagination(Generic[T], BaseModel):
         # Regenerate the query string
         filters = "&".join([f"{k}={v}" for k, v in request_filters.items()]) if request_filters else ""
         
-        if page == total_pages:
-            next_page = None
-        else:
-            next_page = f"{resource_url}?page={page+1}&page_size={page_size}"
-            next_page += f"&{filters}" if filters else ""
-        
-        if page == 1:
+        if total_pages is None:
+            # Cursor pagination, only the next page can be linked
+            if next_cursor is None:
+                next_page = None
+            else:
+                next_page = f"{resource_url}?cursor={next_cursor}&page_size={page_size}"
+                next_page += f"&{filters}" if filters else ""
             previous_page = None
         else:
-            previous_page = f"{resource_url}?page={page-1}&page_size={page_size}"
-            previous_page += f"&{filters}" if filters else ""
+            if page == total_pages:
+                next_page = None
+            else:
+                next_page = f"{resource_url}?page={page+1}&page_size={page_size}"
+                next_page += f"&{filters}" if filters else ""
+
+            if page == 1:
+                previous_page = None
+            else:
+                previous_page = f"{resource_url}?page={page-1}&page_size={page_size}"
+                previous_page += f"&{filters}" if filters else ""
 
         return Pagination(
             results=results,
@@ -66,7 +77,7 @@ class Pagination(Generic[T], BaseModel):
     
     @validator("total_pages")
     def validate_total_pages(cls, total_pages):
-        if total_pages < 1:
+        if total_pages is not None and total_pages < 1:
             raise ValueError("Invalid total number of pages")
         return total_pages
 
@@ -74,7 +85,7 @@ class Pagination(Generic[T], BaseModel):
     def validate_page(cls, page, values):
         if page < 1:
             raise ValueError("Invalid page number")
-        if "total_pages" in values and page > values["total_pages"]:
+        if values.get("total_pages") is not None and page > values["total_pages"]:
             raise ValueError("Page number out of range")
         return page
         
@@ -85,18 +96,20 @@ class Pagination(Generic[T], BaseModel):
         if "results" in values:
             if page_size < len(values["results"]):
                 raise ValueError("Page size is too small to fit the results")
-            if "page" in values and "total_pages" in values:
+            if "page" in values and values.get("total_pages") is not None:
                 if values["page"] < values["total_pages"] and page_size != len(values["results"]):
                     raise ValueError("Page is not full despite not being the last page")
         return page_size
         
     @validator("total")
     def validate_total(cls, total, values):
+        if total is None:
+            return total
         if total < 0:
             raise ValueError("Invalid total")
         if "results" in values and total < len(values["results"]):
             raise ValueError("Total is less than the given results")
-        if "total_pages" in values and "page_size" in values:
+        if values.get("total_pages") is not None and "page_size" in values:
             if total > (values["total_pages"] * values["page_size"]):
                 raise ValueError("Page size and total pages cannot fit the total content")
         return total
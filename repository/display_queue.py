@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from repository.sqlite_repository import SQLiteRepository
+
+# project_name, user_id, timestamp, feature_url
+DisplayRecord = Tuple[str, str, str, str]
+
+
+class DisplayQueue:
+    """
+    Write-behind buffer for the Display records logged by /rules.
+
+    The records are saved by a background task in multi-row inserts, once batch_size records
+    are waiting or flush_interval milliseconds after the first waiting record.
+    When the queue is full, callers wait for free space, slowing down the requests
+    instead of growing the memory.
+    """
+
+    # Longest time to wait for the background task to write the waiting records when stopping, in seconds
+    STOP_TIMEOUT = 10
+
+    def __init__(self, sqlite_repo: SQLiteRepository, config):
+        self.sqlite_repo = sqlite_repo
+        self.batch_size = config["display_batch_size"]
+        self.flush_interval = config["display_flush_interval_ms"] / 1000
+        self.max_size = config["display_queue_size"]
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._flush_now: Optional[asyncio.Event] = None
+        self._closing = False
+        # Batch taken from the queue by the background task and not written yet
+        self._writing: List[DisplayRecord] = []
+
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+
+    def start(self):
+        """
+        Starts the background task, to be called from the event loop serving the requests
+        """
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._flush_now = asyncio.Event()
+        self._closing = False
+        self._worker = asyncio.create_task(self._run())
+        logging.info(
+            f"Display queue started, batches of {self.batch_size} records every {self.flush_interval}s at most"
+        )
+
+    async def stop(self):
+        """
+        Writes all the waiting records and stops the background task,
+        waiting at most STOP_TIMEOUT seconds for the task to write them.
+        The batch the task was writing when the timeout expired is counted as failed.
+        """
+        if self._worker is None:
+            return
+        self._closing = True
+        self._flush_now.set()
+        worker, self._worker = self._worker, None
+        if not worker.done():
+            try:
+                await asyncio.wait_for(self._queue.join(), self.STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                logging.error(f"Display queue not written after {self.STOP_TIMEOUT}s")
+        worker.cancel()
+        try:
+            await worker
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logging.exception("The display queue task had stopped")
+        if self._writing:
+            # Cancelled during the write, the records may or may not be saved
+            self.failed += len(self._writing)
+            logging.error(
+                f"Display queue stopped while writing a batch, {len(self._writing)} displays discarded"
+            )
+            self._writing = []
+
+        # Left by a task which died or did not finish in time
+        remaining = []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+            self._queue.task_done()
+        for start in range(0, len(remaining), self.batch_size):
+            await self._write(remaining[start:start + self.batch_size])
+        logging.info(f"Display queue stopped, {self.written} records written")
+
+    async def put(self, project_name: str, user_id: str, timestamp: str, feature_url: str):
+        """
+        Queues a display to be saved, waiting for free space if the queue is full
+        """
+        record = (project_name, user_id, timestamp, feature_url)
+        if self._worker is None or self._closing:
+            # No background task to save it later
+            await self._write([record])
+            return
+
+        await self._queue.put(record)
+        if self._queue.qsize() >= self.batch_size:
+            self._flush_now.set()
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            # Gives the next records some time to arrive, unless a batch is already full
+            if not self._flush_now.is_set():
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            if not self._closing:
+                self._flush_now.clear()
+
+            batch = [first]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            self._writing = batch
+            await self._write(batch)
+            self._writing = []
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _write(self, batch: List[DisplayRecord]):
+        try:
+            await self.sqlite_repo.create_displays(batch)
+            self.written += len(batch)
+        except Exception:
+            # The records are lost but the task keeps saving the next ones
+            self.failed += len(batch)
+            logging.exception(f"Could not save a batch of {len(batch)} displays")
+        self.batches += 1
+        self.last_batch_size = len(batch)
+
+    def metrics(self) -> dict:
+        return {
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+        }
@@ -0,0 +1,198 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from typing import Dict, List, Optional
+
+from models.comment import Comment
+from repository.sqlite_repository import SQLiteRepository
+from utils.inference_pool import InferencePool
+from utils.nlp import NlpPreprocess, detect_language
+from utils.sentiment_scheduler import SentimentScheduler
+
+
+class SentimentQueue:
+    """
+    Background sentiment analysis of the comments.
+
+    In the background mode, POST /comments saves the comments without their language
+    and sentiment, and adds them to a queue kept in the database. A background task
+    analyzes them by batches of batch_size comments, through the sentiment scheduler
+    and the inference pool, so that the event loop keeps serving the requests, then saves
+    their language, sentiment and lemmas.
+    The comments still in the queue when the server stops are analyzed after the next start.
+
+    The comments of a batch which could not be analyzed are tried again one at a time,
+    and a comment failing MAX_ATTEMPTS times is saved without sentiment and leaves the queue,
+    so that it does not hold the others back.
+    """
+
+    # Seconds before trying again when a batch could not be analyzed or saved
+    RETRY_DELAY = 30
+    # Failed analyses of a comment before it leaves the queue without sentiment
+    MAX_ATTEMPTS = 3
+
+    def __init__(
+        self,
+        sqlite_repo: SQLiteRepository,
+        sentiment_scheduler: SentimentScheduler,
+        nlp_preprocess: NlpPreprocess,
+        config,
+        inference_pool: Optional[InferencePool] = None,
+    ):
+        self.sqlite_repo = sqlite_repo
+        self.sentiment_scheduler = sentiment_scheduler
+        self.nlp_preprocess = nlp_preprocess
+        # Without a pool, the preprocessing runs in a thread of its own
+        self.inference_pool = inference_pool or InferencePool(None, nlp_preprocess, {})
+        self.enabled = config.get("sentiment_analysis_mode") == "background"
+        self.batch_size = config.get("sentiment_batch_size") or 16
+
+        # Language detection, one batch at a time
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sentiment")
+        self._worker: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        # Failed analyses by comment ID, since the server started
+        self._attempts: Dict[int, int] = {}
+
+        self.depth = 0
+        self.analyzed = 0
+        self.errors = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+
+    async def start(self):
+        """
+        Starts the background task, to be called from the event loop serving the requests
+        """
+        if not self.enabled:
+            return
+        self.depth = await self.sqlite_repo.count_sentiment_queue()
+        self._wake = asyncio.Event()
+        # Analyzes the comments left by the previous run
+        self._wake.set()
+        self._worker = asyncio.create_task(self._run())
+        logging.info(f"Sentiment queue started, {self.depth} comments waiting")
+
+    async def stop(self):
+        """
+        Stops the background task, the comments not analyzed yet stay in the queue
+        """
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        logging.info(f"Sentiment queue stopped, {self.depth} comments left for the next start")
+
+    async def put(self, comment_id: int):
+        """
+        Queues a saved comment for its language detection and sentiment analysis
+        """
+        await self.sqlite_repo.enqueue_sentiment(comment_id)
+        self.depth += 1
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while await self._process_batch():
+                pass
+
+    async def _process_batch(self) -> bool:
+        """
+        Analyzes the comments at the head of the queue
+
+        Returns:
+            bool: whether there may be comments left in the queue
+        """
+        comments: List[Comment] = []
+        try:
+            comments = await self.sqlite_repo.get_sentiment_queue(self.batch_size)
+            if not comments:
+                self.depth = 0
+                return False
+            retried = [comment for comment in comments if comment.id in self._attempts]
+            if retried:
+                # Alone, the comments which failed the least first
+                comments = [min(retried, key=lambda comment: self._attempts[comment.id])]
+            loop = asyncio.get_running_loop()
+            languages = await loop.run_in_executor(
+                self._executor, lambda: [detect_language(comment.comment) for comment in comments]
+            )
+            analyses = await asyncio.gather(
+                *(
+                    # A failure of the models leaves the batch in the queue, to be tried again
+                    self.sentiment_scheduler.analyze_comment(comment.comment, language, raise_errors=True)
+                    for comment, language in zip(comments, languages)
+                )
+            )
+            results = {comment.id: analysis for comment, analysis in zip(comments, analyses)}
+            lemmas = {}
+            if self.nlp_preprocess.nlp_enabled:
+                lemmas = await self._preprocess(comments, languages)
+            await self.sqlite_repo.save_sentiments(results)
+            if lemmas:
+                await self.sqlite_repo.save_comment_lemmas(lemmas)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The comments stay in the queue
+            self.errors += 1
+            logging.exception("Could not analyze a batch of comments")
+            for comment in comments:
+                self._attempts[comment.id] = self._attempts.get(comment.id, 0) + 1
+            if len(comments) == 1 and self._attempts[comments[0].id] >= self.MAX_ATTEMPTS:
+                await self._give_up(comments[0])
+            else:
+                await asyncio.sleep(self.RETRY_DELAY)
+            return True
+
+        for comment in comments:
+            self._attempts.pop(comment.id, None)
+        self.depth = max(self.depth - len(comments), 0)
+        self.analyzed += len(comments)
+        self.batches += 1
+        self.last_batch_size = len(comments)
+        return True
+
+    async def _give_up(self, comment: Comment):
+        """
+        Saves a comment which could not be analyzed without sentiment, and removes it from the queue
+        """
+        try:
+            await self.sqlite_repo.save_sentiments({comment.id: (comment.language, None, None)})
+        except Exception:
+            logging.exception(f"Could not remove comment {comment.id} from the sentiment queue")
+            await asyncio.sleep(self.RETRY_DELAY)
+            return
+        logging.error(
+            f"Comment {comment.id} could not be analyzed after {self.MAX_ATTEMPTS} attempts, saved without sentiment"
+        )
+        del self._attempts[comment.id]
+        self.depth = max(self.depth - 1, 0)
+        self.failed += 1
+
+    async def _preprocess(
+        self, comments: List[Comment], languages: List[str]
+    ) -> Dict[int, Optional[List[str]]]:
+        processed_texts = await self.inference_pool.texts_preprocess(
+            [(comment.comment, language) for comment, language in zip(comments, languages)]
+        )
+        return {comment.id: words for comment, words in zip(comments, processed_texts)}
+
+    def metrics(self) -> dict:
+        return {
+            "mode": "background" if self.enabled else "sync",
+            "depth": self.depth,
+            "analyzed": self.analyzed,
+            "errors": self.errors,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+        }
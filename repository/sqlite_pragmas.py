@@ -0,0 +1,143 @@
+import re
+import sqlite3
+from typing import Dict, List, Optional, Type
+
+import sqlalchemy
+from databases import Database as _Database
+from pydbantic import Database
+
+# PRAGMA settings of the database and of its connections, by profile name
+PROFILES: Dict[str, Dict[str, str]] = {
+    # SQLite defaults: rollback journal, synchronous=FULL and a 2 MB page cache
+    "default": {},
+    # Readers and writers do not block each other, and commits only sync the WAL file
+    # at checkpoints, which can lose the last transactions on power loss but never corrupts
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": "268435456",
+        "cache_size": "-65536",
+        "temp_store": "MEMORY",
+        "busy_timeout": "5000",
+    },
+}
+
+# Settings stored in the database file, applied once instead of on every connection
+PERSISTENT_PRAGMAS = ("journal_mode", "auto_vacuum", "page_size")
+
+_NAME = re.compile(r"^[a-z_]+$")
+_VALUE = re.compile(r"^-?\w+$")
+
+
+def parse_pragmas(profile: Optional[str] = None, overrides: Optional[str] = None) -> Dict[str, str]:
+    """
+    Builds the PRAGMA settings of the database connections from a profile
+    and a list of settings replacing the ones of the profile.
+
+    Args:
+        profile (str, optional): the name of a profile in PROFILES, "default" if empty.
+        overrides (str, optional): coma-separated settings such as "cache_size=-20000,busy_timeout=10000".
+
+    Returns:
+        Dict[str, str]: the value of each PRAGMA by name.
+
+    Raises:
+        ValueError: if the profile does not exist or a setting is malformed.
+    """
+    profile = profile or "default"
+    if profile not in PROFILES:
+        raise ValueError(
+            f"Unknown SQLite profile '{profile}', expected one of {', '.join(PROFILES)}"
+        )
+    pragmas = dict(PROFILES[profile])
+
+    for item in (overrides or "").split(","):
+        if not item.strip():
+            continue
+        name, _, value = (part.strip() for part in item.partition("="))
+        name = name.lower()
+        # The settings are written in the PRAGMA statements, they cannot be bound
+        if not _NAME.match(name) or not _VALUE.match(value):
+            raise ValueError(f"Invalid SQLite PRAGMA setting '{item.strip()}'")
+        pragmas[name] = value
+    return pragmas
+
+
+def persistent_pragmas(pragmas: Dict[str, str]) -> Dict[str, str]:
+    return {name: value for name, value in pragmas.items() if name in PERSISTENT_PRAGMAS}
+
+
+def connection_pragmas(pragmas: Dict[str, str]) -> Dict[str, str]:
+    return {name: value for name, value in pragmas.items() if name not in PERSISTENT_PRAGMAS}
+
+
+def pragma_statements(pragmas: Dict[str, str]) -> List[str]:
+    # The journal mode first, the other settings may depend on it
+    names = sorted(pragmas, key=lambda name: name != "journal_mode")
+    return [f"PRAGMA {name} = {pragmas[name]};" for name in names]
+
+
+def apply_pragmas(connection: sqlite3.Connection, pragmas: Dict[str, str]):
+    """
+    Applies PRAGMA settings to an open sqlite3 connection
+    """
+    for statement in pragma_statements(pragmas):
+        connection.execute(statement)
+
+
+def read_pragmas(connection: sqlite3.Connection, names: List[str]) -> Dict[str, str]:
+    """
+    Reads the effective value of PRAGMA settings on an open sqlite3 connection
+    """
+    return {
+        name: str(connection.execute(f"PRAGMA {name};").fetchone()[0]) for name in names
+    }
+
+
+def connection_factory(pragmas: Dict[str, str]) -> Type[sqlite3.Connection]:
+    """
+    Builds a sqlite3 connection class applying the connection PRAGMA settings when it opens,
+    to be given as the factory of sqlite3.connect
+    """
+    statements = pragma_statements(connection_pragmas(pragmas))
+
+    class PragmaConnection(sqlite3.Connection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            for statement in statements:
+                self.execute(statement)
+
+    return PragmaConnection
+
+
+class PragmaDatabase(Database):
+    """
+    pydbantic database whose connections get the connection PRAGMA settings,
+    whether they are opened by the databases library or by the SQLAlchemy engine.
+
+    The persistent settings are expected to be applied to the database file beforehand,
+    see SQLiteRepository.
+    """
+
+    pragmas: Dict[str, str] = {}
+
+    @classmethod
+    def create(cls, DB_URL: str, tables: list, pragmas: Optional[Dict[str, str]] = None, **kwargs):
+        database = super().create(DB_URL, tables, **kwargs)
+        database.pragmas = connection_pragmas(pragmas or {})
+        if database.pragmas:
+            sqlalchemy.event.listen(database.engine, "connect", database._on_engine_connect)
+        return database
+
+    def _on_engine_connect(self, dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, self.pragmas)
+
+    async def db_connection(self):
+        # The options of the databases library are given to sqlite3.connect
+        options = {"factory": connection_factory(self.pragmas)} if self.pragmas else {}
+        async with _Database(self.DB_URL, **options) as connection:
+            while True:
+                status = yield connection
+                if status == "finished":
+                    self.log.debug(f"db_connection - closed")
+                    break
@@ -1,77 +1,776 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Union
+import functools
+import json
+from typing import Dict, List, Optional, Tuple, Union
 import logging
 import sqlite3
+from sqlalchemy import func, literal_column, select, text, tuple_
+from sqlalchemy.sql import Select, column, table as table_clause
 from sqlalchemy.orm import Session
 
-from models.comment import Comment, SentimentEnum
+from models.comment import Comment, SearchModeEnum, SentimentEnum
 from models.display import Display
 from models.project import Project, ProjectEncryption
 from models.views import FeatureRatingAvg, NumberCommentByProject, NumberDisplayByProject, ProjectRatingAvg
+from repository.sqlite_pragmas import (
+    apply_pragmas,
+    connection_pragmas,
+    parse_pragmas,
+    persistent_pragmas,
+    read_pragmas,
+)
 from utils.encryption import Encryption
 
+# FTS5 index of the comments, see SQLiteRepository.create_search_index
+comment_search_table = table_clause("comment_search", column("rowid"))
+# Lemmas of the comments, see SQLiteRepository.create_lemma_table
+comment_lemmas_table = table_clause("comment_lemmas", column("comment_id"))
+# Comments waiting for their sentiment analysis, see SQLiteRepository.create_sentiment_queue
+sentiment_queue_table = table_clause("sentiment_queue", column("comment_id"))
+
+
+def in_executor(method):
+    """
+    Turns a blocking method of SQLiteRepository into a coroutine running it
+    in the thread pool of the repository, so that the event loop keeps serving
+    the other requests while the database is read or written.
+    """
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(method, self, *args, **kwargs)
+        )
+
+    return wrapper
+
 
 class SQLiteRepository:
     def __init__(self, config):
         self.db_name = config["survey_db"].replace("sqlite:///", "")
+        # Bounded, so that a burst of statistics requests queues up
+        # instead of opening as many connections to the database
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.get("survey_db_threads") or 4,
+            thread_name_prefix="sqlite",
+        )
+        # Settings of the database and of its connections, see repository.sqlite_pragmas
+        self.pragmas = parse_pragmas(
+            config.get("survey_db_profile"), config.get("survey_db_pragmas")
+        )
+        self._connection_pragmas = connection_pragmas(self.pragmas)
+        # Encryption key of the projects by project name, filled when a project is created
+        # or when the keys are loaded. A key never changes after the creation of its project
+        self._encryption_keys: Dict[str, str] = {}
 
+        self.__apply_persistent_pragmas()
         self.__create_view()
 
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_name)
+        apply_pragmas(conn, self._connection_pragmas)
+        return conn
+
+    def __apply_persistent_pragmas(self):
+        """
+        Applies the settings stored in the database file, such as the journal mode,
+        once for all the connections opened afterwards
+        """
+        pragmas = persistent_pragmas(self.pragmas)
+        if not pragmas:
+            return
+        conn = sqlite3.connect(self.db_name)
+        apply_pragmas(conn, pragmas)
+        conn.close()
+
+    @in_executor
+    def get_pragmas(self) -> Dict[str, str]:
+        """
+        Reads the effective PRAGMA settings of a connection of the SQLAlchemy engine of pydbantic.
+
+        Returns:
+            Dict[str, str]: the value of each configured PRAGMA, and of the journal mode
+                and synchronous settings, by name.
+        """
+        names = ["journal_mode", "synchronous"] + [
+            name for name in self.pragmas if name not in ("journal_mode", "synchronous")
+        ]
+        connection = Comment.__metadata__.database.engine.raw_connection()
+        try:
+            return read_pragmas(connection, names)
+        finally:
+            connection.close()
+
     def __create_view(self):
         """
         Creates views in the database to calculate statistics on project comments and displays.
 
-        This method creates four views in the database:
+        The statistics are kept up to date in summary tables holding the sum and count
+        of the ratings per project and per feature, and the count of displays per project,
+        so that reading them does not aggregate the Comment and Display tables again:
+            - 'feature_rating_summary': sum and count of the ratings for each feature of a project.
+            - 'project_rating_summary': sum and count of the ratings for each project.
+            - 'project_display_summary': count of the displays for each project.
+
+        This method creates the summary tables if they do not exist, and four views on them:
             - 'feature_rating_avg': calculates the average rating for each feature of a project from comments.
             - 'project_rating_avg': calculates the average rating for each project from comments.
             - 'number_comment_by_project': calculates the number of comments for each project.
             - 'number_display_by_project': calculates the number of displays for each project.
 
-        If a view already exists in the database, the method ignores its creation.
+        The views are recreated every time, in case they come from an older definition.
+        The summary tables are filled by the triggers of create_summary_triggers.
         """
-        conn = sqlite3.connect(self.db_name)
+        conn = self._connect()
         cursor = conn.cursor()
-        # All the creation of the view are ignored if the view already exist
-        # Create the view that count the average rating of a feature of a project
         cursor.execute(
             """
-            CREATE VIEW IF NOT EXISTS feature_rating_avg AS
-                SELECT project_id, feature_url, AVG(rating) AS average_rating
-                FROM Comment
-                GROUP BY project_id, feature_url;
+            CREATE TABLE IF NOT EXISTS feature_rating_summary (
+                project_id INTEGER NOT NULL,
+                feature_url VARCHAR NOT NULL,
+                rating_sum INTEGER NOT NULL DEFAULT 0,
+                rating_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (project_id, feature_url)
+            );
+        """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS project_rating_summary (
+                project_id INTEGER PRIMARY KEY,
+                rating_sum INTEGER NOT NULL DEFAULT 0,
+                rating_count INTEGER NOT NULL DEFAULT 0
+            );
+        """
+        )
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS project_display_summary (
+                project_id INTEGER PRIMARY KEY,
+                display_count INTEGER NOT NULL DEFAULT 0
+            );
+        """
+        )
+        for view in (
+            "feature_rating_avg",
+            "project_rating_avg",
+            "number_comment_by_project",
+            "number_display_by_project",
+        ):
+            cursor.execute(f"DROP VIEW IF EXISTS {view};")
+        # Create the view that gives the average rating of a feature of a project
+        cursor.execute(
+            """
+            CREATE VIEW feature_rating_avg AS
+                SELECT project_id, feature_url, CAST(rating_sum AS REAL) / rating_count AS average_rating
+                FROM feature_rating_summary
+                WHERE rating_count > 0;
+        """
+        )
+        # Create the view that gives the average rating of a project
+        cursor.execute(
+            """
+            CREATE VIEW project_rating_avg AS
+                SELECT project_id, CAST(rating_sum AS REAL) / rating_count AS average_rating
+                FROM project_rating_summary
+                WHERE rating_count > 0;
+        """
+        )
+        # Create the view that gives the number of comment by project
+        cursor.execute(
+            """
+            CREATE VIEW number_comment_by_project AS
+                SELECT project_id, rating_count AS number_comment
+                FROM project_rating_summary
+                WHERE rating_count > 0;
         """
         )
-        # Create the view that count the average rating of a project
+        # Create the view that gives the number of display by project
         cursor.execute(
             """
-            CREATE VIEW IF NOT EXISTS project_rating_avg AS
-                SELECT project_id, AVG(rating) AS average_rating
+            CREATE VIEW number_display_by_project AS
+                SELECT project_id, display_count AS number_display
+                FROM project_display_summary
+                WHERE display_count > 0;
+        """
+        )
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    # Statements adding (sign "+") or removing (sign "-") a comment row to the summary tables
+    _COMMENT_SUMMARY_UPDATES = """
+        INSERT INTO feature_rating_summary (project_id, feature_url, rating_sum, rating_count)
+        VALUES ({row}.project_id, {row}.feature_url, {sign}{row}.rating, {sign}1)
+        ON CONFLICT (project_id, feature_url) DO UPDATE SET
+            rating_sum = rating_sum + excluded.rating_sum,
+            rating_count = rating_count + excluded.rating_count;
+        INSERT INTO project_rating_summary (project_id, rating_sum, rating_count)
+        VALUES ({row}.project_id, {sign}{row}.rating, {sign}1)
+        ON CONFLICT (project_id) DO UPDATE SET
+            rating_sum = rating_sum + excluded.rating_sum,
+            rating_count = rating_count + excluded.rating_count;
+    """
+    _DISPLAY_SUMMARY_UPDATE = """
+        INSERT INTO project_display_summary (project_id, display_count)
+        VALUES ({row}.project_id, {sign}1)
+        ON CONFLICT (project_id) DO UPDATE SET
+            display_count = display_count + excluded.display_count;
+    """
+
+    @in_executor
+    def create_summary_triggers(self):
+        """
+        Creates the triggers updating the summary tables in the same transaction
+        as every insert, update and delete on the Comment and Display tables.
+
+        When the triggers are created, the summary tables are rebuilt from the existing rows.
+        Must be called once the tables exist. If the triggers already exist,
+        the method ignores their creation, apart from the update triggers which are recreated.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'comment_summary_insert'"
+        )
+        exists = cursor.fetchone() is not None
+
+        comment_add = self._COMMENT_SUMMARY_UPDATES.format(row="new", sign="")
+        comment_remove = self._COMMENT_SUMMARY_UPDATES.format(row="old", sign="-")
+        display_add = self._DISPLAY_SUMMARY_UPDATE.format(row="new", sign="")
+        display_remove = self._DISPLAY_SUMMARY_UPDATE.format(row="old", sign="-")
+        triggers = {
+            "comment_summary_insert": ("AFTER INSERT ON Comment", comment_add),
+            "comment_summary_delete": ("AFTER DELETE ON Comment", comment_remove),
+            # Only the summarized columns, not the sentiment written after the comment
+            "comment_summary_update": (
+                "AFTER UPDATE OF project_id, feature_url, rating ON Comment",
+                comment_remove + comment_add,
+            ),
+            "display_summary_insert": ("AFTER INSERT ON Display", display_add),
+            "display_summary_delete": ("AFTER DELETE ON Display", display_remove),
+            "display_summary_update": ("AFTER UPDATE OF project_id ON Display", display_remove + display_add),
+        }
+        for name, (event, statements) in triggers.items():
+            if name.endswith("_update"):
+                # Recreated every time, in case it comes from an older definition
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name};")
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {statements} END;")
+        if not exists:
+            self._fill_summary_tables(cursor)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    @in_executor
+    def rebuild_summary_tables(self):
+        """
+        Recomputes the summary tables from all the rows of the Comment and Display tables,
+        in a single transaction.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        self._fill_summary_tables(cursor)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    @staticmethod
+    def _fill_summary_tables(cursor: sqlite3.Cursor):
+        cursor.execute("DELETE FROM feature_rating_summary;")
+        cursor.execute(
+            """
+            INSERT INTO feature_rating_summary (project_id, feature_url, rating_sum, rating_count)
+                SELECT project_id, feature_url, SUM(rating), COUNT(rating)
                 FROM Comment
-                GROUP BY project_id;
+                GROUP BY project_id, feature_url;
         """
         )
-        # Create the view that count the number of comment by project
+        cursor.execute("DELETE FROM project_rating_summary;")
         cursor.execute(
             """
-            CREATE VIEW IF NOT EXISTS number_comment_by_project AS
-                SELECT project_id, count(timestamp) AS number_comment
+            INSERT INTO project_rating_summary (project_id, rating_sum, rating_count)
+                SELECT project_id, SUM(rating), COUNT(rating)
                 FROM Comment
                 GROUP BY project_id;
         """
         )
-        # Create the view that count the number of display by project
+        cursor.execute("DELETE FROM project_display_summary;")
         cursor.execute(
             """
-            CREATE VIEW IF NOT EXISTS number_display_by_project AS
-                SELECT project_id, count(timestamp) AS number_display
+            INSERT INTO project_display_summary (project_id, display_count)
+                SELECT project_id, COUNT(*)
                 FROM Display
                 GROUP BY project_id;
         """
         )
+        logging.info("Summary tables rebuilt")
+
+    # Bound variables allowed in a statement by the SQLite versions older than 3.32
+    MAX_VARIABLES = 999
+
+    # Prefix of the indexes managed by create_indexes, the others are left to the operators
+    INDEX_PREFIX = "idx_survey_"
+
+    # Secondary indexes for the filters of the comment queries and the views, by name
+    INDEXES = {
+        "idx_survey_comment_project_feature_timestamp": "Comment(project_id, feature_url, timestamp)",
+        "idx_survey_comment_feature_timestamp": "Comment(feature_url, timestamp)",
+        "idx_survey_comment_user_timestamp": "Comment(user_id, timestamp)",
+        "idx_survey_comment_timestamp_id": "Comment(timestamp, id)",
+        "idx_survey_display_project_timestamp": "Display(project_id, timestamp)",
+    }
+
+    # Names the indexes were created with before they had the INDEX_PREFIX
+    FORMER_INDEXES = [
+        "idx_comment_project_feature_timestamp",
+        "idx_comment_feature_timestamp",
+        "idx_comment_user_timestamp",
+        "idx_comment_timestamp_id",
+        "idx_display_project_timestamp",
+    ]
+
+    @in_executor
+    def create_indexes(self):
+        """
+        Creates the secondary indexes of the Comment and Display tables listed in INDEXES.
+
+        The indexes that already exist are kept. The ones with the INDEX_PREFIX that are
+        not in the list anymore, and the ones created under their FORMER_INDEXES names,
+        are dropped, so that the database always ends up with the current index set.
+        The indexes added by the operators are never dropped. Must be called once the tables exist.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE ? ESCAPE '\\'",
+            (self.INDEX_PREFIX.replace("_", "\\_") + "%",),
+        )
+        obsolete = [name for (name,) in cursor.fetchall() if name not in self.INDEXES]
+        for name in obsolete + self.FORMER_INDEXES:
+            cursor.execute(f"DROP INDEX IF EXISTS {name};")
+            if name in obsolete:
+                logging.info(f"Index {name} dropped")
+        for name, columns in self.INDEXES.items():
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns};")
+        # Gives the query planner statistics on the new indexes
+        cursor.execute("PRAGMA optimize;")
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    @in_executor
+    def create_search_index(self):
+        """
+        Creates the FTS5 full-text index of the comments, used by the text search mode.
+
+        The 'comment_search' virtual table indexes the content of the Comment table
+        without copying it, and is kept up to date by triggers on insert, delete and update of the text or language.
+        When the index is created, it is filled with the comments already in the database.
+
+        Must be called once the Comment table exists. If the index already exists,
+        the method ignores its creation.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'comment_search'"
+        )
+        exists = cursor.fetchone() is not None
+
+        cursor.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS comment_search USING fts5(
+                comment,
+                language UNINDEXED,
+                content='Comment',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+        """
+        )
+        cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS comment_search_insert AFTER INSERT ON Comment BEGIN
+                INSERT INTO comment_search(rowid, comment, language)
+                VALUES (new.id, new.comment, new.language);
+            END;
+        """
+        )
+        cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS comment_search_delete AFTER DELETE ON Comment BEGIN
+                INSERT INTO comment_search(comment_search, rowid, comment, language)
+                VALUES ('delete', old.id, old.comment, old.language);
+            END;
+        """
+        )
+        # Only the indexed columns need the index to be updated, not the sentiment written later.
+        # Recreated every time, in case it comes from an older definition
+        cursor.execute("DROP TRIGGER IF EXISTS comment_search_update;")
+        cursor.execute(
+            """
+            CREATE TRIGGER comment_search_update AFTER UPDATE OF comment, language ON Comment BEGIN
+                INSERT INTO comment_search(comment_search, rowid, comment, language)
+                VALUES ('delete', old.id, old.comment, old.language);
+                INSERT INTO comment_search(rowid, comment, language)
+                VALUES (new.id, new.comment, new.language);
+            END;
+        """
+        )
+        if not exists:
+            # Indexes the comments written before the index existed
+            cursor.execute("INSERT INTO comment_search(comment_search) VALUES ('rebuild');")
+            logging.info("Full-text index of the comments created")
         conn.commit()
         cursor.close()
         conn.close()
 
+    @in_executor
+    def create_lemma_table(self):
+        """
+        Creates the 'comment_lemmas' table, holding the output of the NLP preprocessing
+        of each comment as a JSON list, so that it is computed once instead of on every read.
+        A NULL list means that the language of the comment is not supported.
+
+        The lemmas of a comment are removed when it is deleted or its text changes.
+        Must be called once the Comment table exists.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS comment_lemmas (
+                comment_id INTEGER PRIMARY KEY,
+                lemmas VARCHAR
+            );
+        """
+        )
+        cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS comment_lemmas_delete AFTER DELETE ON Comment BEGIN
+                DELETE FROM comment_lemmas WHERE comment_id = old.id;
+            END;
+        """
+        )
+        cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS comment_lemmas_update AFTER UPDATE OF comment, language ON Comment BEGIN
+                DELETE FROM comment_lemmas WHERE comment_id = old.id;
+            END;
+        """
+        )
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    @in_executor
+    def get_comment_lemmas(self, comment_ids: List[int]) -> Dict[int, Optional[List[str]]]:
+        """
+        Retrieves the stored lemmas of several comments, in a query per MAX_VARIABLES comments.
+
+        Args:
+            comment_ids (List[int]): the IDs of the comments.
+
+        Returns:
+            Dict[int, Optional[List[str]]]: the lemmas by comment ID, for the comments
+                that have been preprocessed.
+        """
+        ids = list(comment_ids)
+        results = {}
+        conn = self._connect()
+        for start in range(0, len(ids), self.MAX_VARIABLES):
+            chunk = ids[start:start + self.MAX_VARIABLES]
+            rows = conn.execute(
+                f"SELECT comment_id, lemmas FROM comment_lemmas WHERE comment_id IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for comment_id, lemmas in rows:
+                results[comment_id] = json.loads(lemmas) if lemmas is not None else None
+        conn.close()
+        return results
+
+    @in_executor
+    def save_comment_lemmas(self, lemmas: Dict[int, Optional[List[str]]]):
+        """
+        Stores the lemmas of several comments in a single transaction.
+
+        Args:
+            lemmas (Dict[int, Optional[List[str]]]): the lemmas by comment ID,
+                None for a comment whose language is not supported.
+        """
+        conn = self._connect()
+        conn.executemany(
+            "INSERT OR REPLACE INTO comment_lemmas (comment_id, lemmas) VALUES (?, ?)",
+            [
+                (
+                    comment_id,
+                    json.dumps(words, ensure_ascii=False, separators=(",", ":"))
+                    if words is not None
+                    else None,
+                )
+                for comment_id, words in lemmas.items()
+            ],
+        )
+        conn.commit()
+        conn.close()
+
+    async def get_comments_without_lemmas(self, after_id: int, limit: int) -> List[Comment]:
+        """
+        Retrieves the next comments that have not been preprocessed yet, by increasing ID.
+
+        Args:
+            after_id (int): the comments returned have a greater ID.
+            limit (int): the maximum number of comments to return.
+
+        Returns:
+            List[Comment]: the comments without stored lemmas.
+        """
+        table = Comment.get_table()
+        statement = (
+            select(table)
+            .where(table.c.id > after_id)
+            .where(table.c.id.not_in(select(comment_lemmas_table.c.comment_id)))
+            .order_by(table.c.id)
+            .limit(limit)
+        )
+        rows = await Comment.__metadata__.database.fetch(statement, table.name)
+        return Comment.parse_results(rows, [], False)
+
+    @in_executor
+    def create_sentiment_queue(self):
+        """
+        Creates the 'sentiment_queue' table, listing the comments saved without
+        their language and sentiment, to be analyzed in the background.
+        Being in the database, the queue is kept when the server restarts.
+
+        A comment leaves the queue when it is deleted.
+        Must be called once the Comment table exists.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sentiment_queue (
+                comment_id INTEGER PRIMARY KEY,
+                enqueued_at VARCHAR NOT NULL
+            );
+        """
+        )
+        cursor.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS sentiment_queue_delete AFTER DELETE ON Comment BEGIN
+                DELETE FROM sentiment_queue WHERE comment_id = old.id;
+            END;
+        """
+        )
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    @in_executor
+    def enqueue_sentiment(self, comment_id: int):
+        """
+        Adds a comment to the queue of the sentiment analysis
+        """
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR IGNORE INTO sentiment_queue (comment_id, enqueued_at) VALUES (?, ?)",
+            (comment_id, datetime.now().isoformat()),
+        )
+        conn.commit()
+        conn.close()
+
+    @in_executor
+    def count_sentiment_queue(self) -> int:
+        """
+        Returns the number of comments waiting for their sentiment analysis
+        """
+        conn = self._connect()
+        (count,) = conn.execute("SELECT COUNT(*) FROM sentiment_queue").fetchone()
+        conn.close()
+        return count
+
+    async def get_sentiment_queue(self, limit: int) -> List[Comment]:
+        """
+        Retrieves the comments waiting for their sentiment analysis, oldest first.
+
+        Args:
+            limit (int): the maximum number of comments to return.
+
+        Returns:
+            List[Comment]: the comments at the head of the queue.
+        """
+        table = Comment.get_table()
+        statement = (
+            select(table)
+            .where(
+                table.c.id.in_(
+                    select(sentiment_queue_table.c.comment_id)
+                    .order_by(sentiment_queue_table.c.comment_id)
+                    .limit(limit)
+                )
+            )
+            .order_by(table.c.id)
+        )
+        rows = await Comment.__metadata__.database.fetch(statement, table.name)
+        return Comment.parse_results(rows, [], False)
+
+    @in_executor
+    def save_sentiments(
+        self, results: Dict[int, Tuple[str, Optional[SentimentEnum], Optional[float]]]
+    ):
+        """
+        Saves the language and sentiment of analyzed comments and removes them from the queue,
+        in a single transaction.
+
+        Args:
+            results (Dict[int, Tuple[str, Optional[SentimentEnum], Optional[float]]]):
+                the language, sentiment and sentiment score by comment ID.
+        """
+        conn = self._connect()
+        conn.executemany(
+            "UPDATE Comment SET language = ?, sentiment = ?, sentiment_score = ? WHERE id = ?",
+            [
+                (language, sentiment.value if sentiment is not None else None, score, comment_id)
+                for comment_id, (language, sentiment, score) in results.items()
+            ],
+        )
+        conn.executemany(
+            "DELETE FROM sentiment_queue WHERE comment_id = ?",
+            [(comment_id,) for comment_id in results],
+        )
+        conn.commit()
+        conn.close()
+
+    @in_executor
+    def create_sentiment_cache(self, model_version: str, max_size: int):
+        """
+        Creates the 'sentiment_cache' table, keeping the language and sentiment of the
+        analyzed texts by hash of their normalized text, see utils.sentiment_cache.
+
+        The results of other versions of the models are removed,
+        then only the max_size most recent results are kept.
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sentiment_cache (
+                text_hash VARCHAR PRIMARY KEY,
+                model_version VARCHAR NOT NULL,
+                language VARCHAR NOT NULL,
+                sentiment VARCHAR,
+                sentiment_score FLOAT,
+                created_at VARCHAR NOT NULL
+            );
+        """
+        )
+        cursor.execute("DELETE FROM sentiment_cache WHERE model_version != ?", (model_version,))
+        cursor.execute(
+            """
+            DELETE FROM sentiment_cache WHERE text_hash NOT IN (
+                SELECT text_hash FROM sentiment_cache ORDER BY created_at DESC LIMIT ?
+            )
+        """,
+            (max_size,),
+        )
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+    @in_executor
+    def get_cached_sentiments(
+        self, text_hashes: List[str], model_version: str
+    ) -> Dict[str, Tuple[str, Optional[SentimentEnum], Optional[float]]]:
+        """
+        Retrieves the analyses of several texts from the sentiment cache in a single query.
+
+        Args:
+            text_hashes (List[str]): the hashes of the normalized texts.
+            model_version (str): the version of the models in use.
+
+        Returns:
+            Dict[str, Tuple[str, Optional[SentimentEnum], Optional[float]]]: the language,
+            sentiment and sentiment score by hash, only for the texts cached for these models.
+        """
+        results = {}
+        conn = self._connect()
+        for start in range(0, len(text_hashes), self.MAX_VARIABLES - 1):
+            chunk = text_hashes[start:start + self.MAX_VARIABLES - 1]
+            rows = conn.execute(
+                f"""
+                SELECT text_hash, language, sentiment, sentiment_score FROM sentiment_cache
+                WHERE model_version = ? AND text_hash IN ({", ".join("?" * len(chunk))})
+            """,
+                [model_version, *chunk],
+            ).fetchall()
+            for text_hash, language, sentiment, score in rows:
+                results[text_hash] = (
+                    language,
+                    SentimentEnum(sentiment) if sentiment is not None else None,
+                    score,
+                )
+        conn.close()
+        return results
+
+    @in_executor
+    def save_cached_sentiments(
+        self,
+        model_version: str,
+        results: Dict[str, Tuple[str, Optional[SentimentEnum], Optional[float]]],
+    ):
+        """
+        Saves the analyses of several texts in the sentiment cache, in a single transaction.
+
+        Args:
+            model_version (str): the version of the models which gave them.
+            results (Dict[str, Tuple[str, Optional[SentimentEnum], Optional[float]]]):
+                the language, sentiment and sentiment score by hash of the normalized text.
+        """
+        created_at = datetime.now().isoformat()
+        conn = self._connect()
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO sentiment_cache
+                (text_hash, model_version, language, sentiment, sentiment_score, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """,
+            [
+                (
+                    text_hash,
+                    model_version,
+                    language,
+                    sentiment.value if sentiment is not None else None,
+                    score,
+                    created_at,
+                )
+                for text_hash, (language, sentiment, score) in results.items()
+            ],
+        )
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def _to_search_query(content_search: str) -> str:
+        """
+        Converts a text search into an FTS5 query matching the comments
+        that contain all its words and "quoted phrases", so that no FTS5 syntax is interpreted
+        """
+        terms = []
+        for index, part in enumerate(content_search.split('"')):
+            if index % 2:
+                # Inside quotes
+                phrases = [part] if part.strip() else []
+            else:
+                phrases = part.split()
+            terms += ['"' + phrase.replace('"', '""') + '"' for phrase in phrases]
+        return " ".join(terms)
+
+    @in_executor
     def get_project_avg_rating(self, project_id: int):
         """
         Retrieve the average rating of a project from the `project_rating_avg` view.
@@ -97,6 +796,7 @@ class SQLiteRepository:
                 return 0
 
 
+    @in_executor
     def get_feature_avg_rating(self, project_id: int, feature_url: str):
         """
         Retrieves the average rating for a given feature of a specific project from
@@ -128,6 +828,90 @@ class SQLiteRepository:
             except IndexError:
                 return 0
 
+    @in_executor
+    def get_feature_avg_ratings(self, project_id: int) -> Dict[str, float]:
+        """
+        Retrieves the average ratings of all the features of a project in a single query,
+        from the 'feature_rating_avg' view.
+
+        Args:
+            project_id (int): the ID of the project.
+
+        Returns:
+            Dict[str, float]: the average rating by feature URL, for the features having comments.
+        """
+        with Session(Comment.__metadata__.database.engine) as session:
+            query = session.query(FeatureRatingAvg.feature_url, FeatureRatingAvg.average_rating) \
+               .filter(FeatureRatingAvg.project_id == project_id) \
+               .order_by(FeatureRatingAvg.feature_url)
+
+            return {feature_url: average_rating for feature_url, average_rating in query.all()}
+
+    @in_executor
+    def get_all_feature_avg_ratings(self) -> Dict[int, Dict[str, float]]:
+        """
+        Retrieves the average ratings of the features of every project in a single query,
+        from the 'feature_rating_avg' view.
+
+        Returns:
+            Dict[int, Dict[str, float]]: by project ID, the average rating by feature URL
+                of the features having comments.
+        """
+        ratings = {}
+        with Session(Comment.__metadata__.database.engine) as session:
+            query = session.query(
+                FeatureRatingAvg.project_id,
+                FeatureRatingAvg.feature_url,
+                FeatureRatingAvg.average_rating,
+            ).order_by(FeatureRatingAvg.project_id, FeatureRatingAvg.feature_url)
+
+            for project_id, feature_url, average_rating in query.all():
+                ratings.setdefault(project_id, {})[feature_url] = average_rating
+        return ratings
+
+    @in_executor
+    def get_all_project_avg_ratings(self) -> Dict[int, float]:
+        """
+        Retrieves the average rating of every project in a single query,
+        from the 'project_rating_avg' view.
+
+        Returns:
+            Dict[int, float]: the average rating by project ID, for the projects having comments.
+        """
+        with Session(Comment.__metadata__.database.engine) as session:
+            query = session.query(ProjectRatingAvg.project_id, ProjectRatingAvg.average_rating)
+            return dict(query.all())
+
+    @in_executor
+    def get_all_number_of_comments(self) -> Dict[int, int]:
+        """
+        Retrieves the number of comments of every project in a single query,
+        from the 'number_comment_by_project' view.
+
+        Returns:
+            Dict[int, int]: the number of comments by project ID, for the projects having comments.
+        """
+        with Session(Comment.__metadata__.database.engine) as session:
+            query = session.query(
+                NumberCommentByProject.project_id, NumberCommentByProject.number_comment
+            )
+            return dict(query.all())
+
+    @in_executor
+    def get_all_number_of_displays(self) -> Dict[int, int]:
+        """
+        Retrieves the number of displays of every project in a single query,
+        from the 'number_display_by_project' view.
+
+        Returns:
+            Dict[int, int]: the number of displays by project ID, for the projects having displays.
+        """
+        with Session(Comment.__metadata__.database.engine) as session:
+            query = session.query(
+                NumberDisplayByProject.project_id, NumberDisplayByProject.number_display
+            )
+            return dict(query.all())
+
     async def get_features_urls_by_project_name(self, project_name: str):
         """
         Retrieves all features_urls for a specific project name from the database.
@@ -144,13 +928,18 @@ class SQLiteRepository:
         if project is None:
             return []
 
+        return await self._read_features_urls(project.id)
+
+    @in_executor
+    def _read_features_urls(self, project_id: int) -> List[str]:
         with Session(Comment.__metadata__.database.engine) as session:
             query = session.query(FeatureRatingAvg.feature_url).filter(
-                FeatureRatingAvg.project_id == project.id
+                FeatureRatingAvg.project_id == project_id
             ).all()
 
         return [row[0] for row in query]
 
+    @in_executor
     def get_number_of_comment(self, project_id: int):
         """
         Retrieves the number of comments for a specific project from the database.
@@ -178,6 +967,7 @@ class SQLiteRepository:
             except IndexError:
                 return 0
 
+    @in_executor
     def get_number_of_display(self, project_id: int):
         """
         Retrieves the number of displays for a specific project from the database.
@@ -269,6 +1059,85 @@ class SQLiteRepository:
         comments = await Comment.all()
         return comments
 
+    def _filter_comments(
+        self,
+        statement: Select,
+        project_name: Optional[str] = None,
+        feature_url: Optional[str] = None,
+        user_id: Optional[str] = None,
+        timestamp_start: Optional[str] = None,
+        timestamp_end: Optional[str] = None,
+        content_search: Optional[str] = None,
+        rating_min: Optional[int] = None,
+        rating_max: Optional[int] = None,
+        search_mode: SearchModeEnum = SearchModeEnum.REGEX,
+    ) -> Select:
+        """
+        Adds the conditions matching the given comment filters to a query on the Comment table,
+        so that the database applies all of them in a single statement
+        """
+        table = Comment.get_table()
+
+        if project_name:
+            project_table = Project.get_table()
+            statement = statement.where(
+                table.c.project_id
+                == select(project_table.c.id)
+                .where(project_table.c.name == project_name)
+                .scalar_subquery()
+            )
+
+        if feature_url is not None:
+            statement = statement.where(table.c.feature_url == feature_url)
+
+        if user_id is not None:
+            statement = statement.where(table.c.user_id == user_id)
+
+        if timestamp_start is not None:
+            statement = statement.where(table.c.timestamp >= timestamp_start)
+
+        if timestamp_end is not None:
+            statement = statement.where(table.c.timestamp <= timestamp_end)
+
+        if rating_min is not None:
+            statement = statement.where(table.c.rating >= rating_min)
+
+        if rating_max is not None:
+            statement = statement.where(table.c.rating <= rating_max)
+
+        if content_search is not None:
+            if search_mode == SearchModeEnum.TEXT:
+                search_query = self._to_search_query(content_search)
+                # A search without any word does not filter anything
+                if search_query:
+                    statement = statement.where(
+                        table.c.id.in_(
+                            select(comment_search_table.c.rowid).where(
+                                literal_column("comment_search").op("MATCH")(search_query)
+                            )
+                        )
+                    )
+            else:
+                statement = statement.where(table.c.comment.regexp_match(content_search))
+
+        return statement
+
+    async def _fetch_comment_rows(
+        self,
+        statement: Select,
+        content_search: Optional[str] = None,
+        search_mode: SearchModeEnum = SearchModeEnum.REGEX,
+    ) -> list:
+        if content_search is None or search_mode != SearchModeEnum.REGEX:
+            return await Comment.__metadata__.database.fetch(statement, Comment.get_table().name)
+        # Only the connections of the SQLAlchemy engine have the REGEXP function
+        return await self._execute_on_engine(statement)
+
+    @in_executor
+    def _execute_on_engine(self, statement: Select) -> list:
+        with Session(Comment.__metadata__.database.engine) as session:
+            return session.execute(statement).all()
+
     async def read_comments(
         self,
         project_name: Optional[str] = None,
@@ -279,6 +1148,9 @@ class SQLiteRepository:
         content_search: Optional[str] = None,
         rating_min: Optional[int] = None,
         rating_max: Optional[int] = None,
+        search_mode: SearchModeEnum = SearchModeEnum.REGEX,
+        page: Optional[int] = None,
+        page_size: Optional[int] = None,
     ) -> List[Comment]:
         """
         Get paginated comments from the database that match the given filters.
@@ -291,78 +1163,179 @@ class SQLiteRepository:
             - content_search: (optional) a search query to filter comments by
             - rating_min: (optional) the minimum rating to filter by
             - rating_max: (optional) the maximum rating to filter by
+            - search_mode: (optional) how content_search is matched, as a regex by default or with the full-text index
+            - page: (optional) the number of the page to return, starting at 1, all the comments if not given
+            - page_size: (optional) the number of comments in one page, required with page
         Returns:
-            A dictionary containing the comments.
+            The list of comments of the page, ordered by id.
         """
-        # If no filters are given, return all comments
-        if not any(
-            (
-                project_name,
-                feature_url,
-                user_id,
-                timestamp_start,
-                timestamp_end,
-                content_search,
-                rating_min,
-                rating_max,
-            )
-        ):
-            comments = await self.get_all_comments()
-            return comments
-
-        else:
-            query = []
-
-            if project_name:
-                project = await self.get_project_by_name(project_name)
-                if project:
-                    query.append(Comment.project_id == project.id)
-                else:
-                    return []
-
-            if feature_url is not None:
-                query.append(Comment.feature_url == feature_url)
+        if page is not None and (page_size is None or page_size < 1 or page < 1):
+            raise ValueError("Invalid page or page size")
 
-            if user_id is not None:
-                query.append(Comment.user_id == user_id)
-
-            if timestamp_start is not None:
-                query.append(Comment.timestamp >= timestamp_start)
-
-            if timestamp_end is not None:
-                query.append(Comment.timestamp <= timestamp_end)
-
-            if rating_min is not None:
-                query.append(Comment.rating >= rating_min)
-
-            if rating_max is not None:
-                query.append(Comment.rating <= rating_max)
+        filters = dict(
+            project_name=project_name,
+            feature_url=feature_url,
+            user_id=user_id,
+            timestamp_start=timestamp_start,
+            timestamp_end=timestamp_end,
+            content_search=content_search,
+            rating_min=rating_min,
+            rating_max=rating_max,
+        )
+        # If no filters are given, return all comments
+        if page is None and not any(filters.values()):
+            return await self.get_all_comments()
+
+        table = Comment.get_table()
+        statement = self._filter_comments(
+            select(table), **filters, search_mode=search_mode
+        ).order_by(table.c.id)
+        if page is not None:
+            # Only the rows of the page are read from the database
+            statement = statement.limit(page_size).offset((page - 1) * page_size)
+        rows = await self._fetch_comment_rows(statement, content_search, search_mode)
+        return Comment.parse_results(rows, [], False)
+
+    async def read_comments_page(
+        self,
+        page: int,
+        page_size: int,
+        project_name: Optional[str] = None,
+        feature_url: Optional[str] = None,
+        user_id: Optional[str] = None,
+        timestamp_start: Optional[str] = None,
+        timestamp_end: Optional[str] = None,
+        content_search: Optional[str] = None,
+        rating_min: Optional[int] = None,
+        rating_max: Optional[int] = None,
+        search_mode: SearchModeEnum = SearchModeEnum.REGEX,
+    ) -> Tuple[List[Comment], int]:
+        """
+        Get one page of the comments matching the given filters along with their total number,
+        both read in the same transaction so that they agree with each other
+        even when comments are created or deleted meanwhile.
+        Args:
+            - page: the number of the page to return, starting at 1
+            - page_size: the number of comments in one page
+            - the other arguments are the same filters as read_comments
+        Returns:
+            The list of comments of the page, ordered by id, and the number of matching comments
+        """
+        if page_size < 1 or page < 1:
+            raise ValueError("Invalid page or page size")
 
-            if content_search is None:
-                if len(query) == 0:
-                    comments = await self.get_all_comments()
-                else:
-                    query = await Comment.filter(*query)
-                    comments = list(query)
-            else:
-                table = Comment.get_table()
-                with Session(Comment.__metadata__.database.engine) as session:
-                    result = (
-                        session.query(table)
-                        .where(table.c.comment.regexp_match(content_search))
-                        .all()
-                    )
-                comments_searched: List[Comment] = Comment.parse_results(
-                    result, [], False
-                )
-                if len(query) == 0:
-                    comments = comments_searched
-                else:
-                    query = await Comment.filter(*query)
-                    query_comments = list(query)
-                    comments = [x for x in comments_searched if x in query_comments]
+        filters = dict(
+            project_name=project_name,
+            feature_url=feature_url,
+            user_id=user_id,
+            timestamp_start=timestamp_start,
+            timestamp_end=timestamp_end,
+            content_search=content_search,
+            rating_min=rating_min,
+            rating_max=rating_max,
+            search_mode=search_mode,
+        )
+        table = Comment.get_table()
+        count_statement = self._filter_comments(select(func.count()).select_from(table), **filters)
+        page_statement = (
+            self._filter_comments(select(table), **filters)
+            .order_by(table.c.id)
+            .limit(page_size)
+            .offset((page - 1) * page_size)
+        )
+        rows, total = await self._read_page_on_engine(page_statement, count_statement)
+        return Comment.parse_results(rows, [], False), total
 
-            return comments
+    @in_executor
+    def _read_page_on_engine(self, page_statement: Select, count_statement: Select) -> Tuple[list, int]:
+        with Session(Comment.__metadata__.database.engine) as session:
+            # The driver only opens a transaction before writing, reads need an explicit one
+            # to see the same snapshot of the database
+            session.execute(text("BEGIN"))
+            total = session.execute(count_statement).scalar()
+            rows = session.execute(page_statement).all()
+        return rows, total
+
+    async def read_comments_after(
+        self,
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 20,
+        project_name: Optional[str] = None,
+        feature_url: Optional[str] = None,
+        user_id: Optional[str] = None,
+        timestamp_start: Optional[str] = None,
+        timestamp_end: Optional[str] = None,
+        content_search: Optional[str] = None,
+        rating_min: Optional[int] = None,
+        rating_max: Optional[int] = None,
+        search_mode: SearchModeEnum = SearchModeEnum.REGEX,
+    ) -> List[Comment]:
+        """
+        Get the comments matching the given filters that come after a position,
+        in (timestamp, id) order. Unlike an offset, the position is found directly
+        so reading a page costs the same wherever it is.
+        Args:
+            - after: (optional) the (timestamp, id) of the last comment already read, from the start if not given
+            - limit: the maximum number of comments to return
+            - the other arguments are the same filters as read_comments
+        Returns:
+            The list of comments following the position
+        """
+        table = Comment.get_table()
+        statement = self._filter_comments(
+            select(table),
+            project_name=project_name,
+            feature_url=feature_url,
+            user_id=user_id,
+            timestamp_start=timestamp_start,
+            timestamp_end=timestamp_end,
+            content_search=content_search,
+            rating_min=rating_min,
+            rating_max=rating_max,
+            search_mode=search_mode,
+        )
+        if after is not None:
+            timestamp, id = after
+            # As a row value, the position can be looked up in the (timestamp, id) index
+            statement = statement.where(tuple_(table.c.timestamp, table.c.id) > (timestamp, id))
+        statement = statement.order_by(table.c.timestamp, table.c.id).limit(limit)
+        rows = await self._fetch_comment_rows(statement, content_search, search_mode)
+        return Comment.parse_results(rows, [], False)
+
+    async def count_comments(
+        self,
+        project_name: Optional[str] = None,
+        feature_url: Optional[str] = None,
+        user_id: Optional[str] = None,
+        timestamp_start: Optional[str] = None,
+        timestamp_end: Optional[str] = None,
+        content_search: Optional[str] = None,
+        rating_min: Optional[int] = None,
+        rating_max: Optional[int] = None,
+        search_mode: SearchModeEnum = SearchModeEnum.REGEX,
+    ) -> int:
+        """
+        Count the comments of the database that match the given filters,
+        with a COUNT query instead of reading them.
+        Args:
+            The same filters as read_comments
+        Returns:
+            The number of matching comments
+        """
+        statement = self._filter_comments(
+            select(func.count()).select_from(Comment.get_table()),
+            project_name=project_name,
+            feature_url=feature_url,
+            user_id=user_id,
+            timestamp_start=timestamp_start,
+            timestamp_end=timestamp_end,
+            content_search=content_search,
+            rating_min=rating_min,
+            rating_max=rating_max,
+            search_mode=search_mode,
+        )
+        rows = await self._fetch_comment_rows(statement, content_search, search_mode)
+        return rows[0][0]
 
     async def create_project(self, project: Project):
         projects = await Project.filter(name=project.name)
@@ -376,6 +1349,7 @@ class SQLiteRepository:
             )
             await projet_encryption.insert()
             logging.debug(f"Project Encryption created in DB: {projet_encryption}")
+            self._encryption_keys[project.name] = projet_encryption.encryption_key
         else:
             logging.debug("Cannot create project, already exists in DB")
             project = projects[0]
@@ -386,6 +1360,36 @@ class SQLiteRepository:
         project = await Project.get(id=project_id)
         return project
 
+    async def get_project_names(self, project_ids: List[int]) -> Dict[int, str]:
+        """
+        Retrieves the names of several projects in a single query.
+
+        Args:
+            project_ids (List[int]): the IDs of the projects.
+
+        Returns:
+            Dict[int, str]: the name of each existing project by ID.
+        """
+        table = Project.get_table()
+        statement = select(table.c.id, table.c.name).where(table.c.id.in_(list(project_ids)))
+        rows = await Project.__metadata__.database.fetch(statement, table.name)
+        return {row[0]: row[1] for row in rows}
+
+    async def get_project_ids(self, project_names: List[str]) -> Dict[str, int]:
+        """
+        Retrieves the IDs of several projects in a single query.
+
+        Args:
+            project_names (List[str]): the names of the projects.
+
+        Returns:
+            Dict[str, int]: the ID of each existing project by name.
+        """
+        table = Project.get_table()
+        statement = select(table.c.name, table.c.id).where(table.c.name.in_(list(project_names)))
+        rows = await Project.__metadata__.database.fetch(statement, table.name)
+        return {row[0]: row[1] for row in rows}
+
     async def get_project_by_name(self, project_name: str) -> Union[Project, None]:
         projects = await Project.filter(name=project_name)
         if len(projects):
@@ -402,6 +1406,56 @@ class SQLiteRepository:
         else:
             return None
 
+    async def get_projects_encryptions(self) -> List[Tuple[Project, ProjectEncryption]]:
+        """
+        Retrieves every project along with its encryption key
+
+        Returns:
+            A list of (Project, ProjectEncryption) pairs, projects without a key are left out
+        """
+        projects = {project.id: project for project in await Project.all()}
+        projects_encryptions = [
+            (projects[encryption.project_id], encryption)
+            for encryption in await ProjectEncryption.all()
+            if encryption.project_id in projects
+        ]
+        for project, encryption in projects_encryptions:
+            self._encryption_keys[project.name] = encryption.encryption_key
+        return projects_encryptions
+
+    async def get_encryption_key_by_project_name(self, project_name: str) -> Optional[str]:
+        """
+        Retrieves the encryption key of a project, from the keys known by the repository
+        or else in a single query joining the project and its key
+
+        Args:
+            project_name (str): the name of the project.
+
+        Returns:
+            Optional[str]: the encryption key, None if the project or its key does not exist
+        """
+        encryption_key = self._encryption_keys.get(project_name)
+        if encryption_key is not None:
+            return encryption_key
+
+        project_table = Project.get_table()
+        encryption_table = ProjectEncryption.get_table()
+        statement = (
+            select(encryption_table.c.encryption_key)
+            .select_from(
+                project_table.join(
+                    encryption_table, encryption_table.c.project_id == project_table.c.id
+                )
+            )
+            .where(project_table.c.name == project_name)
+            .limit(1)
+        )
+        rows = await Project.__metadata__.database.fetch(statement, encryption_table.name)
+        if not rows:
+            return None
+        self._encryption_keys[project_name] = rows[0][0]
+        return rows[0][0]
+
     async def create_display(
         self, project_name: str, user_id: str, timestamp: str, feature_url: str
     ) -> Union[Display, None]:
@@ -426,6 +1480,48 @@ class SQLiteRepository:
         logging.debug(f"Display created in DB: {new_display}")
         return new_display
 
+    async def create_displays(self, displays: List[Tuple[str, str, str, str]]) -> int:
+        """
+        Creates several displays in the database with a single multi-row insert
+
+        Args:
+            - displays: list of (project_name, user_id, timestamp, feature_url)
+
+        Returns:
+            The number of displays created
+        """
+        if not displays:
+            return 0
+
+        project_names = {display[0] for display in displays}
+        project_ids = {
+            project.name: project.id
+            for project in await Project.filter(Project.name.inside(list(project_names)))
+        }
+        for project_name in project_names - project_ids.keys():
+            logging.warning("Project missing on display creation")
+            project = await self.create_project(Project(name=project_name))
+            project_ids[project_name] = project.id
+
+        rows = [
+            Display(
+                project_id=project_ids[project_name],
+                user_id=user_id,
+                timestamp=timestamp,
+                feature_url=feature_url,
+            ).dict(exclude={"id"})
+            for project_name, user_id, timestamp, feature_url in displays
+        ]
+        # Multi-row inserts within the bound variables limit of SQLite, in one transaction for the whole batch
+        chunk_size = max(self.MAX_VARIABLES // len(rows[0]), 1)
+        table = Display.get_table()
+        async with Display.__metadata__.database as connection:
+            async with connection.transaction():
+                for start in range(0, len(rows), chunk_size):
+                    await connection.execute(table.insert().values(rows[start:start + chunk_size]))
+        logging.debug(f"{len(rows)} displays created in DB")
+        return len(rows)
+
 
     async def get_rates_from_feature(
             self, 
@@ -454,6 +1550,31 @@ class SQLiteRepository:
         return rates_with_timestamps
     
 
+    async def get_rates_from_features(self, feature_urls: List[str]) -> Dict[str, List[dict]]:
+        """
+        Retrieves the ratings of several features, in a query per MAX_VARIABLES features.
+
+        Args:
+            feature_urls (List[str]): the URLs of the features.
+
+        Returns:
+            Dict[str, List[dict]]: by feature URL, the list of its ratings and their timestamps,
+                in the same format as get_rates_from_feature.
+        """
+        table = Comment.get_table()
+        feature_urls = list(feature_urls)
+        rates_by_feature = {feature_url: [] for feature_url in feature_urls}
+        for start in range(0, len(feature_urls), self.MAX_VARIABLES):
+            statement = (
+                select(table.c.feature_url, table.c.rating, table.c.timestamp)
+                .where(table.c.feature_url.in_(feature_urls[start:start + self.MAX_VARIABLES]))
+                .order_by(table.c.id)
+            )
+            rows = await Comment.__metadata__.database.fetch(statement, table.name)
+            for row in rows:
+                rates_by_feature[row[0]].append({"rate": row[1], "timestamp": row[2]})
+        return rates_by_feature
+
     async def filter_rates_by_timerange(
         self, 
         feature_rates, 
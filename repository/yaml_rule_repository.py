@@ -1,10 +1,104 @@
+import asyncio
 import logging
-import re
-from typing import List
+import os
+import threading
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Optional as OptionalType, Tuple
 import yaml
 from schema import Schema, SchemaError, Optional
 from yaml.loader import SafeLoader
 from models.rule import Rule
+from utils.url_matcher import FeatureUrlMatcher
+
+
+class RulesSnapshot:
+    """
+    Parsed and validated content of the rules configuration file.
+
+    A snapshot is never modified once built: a change of the YAML file
+    produces a new snapshot with a higher version number.
+    The Rule objects it holds are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(
+        self,
+        data: OptionalType[dict],
+        version: int = 0,
+        file_name: OptionalType[str] = None,
+        stamp: OptionalType[Tuple] = None,
+        cache_size: int = 1024,
+    ):
+        self.version = version
+        self.file_name = file_name
+        # Identifies the state of the file the snapshot was built from
+        self.stamp = stamp
+        self.cache_size = cache_size
+
+        projects: Dict[str, Tuple[Rule, ...]] = {}
+        feature_urls: Dict[str, Tuple[str, ...]] = {}
+        feature_projects: Dict[str, str] = {}
+        # Every rule in file order, alongside the name of its project
+        ordered_rules: List[Tuple[str, Rule]] = []
+
+        if data:
+            for project_name, project_data in data["projects"].items():
+                rules = tuple(
+                    Rule(
+                        feature_url=rule["feature_url"],
+                        ratio=rule["ratio"],
+                        delay_before_reanswer=rule["delay_before_reanswer"],
+                        delay_to_answer=rule["delay_to_answer"],
+                        is_active=rule["is_active"],
+                    )
+                    for rule in project_data["rules"]
+                )
+                projects[project_name] = rules
+                # dict.fromkeys removes the duplicates while keeping the order
+                feature_urls[project_name] = tuple(
+                    dict.fromkeys(rule.feature_url for rule in rules)
+                )
+                for rule in rules:
+                    # The first project declaring a feature URL owns it
+                    feature_projects.setdefault(rule.feature_url, project_name)
+                    ordered_rules.append((project_name, rule))
+
+        self.projects = MappingProxyType(projects)
+        self.feature_urls = MappingProxyType(feature_urls)
+        self.feature_projects = MappingProxyType(feature_projects)
+        self.ordered_rules = tuple(ordered_rules)
+        self.matcher = FeatureUrlMatcher([rule.feature_url for _, rule in ordered_rules])
+        # Results of the matcher by feature URL, unknown features included.
+        # Being tied to the snapshot, it is dropped along with it when the rules change.
+        self._match_cache = lru_cache(maxsize=cache_size)(self._match)
+
+    def _match(self, feature_url: str) -> Tuple[OptionalType[str], OptionalType[Rule]]:
+        index = self.matcher.match(feature_url)
+        if index is None:
+            return None, None
+        return self.ordered_rules[index]
+
+    def match(self, feature_url: str) -> Tuple[OptionalType[str], OptionalType[Rule]]:
+        """
+        Finds the first rule of the configuration matching the given feature URL
+
+        Returns:
+            The name of the project and the rule, or (None, None) if no rule matches
+        """
+        return self._match_cache(feature_url)
+
+    def cache_info(self) -> dict:
+        """
+        Returns the statistics of the feature URL cache since the snapshot was built
+        """
+        info = self._match_cache.cache_info()
+        return {
+            "rules_version": self.version,
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+        }
 
 
 class YamlRulesRepository:
@@ -28,6 +122,23 @@ class YamlRulesRepository:
         },
     }
 
+    # Rules currently in use, replaced as a whole when the file changes
+    _snapshot: OptionalType[RulesSnapshot] = None
+    _snapshot_version = 0
+    _snapshot_lock = threading.Lock()
+    # Default maximum number of feature URLs whose rule is kept in each snapshot cache
+    _FEATURE_CACHE_SIZE = 1024
+
+    def __init__(self, config=None):
+        self.feature_cache_size = YamlRulesRepository._FEATURE_CACHE_SIZE
+        if config is not None and config.get("rules_cache_size") is not None:
+            self.feature_cache_size = config["rules_cache_size"]
+        snapshot = YamlRulesRepository._snapshot
+        current_size = snapshot.cache_size if snapshot is not None else YamlRulesRepository._FEATURE_CACHE_SIZE
+        if self.feature_cache_size != current_size:
+            # The next reloads keep the cache size of the snapshot they replace
+            YamlRulesRepository.reloadRules(cache_size=self.feature_cache_size)
+
     @staticmethod
     def _getRulesConfig(file_name: str = _RULES_CONFIG_FILE):
         """
@@ -59,6 +170,93 @@ class YamlRulesRepository:
             logging.error(f"Error while parsing the file {file_name}: {exc}")
             return None
 
+    @staticmethod
+    def _getFileStamp(file_name: str) -> OptionalType[Tuple]:
+        """
+        Returns a value that changes whenever the given file is modified or replaced,
+        or None if the file does not exist
+        """
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return None
+        return (file_name, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    @staticmethod
+    def _getSnapshot() -> RulesSnapshot:
+        """
+        Returns the rules snapshot currently in use.
+
+        The file is only parsed here on the first call or when the configuration file name changed,
+        later modifications of the file are picked up by watchRulesFile.
+        """
+        snapshot = YamlRulesRepository._snapshot
+        if snapshot is not None and snapshot.file_name == YamlRulesRepository._RULES_CONFIG_FILE:
+            return snapshot
+
+        YamlRulesRepository.reloadRules()
+        return YamlRulesRepository._snapshot
+
+    @staticmethod
+    def reloadRules(stamp: OptionalType[Tuple] = None, cache_size: OptionalType[int] = None) -> bool:
+        """
+        Parses and validates the configuration file, then replaces the snapshot in use with the new one.
+        If the file is invalid, the last valid snapshot is kept.
+
+        Args:
+            stamp (tuple, optional): the stamp of the file as returned by _getFileStamp, read again if not given
+            cache_size (int, optional): the size of the feature URL cache, the one of the current snapshot if not given
+
+        Returns:
+            bool: whether a new snapshot is now in use
+        """
+        file_name = YamlRulesRepository._RULES_CONFIG_FILE
+        if stamp is None:
+            stamp = YamlRulesRepository._getFileStamp(file_name)
+        data = YamlRulesRepository._getRulesConfig(file_name)
+
+        with YamlRulesRepository._snapshot_lock:
+            current = YamlRulesRepository._snapshot
+            if data is None and current is not None and current.file_name == file_name:
+                logging.error(
+                    f"Keeping the rules snapshot version {current.version}, {file_name} is invalid"
+                )
+                return False
+
+            if cache_size is None:
+                cache_size = current.cache_size if current is not None else YamlRulesRepository._FEATURE_CACHE_SIZE
+            YamlRulesRepository._snapshot_version += 1
+            snapshot = RulesSnapshot(data, YamlRulesRepository._snapshot_version, file_name, stamp, cache_size)
+            # Single reference assignment, requests see either the old or the new rules
+            YamlRulesRepository._snapshot = snapshot
+
+        logging.info(f"Rules snapshot version {snapshot.version} loaded from {file_name}")
+        return True
+
+    @staticmethod
+    async def watchRulesFile(interval: float):
+        """
+        Background task checking the configuration file every interval seconds,
+        and loading it again outside of the event loop when it was modified or replaced.
+
+        Args:
+            interval (float): the number of seconds between two checks of the file
+        """
+        loop = asyncio.get_running_loop()
+        logging.info(f"Watching the rules file every {interval} seconds")
+        last_stamp = YamlRulesRepository._getSnapshot().stamp
+        while True:
+            await asyncio.sleep(interval)
+            stamp = YamlRulesRepository._getFileStamp(YamlRulesRepository._RULES_CONFIG_FILE)
+            if stamp == last_stamp:
+                continue
+            # Remembered even for an invalid file, to avoid parsing it again on every check
+            last_stamp = stamp
+            try:
+                await loop.run_in_executor(None, YamlRulesRepository.reloadRules, stamp)
+            except Exception:
+                logging.exception("Error while reloading the rules file")
+
     @staticmethod
     def getRulesFromProjectName(name: str):
         """
@@ -70,23 +268,8 @@ class YamlRulesRepository:
         Returns:
             List[Rule]: a list of rules for the project
         """
-        data = YamlRulesRepository._getRulesConfig(
-            YamlRulesRepository._RULES_CONFIG_FILE
-        )
-        if data:
-            for project_name, project_data in data["projects"].items():
-                if project_name == name:
-                    return [
-                        Rule(
-                            feature_url=rule["feature_url"],
-                            ratio=rule["ratio"],
-                            delay_before_reanswer=rule["delay_before_reanswer"],
-                            delay_to_answer=rule["delay_to_answer"],
-                            is_active=rule["is_active"],
-                        )
-                        for rule in project_data["rules"]
-                    ]
-        return []
+        snapshot = YamlRulesRepository._getSnapshot()
+        return list(snapshot.projects.get(name, ()))
 
     @staticmethod
     def getRuleFromFeature(feature_url: str):
@@ -100,22 +283,22 @@ class YamlRulesRepository:
         Rule: A Rule object containing the information for the corresponding rule, if it exists.
             None if the feature does not exist in the rule configuration.
         """
-        data = YamlRulesRepository._getRulesConfig(
-            YamlRulesRepository._RULES_CONFIG_FILE
-        )
-        if data:
-            for project_name, project_data in data["projects"].items():
-                for rule in project_data["rules"]:
-                    rule_feature_url = rule["feature_url"]
-                    if re.search(fr"\b{re.escape(rule_feature_url)}\b", feature_url):
-                        return Rule(
-                            feature_url=rule["feature_url"],
-                            ratio=rule["ratio"],
-                            delay_before_reanswer=rule["delay_before_reanswer"],
-                            delay_to_answer=rule["delay_to_answer"],
-                            is_active=rule["is_active"],
-                        )
-        return None
+        _, rule = YamlRulesRepository._getSnapshot().match(feature_url)
+        return rule
+
+    @staticmethod
+    def matchFeature(feature_url: str) -> Tuple[OptionalType[str], OptionalType[Rule]]:
+        """
+        Returns the name of the project and the rule matching the specified feature URL,
+        both read from the same snapshot with a single cache lookup.
+
+        Args:
+        feature_url (str): The URL of the feature for which to retrieve the project name and rule.
+
+        Returns:
+        Tuple: The name of the project and the Rule object, (None, None) if the feature does not exist in the rule configuration.
+        """
+        return YamlRulesRepository._getSnapshot().match(feature_url)
 
     @staticmethod
     def getProjectNameFromFeature(feature_url: str):
@@ -129,34 +312,18 @@ class YamlRulesRepository:
         str: The name of the project to which the feature belongs, if it exists.
             None if the feature does not exist in the rule configuration.
         """
-        data = YamlRulesRepository._getRulesConfig(
-            YamlRulesRepository._RULES_CONFIG_FILE
-        )
-        if data:
-            for project_name, project_data in data["projects"].items():
-                for rule in project_data["rules"]:
-                    rule_feature_url = rule["feature_url"]
-                    if re.search(fr"\b{re.escape(rule_feature_url)}\b", feature_url):
-                        return project_name
-        return None
+        project_name, _ = YamlRulesRepository._getSnapshot().match(feature_url)
+        return project_name
 
     @staticmethod
     def getProjectNames() -> List[str]:
         """
         Returns the names of the projects listed in the YAML config file
         """
-        data = YamlRulesRepository._getRulesConfig(
-            YamlRulesRepository._RULES_CONFIG_FILE
-        )
-        if data:
-            return data["projects"].keys()
-        return []
+        return list(YamlRulesRepository._getSnapshot().projects)
 
     @staticmethod
     def getFeatureUrlsFromProjectName(name) -> List:
-        data = YamlRulesRepository._getRulesConfig(
-            YamlRulesRepository._RULES_CONFIG_FILE
-        )
         """
         Returns a list of feature URLs associated with a project specified by its name.
 
@@ -166,11 +333,13 @@ class YamlRulesRepository:
         Returns:
           list: a list of feature URLs associated with the project
         """
-        if data:
-            for project_name, project_data in data["projects"].items():
-                if project_name == name:
-                    feature_urls = set()
-                    for rule in project_data["rules"]:
-                        feature_urls.add(rule["feature_url"])
-                    return list(feature_urls)
-        return []
+        snapshot = YamlRulesRepository._getSnapshot()
+        return list(snapshot.feature_urls.get(name, ()))
+
+    @staticmethod
+    def getFeatureCacheInfo() -> dict:
+        """
+        Returns the hit and miss counters of the feature URL cache of the current rules snapshot.
+        The counters start again from zero each time the rules are reloaded.
+        """
+        return YamlRulesRepository._getSnapshot().cache_info()
@@ -3,9 +3,9 @@ from fastapi import APIRouter, Depends, Security, status, Cookie, Request
 from models.pagination import Pagination
 
 from survey_logic import comments as logic
-from models.comment import Comment, CommentPostBody
+from models.comment import Comment, CommentPostBody, SearchModeEnum
 from models.security import ScopeEnum
-from utils.formatter import comment_to_comment_get_body, paginate_results
+from utils.formatter import comments_to_comment_get_bodies, paginate_cursor, paginate_page
 from routes.middlewares.feature_url import comment_body_treatment, remove_search_hash_from_url
 from routes.middlewares.security import check_jwt
 
@@ -47,12 +47,14 @@ async def get_comments(
     timestamp_start: Optional[str] = None,
     timestamp_end: Optional[str] = None,
     content_search: Optional[str] = None,
+    search_mode: SearchModeEnum = SearchModeEnum.REGEX,
     rating_min: Optional[int] = None,
     rating_max: Optional[int] = None,
     page: Optional[int] = 1,
     page_size: Optional[int] = 20,
+    cursor: Optional[str] = None,
 ) -> Pagination[Comment]:
-    comments = await logic.get_comments(
+    filter_values = dict(
         project_name=project_name,
         feature_url=feature_url,
         user_id=user_id,
@@ -63,16 +65,7 @@ async def get_comments(
         rating_max=rating_max,
     )
     
-    if not any([
-        project_name,
-        feature_url,
-        user_id,
-        timestamp_start,
-        timestamp_end,
-        content_search,
-        rating_min,
-        rating_max,
-    ]):
+    if not any(filter_values.values()):
         filters = None
     else:
         # Writes the filters used in the request, apart from the pagination ones
@@ -80,20 +73,43 @@ async def get_comments(
         queries = request.url.query.split("&")
         for query in queries:
             k, v = query.split("=")
-            if k in ["page", "page_size"]:
+            if k in ["page", "page_size", "cursor"]:
                 continue
             filters[k] = v
 
-    pagination = paginate_results(
-        all_values=comments,
-        page_size=page_size,
-        page=page,
-        resource_url=remove_search_hash_from_url(str(request.url)),
-        request_filters=filters,
-    )
-    pagination.results = [
-        await comment_to_comment_get_body(comment) for comment in pagination.results
-    ]
+    resource_url = remove_search_hash_from_url(str(request.url))
+    if cursor is not None:
+        # Keyset pagination, each page starts right after the last comment of the previous one
+        comments, page, next_cursor = await logic.get_comments_from_cursor(
+            cursor=cursor,
+            page_size=page_size,
+            search_mode=search_mode,
+            **filter_values,
+        )
+        pagination = paginate_cursor(
+            page_values=comments,
+            page_size=page_size,
+            page=page,
+            next_cursor=next_cursor,
+            resource_url=resource_url,
+            request_filters=filters,
+        )
+    else:
+        comments, total = await logic.get_comments(
+            **filter_values,
+            search_mode=search_mode,
+            page=page,
+            page_size=page_size,
+        )
+        pagination = paginate_page(
+            page_values=comments,
+            total=total,
+            page_size=page_size,
+            page=page,
+            resource_url=resource_url,
+            request_filters=filters,
+        )
+    pagination.results = await comments_to_comment_get_bodies(pagination.results)
     return pagination
 
     
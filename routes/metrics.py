@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Security
+
+from models.security import ScopeEnum
+from survey_logic import metrics as logic
+from routes.middlewares.security import check_jwt
+
+router = APIRouter()
+
+
+@router.get(
+    "/metrics",
+    dependencies=[Security(check_jwt, scopes=[ScopeEnum.DATA.value])],
+    response_model=dict,
+)
+async def get_metrics() -> dict:
+    return await logic.get_metrics()
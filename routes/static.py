@@ -0,0 +1,23 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, Response
+from dependency_injector.wiring import Provide, inject
+
+from utils.container import Container
+from utils.static_assets import StaticAssets
+
+router = APIRouter()
+
+# Path of the assets under the prefix the router is mounted on
+STATIC_PATH = "/static"
+
+
+# Not protected by a scope: browsers load these files without the access token of the report
+@router.get(STATIC_PATH + "/{file_name}", include_in_schema=False)
+@inject
+async def get_static_asset(
+    file_name: str,
+    if_none_match: Optional[str] = Header(default=None),
+    accept_encoding: Optional[str] = Header(default=None),
+    static_assets: StaticAssets = Depends(Provide[Container.static_assets]),
+) -> Response:
+    return static_assets.get_response(file_name, if_none_match, accept_encoding)
@@ -1,16 +1,20 @@
-from typing import List, Optional
+import base64
+import json
+from typing import List, Optional, Tuple
 from fastapi import Depends, status, HTTPException
 from dependency_injector.wiring import Provide, inject
 from datetime import datetime, timedelta
 import logging
 
-from models.comment import Comment
-from models.rule import Rule
+from models.comment import Comment, SearchModeEnum
 from survey_logic.projects import get_encryption_from_project_name
 from utils.container import Container
 from repository.sqlite_repository import SQLiteRepository
+from repository.sentiment_queue import SentimentQueue
 from repository.yaml_rule_repository import YamlRulesRepository
-from utils.nlp import SentimentAnalysis, detect_language
+from utils.inference_pool import InferencePool
+from utils.nlp import NlpPreprocess
+from utils.sentiment_scheduler import SentimentScheduler
 
 @inject
 async def create_comment(
@@ -22,13 +26,16 @@ async def create_comment(
     timestamp: Optional[str] = None,
     sqlite_repo: SQLiteRepository = Depends(Provide[Container.sqlite_repo]),
     rules_config: YamlRulesRepository = Depends(Provide[Container.rules_config]),
-    sentiment_analysis: SentimentAnalysis = Depends(Provide[Container.sentiment_analysis]),
+    sentiment_scheduler: SentimentScheduler = Depends(Provide[Container.sentiment_scheduler]),
+    nlp_preprocess: NlpPreprocess = Depends(Provide[Container.nlp_preprocess]),
+    sentiment_queue: SentimentQueue = Depends(Provide[Container.sentiment_queue]),
+    inference_pool: InferencePool = Depends(Provide[Container.inference_pool]),
     config = Depends(Provide[Container.config]),
 ) -> Comment:
     
-    if (
-        project_name := rules_config.getProjectNameFromFeature(feature_url)
-    ) is None:
+    # Project and rule from the same rules snapshot
+    project_name, rule = rules_config.matchFeature(feature_url)
+    if project_name is None:
         logging.error("create_comment::Feature not found")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -56,7 +63,6 @@ async def create_comment(
 
     dt_timestamp = datetime.fromtimestamp(float(decrypted_timestamp))
     # Check delay to answer
-    rule: Rule = rules_config.getRuleFromFeature(feature_url)
     if (datetime.now() - dt_timestamp) >= timedelta(minutes=rule.delay_to_answer):
         logging.error("create_comment::Time to submit a comment has elapsed")
         raise HTTPException(
@@ -64,17 +70,11 @@ async def create_comment(
             detail="Time to submit a comment has elapsed",
         )
 
-    # Sentiment analysis
-    if len(comment):
-        language = detect_language(comment)
-        try:
-            sentiment, score = sentiment_analysis.analyze(comment, language)
-        except Exception:
-            logging.error(f"Could not analyze sentiment of comment of language {language}")
-            logging.debug(f"Unable to do sentiment analysis on this comment: {comment}")
-            sentiment, score = None, None
+    if sentiment_queue.enabled:
+        # Analyzed in the background once saved
+        language, sentiment, score = "unknown", None, None
     else:
-        sentiment, score = None, None
+        language, sentiment, score = await sentiment_scheduler.analyze_comment(comment)
 
     iso_timestamp = dt_timestamp.isoformat()
     new_comment = await sqlite_repo.create_comment(
@@ -89,6 +89,17 @@ async def create_comment(
         sentiment,
         score,
     )
+
+    if sentiment_queue.enabled:
+        # The lemmas are stored by the queue, once the language is known
+        await sentiment_queue.put(new_comment.id)
+    elif nlp_preprocess.nlp_enabled:
+        # Preprocessed once here, out of the event loop, the comment lists read the stored lemmas
+        (words,) = await inference_pool.texts_preprocess([(comment, language)])
+        if words is None:
+            logging.error(f"Could not preprocess text of language {language}")
+            logging.debug(f"Unable to do NLP preprocess on this text: {comment}")
+        await sqlite_repo.save_comment_lemmas({new_comment.id: words})
     return new_comment
 
 @inject
@@ -101,9 +112,18 @@ async def get_comments(
     content_search: Optional[str] = None,
     rating_min: Optional[int] = None,
     rating_max: Optional[int] = None,
+    search_mode: SearchModeEnum = SearchModeEnum.REGEX,
+    page: int = 1,
+    page_size: int = 20,
     sqlite_repo: SQLiteRepository = Depends(Provide[Container.sqlite_repo]),
-) -> List[Comment]:
-    comments = await sqlite_repo.read_comments(
+) -> Tuple[List[Comment], int]:
+    """
+    Reads one page of the comments matching the filters
+
+    Returns:
+        The comments of the page and the total number of matching comments
+    """
+    filters = dict(
         project_name=project_name,
         feature_url=feature_url,
         user_id=user_id,
@@ -112,5 +132,85 @@ async def get_comments(
         content_search=content_search,
         rating_min=rating_min,
         rating_max=rating_max,
+        search_mode=search_mode,
     )
-    return comments
\ No newline at end of file
+    return await sqlite_repo.read_comments_page(page, page_size, **filters)
+
+
+def _encode_cursor(page: int, comment: Comment) -> str:
+    position = json.dumps([page, comment.timestamp, comment.id])
+    # Without padding, so that it can be put in a URL as is
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, str, int]:
+    try:
+        page, timestamp, id = json.loads(
+            base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+        if not (isinstance(page, int) and isinstance(timestamp, str) and isinstance(id, int)):
+            raise ValueError
+    except Exception:
+        logging.error("get_comments_from_cursor::Invalid cursor")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Invalid cursor",
+        )
+    return page, timestamp, id
+
+
+@inject
+async def get_comments_from_cursor(
+    cursor: str,
+    page_size: int = 20,
+    project_name: Optional[str] = None,
+    feature_url: Optional[str] = None,
+    user_id: Optional[str] = None,
+    timestamp_start: Optional[str] = None,
+    timestamp_end: Optional[str] = None,
+    content_search: Optional[str] = None,
+    rating_min: Optional[int] = None,
+    rating_max: Optional[int] = None,
+    search_mode: SearchModeEnum = SearchModeEnum.REGEX,
+    sqlite_repo: SQLiteRepository = Depends(Provide[Container.sqlite_repo]),
+) -> Tuple[List[Comment], int, Optional[str]]:
+    """
+    Reads the page of the comments matching the filters that follows a cursor,
+    in (timestamp, id) order
+
+    Args:
+        - cursor: the cursor given in the previous page, or an empty string for the first page
+
+    Returns:
+        The comments of the page, the number of the page,
+        and the cursor of the next page or None if it is the last one
+    """
+    if page_size < 1:
+        raise ValueError("Invalid page size")
+
+    if cursor:
+        page, timestamp, id = _decode_cursor(cursor)
+        page, after = page + 1, (timestamp, id)
+    else:
+        page, after = 1, None
+
+    # One more comment tells whether there is a next page
+    comments = await sqlite_repo.read_comments_after(
+        after=after,
+        limit=page_size + 1,
+        project_name=project_name,
+        feature_url=feature_url,
+        user_id=user_id,
+        timestamp_start=timestamp_start,
+        timestamp_end=timestamp_end,
+        content_search=content_search,
+        rating_min=rating_min,
+        rating_max=rating_max,
+        search_mode=search_mode,
+    )
+    if len(comments) > page_size:
+        comments = comments[:page_size]
+        next_cursor = _encode_cursor(page, comments[-1])
+    else:
+        next_cursor = None
+    return comments, page, next_cursor
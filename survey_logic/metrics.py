@@ -0,0 +1,37 @@
+from fastapi import Depends
+from dependency_injector.wiring import Provide, inject
+
+from repository.display_queue import DisplayQueue
+from repository.sentiment_queue import SentimentQueue
+from repository.yaml_rule_repository import YamlRulesRepository
+from utils.container import Container
+from utils.inference_pool import InferencePool
+from utils.model_unloader import ModelUnloader
+from utils.sentiment_cache import SentimentCache
+from utils.sentiment_scheduler import SentimentScheduler
+
+@inject
+async def get_metrics(
+    rules_config: YamlRulesRepository = Depends(Provide[Container.rules_config]),
+    display_queue: DisplayQueue = Depends(Provide[Container.display_queue]),
+    sentiment_queue: SentimentQueue = Depends(Provide[Container.sentiment_queue]),
+    sentiment_scheduler: SentimentScheduler = Depends(Provide[Container.sentiment_scheduler]),
+    model_unloader: ModelUnloader = Depends(Provide[Container.model_unloader]),
+    sentiment_cache: SentimentCache = Depends(Provide[Container.sentiment_cache]),
+    inference_pool: InferencePool = Depends(Provide[Container.inference_pool]),
+) -> dict:
+    """
+    Gathers the internal counters of the API, used to size its caches and queues
+
+    Returns:
+        dict: the counters of each component, by component name
+    """
+    return {
+        "rules_cache": rules_config.getFeatureCacheInfo(),
+        "display_queue": display_queue.metrics(),
+        "sentiment_queue": sentiment_queue.metrics(),
+        "sentiment_inference": sentiment_scheduler.metrics(),
+        "sentiment_cache": sentiment_cache.metrics(),
+        "models": model_unloader.metrics(),
+        "inference_pool": await inference_pool.metrics(),
+    }
@@ -1,5 +1,5 @@
 import logging
-from typing import List
+from typing import Dict, List
 from fastapi import Depends, HTTPException, status
 from dependency_injector.wiring import Provide, inject
 
@@ -10,15 +10,37 @@ from repository.yaml_rule_repository import YamlRulesRepository
 from utils.container import Container
 from utils.encryption import Encryption
 
+# Encryption instances of the projects, by project name
+# The key of a project never changes after its creation, so the entries are never invalidated
+_encryptions: Dict[str, Encryption] = {}
+
+
+@inject
+async def load_encryptions(
+    sqlite_repo: SQLiteRepository = Depends(Provide[Container.sqlite_repo]),
+):
+    """
+    Fills the encryption cache with the keys of all the projects in the database.
+    Meant to be called at startup, once the projects of the rules are created.
+    """
+    for project, project_encryption in await sqlite_repo.get_projects_encryptions():
+        _encryptions[project.name] = Encryption(project_encryption.encryption_key)
+    logging.info(f"Encryption keys of {len(_encryptions)} projects loaded")
+
 @inject
 async def get_encryption_from_project_name(
     project_name: str,
     sqlite_repo: SQLiteRepository = Depends(Provide[Container.sqlite_repo]),
 ) -> Encryption:
-    # Retrieve the encryption key of the project
-    project = await sqlite_repo.get_project_by_name(project_name)
-    encryption_db = await sqlite_repo.get_encryption_by_project_id(project.id)
-    encryption = Encryption(encryption_db.encryption_key)
+    encryption = _encryptions.get(project_name)
+    if encryption is not None:
+        return encryption
+
+    # Project created after startup, the repository keeps the key of the projects it creates
+    # and otherwise retrieves it in a single query
+    encryption_key = await sqlite_repo.get_encryption_key_by_project_name(project_name)
+    encryption = Encryption(encryption_key)
+    _encryptions[project_name] = encryption
     return encryption
 
 @inject
@@ -75,10 +97,10 @@ async def get_avg_rating_by_feature_from_project_id(
             detail={"id": project_id, "Error": "Project not found"},
         )
     feature_urls = yaml_repo.getFeatureUrlsFromProjectName(project.name)
+    ratings = await sqlite_repo.get_feature_avg_ratings(project.id)
     for url in feature_urls:
-        output.append(
-            {"url": url, "rating": sqlite_repo.get_feature_avg_rating(project.id, url)}
-        )
+        # A feature without any comment has a rating of 0
+        output.append({"url": url, "rating": ratings.get(url, 0)})
     return output
 
 @inject
@@ -137,5 +159,5 @@ async def get_avg_project_rating_from_id(
             status_code=status.HTTP_404_NOT_FOUND,
             detail={"id": project_id, "Error": "Project not found"},
         )
-    rating = sqlite_repo.get_project_avg_rating(project_id)
+    rating = await sqlite_repo.get_project_avg_rating(project_id)
     return rating
\ No newline at end of file
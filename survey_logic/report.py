@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import Depends
 from dependency_injector.wiring import Provide, inject
 from typing import Optional
@@ -5,6 +6,7 @@ import plotly.express as px
 import pandas as pd
 
 from utils.html_report import HTMLReport
+from utils.static_assets import StaticAssets
 from repository.sqlite_repository import SQLiteRepository
 from repository.yaml_rule_repository import YamlRulesRepository
 from utils.container import Container
@@ -16,6 +18,7 @@ import numpy as np
 async def generate_project_report(
     sqlite_repo: SQLiteRepository = Depends(Provide[Container.sqlite_repo]),
     rulesYamlConfig: YamlRulesRepository = Depends(Provide[Container.rules_config]),
+    static_assets: StaticAssets = Depends(Provide[Container.static_assets]),
 ) -> str:
     """
     Generates a report for all projects with different statistics
@@ -23,29 +26,42 @@ async def generate_project_report(
     Returns:
         str: The report in HTML format
     """
-    html_repository = HTMLReport(reportFile="surveyReport.html")
+    html_repository = HTMLReport(reportFile="surveyReport.html", asset_urls=static_assets.urls)
 
     projects = []
-
-    for project_name in rulesYamlConfig.getProjectNames():
-        project = await sqlite_repo.get_project_by_name(project_name)
-        average_rating = sqlite_repo.get_project_avg_rating(project.id)
-        comments_number = sqlite_repo.get_number_of_comment(project.id)
-        display_modal_number = sqlite_repo.get_number_of_display(project.id)
-        feature_urls = await sqlite_repo.get_features_urls_by_project_name(project_name)
+    project_names = rulesYamlConfig.getProjectNames()
+    # IDs and statistics of all the projects, each read in a single query, run concurrently
+    (
+        project_ids,
+        average_ratings,
+        comments_numbers,
+        display_modal_numbers,
+        feature_avg_ratings,
+    ) = await asyncio.gather(
+        sqlite_repo.get_project_ids(project_names),
+        sqlite_repo.get_all_project_avg_ratings(),
+        sqlite_repo.get_all_number_of_comments(),
+        sqlite_repo.get_all_number_of_displays(),
+        sqlite_repo.get_all_feature_avg_ratings(),
+    )
+
+    for project_name in project_names:
+        project_id = project_ids.get(project_name)
+        average_rating = average_ratings.get(project_id, 0)
+        comments_number = comments_numbers.get(project_id, 0)
+        display_modal_number = display_modal_numbers.get(project_id, 0)
         active_rules = [
             rule
             for rule in rulesYamlConfig.getRulesFromProjectName(project_name)
             if rule.is_active
         ]
-        feature_data = []
-        for feature_url in feature_urls:
-            feature_avg_rating = sqlite_repo.get_feature_avg_rating(project.id, feature_url)
-            feature_avg_rating= round(feature_avg_rating, 1)
-            feature_data.append({
+        feature_data = [
+            {
                 'feature_url': feature_url,
-                'feature_avg_rating': feature_avg_rating
-            })
+                'feature_avg_rating': round(feature_avg_rating, 1),
+            }
+            for feature_url, feature_avg_rating in feature_avg_ratings.get(project_id, {}).items()
+        ]
 
         projects.append(
             {
@@ -100,6 +116,7 @@ async def generate_detailed_report_from_project_id(
     timestamp_end: Optional[str] = None,
     sqlite_repo: SQLiteRepository = Depends(Provide[Container.sqlite_repo]),
     yaml_repo: YamlRulesRepository = Depends(Provide[Container.rules_config]),
+    static_assets: StaticAssets = Depends(Provide[Container.static_assets]),
 ) -> str:
     """
     Generates the detailed project report for the specified project ID.
@@ -111,21 +128,20 @@ async def generate_detailed_report_from_project_id(
         timestamp_end (str, optional): The end timestamp for filtering the rates. Defaults to None.
         sqlite_repo (SQLiteRepository, optional): The SQLite repository. Defaults to Depends(Provide[Container.sqlite_repo]).
         yaml_repo (YamlRulesRepository, optional): The YAML rules repository. Defaults to Depends(Provide[Container.rules_config]).
+        static_assets (StaticAssets, optional): The URLs of the libraries used by the page. Defaults to Depends(Provide[Container.static_assets]).
 
     Returns:
         str: The generated detailed project report in HTML format.
 
     """
 
-    html_repository = HTMLReport(reportFile="surveyProjectDetailReport.html")
+    html_repository = HTMLReport(
+        reportFile="surveyProjectDetailReport.html", asset_urls=static_assets.urls
+    )
     project = await sqlite_repo.get_project_by_id(project_id)
     project_name = project.name
     feature_urls = yaml_repo.getFeatureUrlsFromProjectName(project_name)
-    feature_rates = {}
-    
-    for feature_url in feature_urls:
-        rates = await sqlite_repo.get_rates_from_feature(feature_url)
-        feature_rates[feature_url] = rates
+    feature_rates = await sqlite_repo.get_rates_from_features(feature_urls)
     filtered_rates = await sqlite_repo.filter_rates_by_timerange(feature_rates, timerange, timestamp_start, timestamp_end)
 
     graphs = []
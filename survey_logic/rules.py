@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import Depends, Response, status, HTTPException
 from dependency_injector.wiring import Provide, inject
 import logging
@@ -6,28 +6,26 @@ from datetime import datetime, timedelta
 from uuid import uuid4
 import random
 
-from repository.sqlite_repository import SQLiteRepository
+from repository.display_queue import DisplayQueue
 from survey_logic.projects import get_encryption_from_project_name
 from utils.container import Container
 from models.rule import Rule
 from repository.yaml_rule_repository import YamlRulesRepository
 
 @inject
-def _get_rule_from_feature(
+def _match_feature(
     feature_url: str,
     rulesYamlConfig: YamlRulesRepository = Depends(Provide[Container.rules_config]),
-) -> Rule:
-    # Get rules from featureUrl query
-    rulesFromFeature: Optional[Rule] = rulesYamlConfig.getRuleFromFeature(
-        feature_url=feature_url
-    )
+) -> Tuple[str, Rule]:
+    # Get the project and rule from featureUrl query, from the same rules snapshot
+    project_name, rulesFromFeature = rulesYamlConfig.matchFeature(feature_url)
     if rulesFromFeature is None:
         logging.error("GET rules::Feature not found")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Feature not found",
         )
-    return rulesFromFeature
+    return project_name, rulesFromFeature
 
 @inject
 async def _log_display(
@@ -35,11 +33,12 @@ async def _log_display(
     user_id: str,
     feature_url: str,
     date: datetime,
-    sqlite_repo: SQLiteRepository = Depends(Provide[Container.sqlite_repo]),
+    display_queue: DisplayQueue = Depends(Provide[Container.display_queue]),
 ):
     # Store the timestamp when it's displayed
+    # Saved later along with other displays, to keep the database writes out of the request
     iso_timestamp = date.isoformat()
-    await sqlite_repo.create_display(
+    await display_queue.put(
         project_name, user_id, iso_timestamp, feature_url
     )
 
@@ -51,8 +50,7 @@ async def show_modal_or_not(
     timestamp: Optional[str] = None,
     rulesYamlConfig: YamlRulesRepository = Depends(Provide[Container.rules_config]),
 ) -> bool:
-    rulesFromFeature = _get_rule_from_feature(featureUrl)
-    project_name = rulesYamlConfig.getProjectNameFromFeature(featureUrl)
+    project_name, rulesFromFeature = _match_feature(featureUrl, rulesYamlConfig=rulesYamlConfig)
     encryption = await get_encryption_from_project_name(project_name)    
 
     # Set user_id Cookie if is None
@@ -6,10 +6,13 @@ from fastapi import HTTPException
 from survey_logic import comments as logic
 from models.comment import Comment
 from models.rule import Rule
+from repository.sentiment_queue import SentimentQueue
 from repository.sqlite_repository import SQLiteRepository
 from repository.yaml_rule_repository import YamlRulesRepository
 from utils.encryption import Encryption
-from utils.nlp import SentimentAnalysis
+from utils.inference_pool import InferencePool
+from utils.nlp import NlpPreprocess, SentimentAnalysis
+from utils.sentiment_scheduler import SentimentScheduler
 
 
 class TestComments(unittest.IsolatedAsyncioTestCase):
@@ -31,6 +34,13 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
         self.mock_rule = Mock(spec=Rule)
         self.mock_repo = Mock(spec=SQLiteRepository)
         self.mock_nlp = Mock(spec=SentimentAnalysis)
+        self.mock_nlp.analysis_enabled = False
+        self.sentiment_scheduler = SentimentScheduler(self.mock_nlp, {})
+        self.mock_preprocess = Mock(spec=NlpPreprocess)
+        self.mock_preprocess.nlp_enabled = False
+        self.inference_pool = InferencePool(self.mock_nlp, self.mock_preprocess, {})
+        self.mock_sentiment_queue = Mock(spec=SentimentQueue)
+        self.mock_sentiment_queue.enabled = False
         self.config = {"use_fingerprint": False}
         self.crypt_key = "rg3ENcA7oBCxtxvJ1kk4oAXLizePSnGqPykRi4hvWqY="
         self.encryption = Encryption(self.crypt_key)
@@ -50,8 +60,7 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
             sentiment=None,
             sentiment_score=None,
         )
-        self.mock_yaml.getProjectNameFromFeature.return_value = project_name
-        self.mock_yaml.getRuleFromFeature.return_value = self.mock_rule
+        self.mock_yaml.matchFeature.return_value = project_name, self.mock_rule
         self.mock_rule.delay_to_answer = 5
         self.mock_nlp.analyze.return_value = None, None
         self.mock_repo.create_comment.return_value = return_comment
@@ -69,7 +78,9 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
                 ),
                 sqlite_repo=self.mock_repo,
                 rules_config=self.mock_yaml,
-                sentiment_analysis=self.mock_nlp,
+                sentiment_scheduler=self.sentiment_scheduler,
+                nlp_preprocess=self.mock_preprocess,
+                sentiment_queue=self.mock_sentiment_queue,
                 config=self.config,
             )
 
@@ -86,6 +97,96 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
             None,
         )
 
+    async def test_create_comment_stores_lemmas(self):
+        return_comment = Comment(
+            id=7,
+            project_id=2,
+            user_id="123",
+            timestamp=self.datetime.isoformat(),
+            feature_url="http://test.com",
+            rating=5,
+            comment="This is a test comment",
+            language="en",
+        )
+        self.mock_yaml.matchFeature.return_value = "project1", self.mock_rule
+        self.mock_rule.delay_to_answer = 5
+        self.mock_nlp.analyze.return_value = None, None
+        self.mock_repo.create_comment.return_value = return_comment
+        self.mock_preprocess.nlp_enabled = True
+        self.mock_preprocess.texts_preprocess.return_value = [["test", "comment"]]
+
+        with patch("survey_logic.comments.get_encryption_from_project_name") as mock_crypto:
+            mock_crypto.return_value = self.encryption
+            await logic.create_comment(
+                self.feature_url,
+                self.rating,
+                self.comment,
+                self.user_id,
+                "123",
+                self.encryption.encrypt(str(self.datetime.timestamp())),
+                sqlite_repo=self.mock_repo,
+                rules_config=self.mock_yaml,
+                sentiment_scheduler=self.sentiment_scheduler,
+                nlp_preprocess=self.mock_preprocess,
+                sentiment_queue=self.mock_sentiment_queue,
+                inference_pool=self.inference_pool,
+                config=self.config,
+            )
+
+        self.mock_preprocess.texts_preprocess.assert_called_once_with([(self.comment, "en")])
+        self.mock_repo.save_comment_lemmas.assert_awaited_once_with({7: ["test", "comment"]})
+
+    async def test_create_comment_background_sentiment(self):
+        return_comment = Comment(
+            id=8,
+            project_id=2,
+            user_id="123",
+            timestamp=self.datetime.isoformat(),
+            feature_url="http://test.com",
+            rating=5,
+            comment="This is a test comment",
+            language="unknown",
+        )
+        self.mock_yaml.matchFeature.return_value = "project1", self.mock_rule
+        self.mock_rule.delay_to_answer = 5
+        self.mock_repo.create_comment.return_value = return_comment
+        self.mock_preprocess.nlp_enabled = True
+        self.mock_sentiment_queue.enabled = True
+
+        with patch("survey_logic.comments.get_encryption_from_project_name") as mock_crypto:
+            mock_crypto.return_value = self.encryption
+            result = await logic.create_comment(
+                self.feature_url,
+                self.rating,
+                self.comment,
+                self.user_id,
+                "123",
+                self.encryption.encrypt(str(self.datetime.timestamp())),
+                sqlite_repo=self.mock_repo,
+                rules_config=self.mock_yaml,
+                sentiment_scheduler=self.sentiment_scheduler,
+                nlp_preprocess=self.mock_preprocess,
+                sentiment_queue=self.mock_sentiment_queue,
+                config=self.config,
+            )
+
+        self.assertEqual(result, return_comment)
+        # Saved without language nor sentiment, they are filled by the queue
+        self.mock_repo.create_comment.assert_called_once_with(
+            self.feature_url,
+            self.rating,
+            self.comment,
+            "123",
+            self.datetime.isoformat(),
+            "project1",
+            "unknown",
+            None,
+            None,
+        )
+        self.mock_nlp.analyze_batch.assert_not_called()
+        self.mock_sentiment_queue.put.assert_awaited_once_with(8)
+        self.mock_repo.save_comment_lemmas.assert_not_called()
+
     async def test_create_comment_fingerprint(self):
         """
         Same as test_create_comment but checks if the user_id is taken from the body instead of the cookie
@@ -104,8 +205,7 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
             sentiment=None,
             sentiment_score=None,
         )
-        self.mock_yaml.getProjectNameFromFeature.return_value = project_name
-        self.mock_yaml.getRuleFromFeature.return_value = self.mock_rule
+        self.mock_yaml.matchFeature.return_value = project_name, self.mock_rule
         self.mock_rule.delay_to_answer = 5
         self.mock_nlp.analyze.return_value = None, None
         config = {"use_fingerprint": True}
@@ -124,7 +224,9 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
                 ),
                 sqlite_repo=self.mock_repo,
                 rules_config=self.mock_yaml,
-                sentiment_analysis=self.mock_nlp,
+                sentiment_scheduler=self.sentiment_scheduler,
+                nlp_preprocess=self.mock_preprocess,
+                sentiment_queue=self.mock_sentiment_queue,
                 config=config,
             )
 
@@ -145,7 +247,7 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
         """
         Test case when feature/project is not found in the YAML config
         """
-        self.mock_yaml.getProjectNameFromFeature.return_value = None
+        self.mock_yaml.matchFeature.return_value = None, None
         
         with self.assertRaises(HTTPException) as cm:
             await logic.create_comment(
@@ -159,7 +261,9 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
                 ),
                 sqlite_repo=self.mock_repo,
                 rules_config=self.mock_yaml,
-                sentiment_analysis=self.mock_nlp,
+                sentiment_scheduler=self.sentiment_scheduler,
+                nlp_preprocess=self.mock_preprocess,
+                sentiment_queue=self.mock_sentiment_queue,
                 config=self.config,
             )
         self.assertEqual(cm.exception.status_code, 404)
@@ -168,7 +272,7 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
         """
         Test case when cookies are missing
         """
-        self.mock_yaml.getProjectNameFromFeature.return_value = "project1"
+        self.mock_yaml.matchFeature.return_value = "project1", self.mock_rule
 
         with self.assertRaises(HTTPException) as cm:
             await logic.create_comment(
@@ -180,7 +284,9 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
                 None,
                 sqlite_repo=self.mock_repo,
                 rules_config=self.mock_yaml,
-                sentiment_analysis=self.mock_nlp,
+                sentiment_scheduler=self.sentiment_scheduler,
+                nlp_preprocess=self.mock_preprocess,
+                sentiment_queue=self.mock_sentiment_queue,
                 config=self.config,
             )
         self.assertEqual(cm.exception.status_code, 422)
@@ -189,8 +295,7 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
         """
         Test case when the delay to submit a comment has elapsed
         """
-        self.mock_yaml.getProjectNameFromFeature.return_value = "project1"
-        self.mock_yaml.getRuleFromFeature.return_value = self.mock_rule
+        self.mock_yaml.matchFeature.return_value = "project1", self.mock_rule
         self.mock_rule.delay_to_answer = 5
         elpased_datetime = self.datetime - timedelta(minutes=10)
         
@@ -208,7 +313,9 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
                 ),
                 sqlite_repo=self.mock_repo,
                 rules_config=self.mock_yaml,
-                sentiment_analysis=self.mock_nlp,
+                sentiment_scheduler=self.sentiment_scheduler,
+                nlp_preprocess=self.mock_preprocess,
+                sentiment_queue=self.mock_sentiment_queue,
                 config=self.config,
             )
 
@@ -218,7 +325,7 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
         """
         Test case when the timestamp is invalid/cannot be decrypted
         """
-        self.mock_yaml.getProjectNameFromFeature.return_value = "project1"
+        self.mock_yaml.matchFeature.return_value = "project1", self.mock_rule
 
         with patch("survey_logic.comments.get_encryption_from_project_name") as mock_crypto, \
         self.assertRaises(HTTPException) as cm:
@@ -232,10 +339,78 @@ class TestComments(unittest.IsolatedAsyncioTestCase):
                 "jdsodkcvhjsdknv",
                 sqlite_repo=self.mock_repo,
                 rules_config=self.mock_yaml,
-                sentiment_analysis=self.mock_nlp,
+                sentiment_scheduler=self.sentiment_scheduler,
+                nlp_preprocess=self.mock_preprocess,
+                sentiment_queue=self.mock_sentiment_queue,
                 config=self.config,
             )
 
         self.assertEqual(cm.exception.status_code, 422)
 
-    
\ No newline at end of file
+    
+    def make_comments(self, count):
+        return [
+            Comment(
+                id=i,
+                project_id=1,
+                user_id=self.user_id,
+                timestamp=f"2023-01-0{i}T00:00:00",
+                feature_url=self.feature_url,
+                rating=self.rating,
+                comment=self.comment,
+                language="en",
+            )
+            for i in range(1, count + 1)
+        ]
+
+    async def test_get_comments(self):
+        comments = self.make_comments(2)
+        self.mock_repo.read_comments_page.return_value = comments, 5
+
+        result = await logic.get_comments(
+            rating_min=3, page=3, page_size=2, sqlite_repo=self.mock_repo
+        )
+
+        self.assertEqual(result, (comments, 5))
+        # The page and the total come from the same read
+        self.mock_repo.read_comments_page.assert_awaited_once()
+        self.assertEqual(self.mock_repo.read_comments_page.call_args.args, (3, 2))
+        self.assertEqual(self.mock_repo.read_comments_page.call_args.kwargs["rating_min"], 3)
+
+    async def test_get_comments_from_cursor(self):
+        comments = self.make_comments(3)
+        self.mock_repo.read_comments_after.return_value = comments
+
+        result, page, next_cursor = await logic.get_comments_from_cursor(
+            cursor="", page_size=2, rating_min=3, sqlite_repo=self.mock_repo
+        )
+
+        self.assertEqual(result, comments[:2])
+        self.assertEqual(page, 1)
+        self.assertIsNotNone(next_cursor)
+        self.assertEqual(self.mock_repo.read_comments_after.call_args.kwargs["after"], None)
+        self.assertEqual(self.mock_repo.read_comments_after.call_args.kwargs["limit"], 3)
+        self.assertEqual(self.mock_repo.read_comments_after.call_args.kwargs["rating_min"], 3)
+
+        # The next page starts after the last comment of this one
+        self.mock_repo.read_comments_after.return_value = comments[2:]
+        result, page, next_cursor = await logic.get_comments_from_cursor(
+            cursor=next_cursor, page_size=2, rating_min=3, sqlite_repo=self.mock_repo
+        )
+
+        self.assertEqual(result, comments[2:])
+        self.assertEqual(page, 2)
+        self.assertIsNone(next_cursor)
+        self.assertEqual(
+            self.mock_repo.read_comments_after.call_args.kwargs["after"],
+            ("2023-01-02T00:00:00", 2),
+        )
+
+    async def test_get_comments_from_invalid_cursor(self):
+        with self.assertRaises(HTTPException) as cm:
+            await logic.get_comments_from_cursor(
+                cursor="not a cursor", sqlite_repo=self.mock_repo
+            )
+
+        self.assertEqual(cm.exception.status_code, 422)
+        self.mock_repo.read_comments_after.assert_not_called()
@@ -0,0 +1,128 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+from repository.display_queue import DisplayQueue
+from repository.sqlite_repository import SQLiteRepository
+
+
+class TestDisplayQueue(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.mock_repo = Mock(spec=SQLiteRepository)
+        self.mock_repo.create_displays = AsyncMock(side_effect=lambda batch: len(batch))
+        self.config = {
+            "display_batch_size": 3,
+            "display_flush_interval_ms": 50,
+            "display_queue_size": 5,
+        }
+        self.queue = DisplayQueue(self.mock_repo, self.config)
+
+    async def asyncTearDown(self):
+        await self.queue.stop()
+
+    def record(self, i):
+        return ("project1", f"user{i}", "2023-05-01T10:00:00", "http://test.com")
+
+    async def test_write_without_task(self):
+        await self.queue.put(*self.record(1))
+        self.mock_repo.create_displays.assert_awaited_once_with([self.record(1)])
+
+    async def test_flush_full_batch(self):
+        self.queue.start()
+        for i in range(3):
+            await self.queue.put(*self.record(i))
+        await asyncio.sleep(0.01)
+
+        # Written before the flush interval
+        self.mock_repo.create_displays.assert_awaited_once_with(
+            [self.record(0), self.record(1), self.record(2)]
+        )
+
+    async def test_flush_after_interval(self):
+        self.queue.start()
+        await self.queue.put(*self.record(1))
+        await asyncio.sleep(0.01)
+        self.mock_repo.create_displays.assert_not_awaited()
+        self.assertEqual(self.queue.metrics()["depth"], 0)
+
+        await asyncio.sleep(0.1)
+        self.mock_repo.create_displays.assert_awaited_once_with([self.record(1)])
+        self.assertEqual(self.queue.metrics()["written"], 1)
+
+    async def test_flush_on_stop(self):
+        self.config["display_flush_interval_ms"] = 60000
+        self.queue = DisplayQueue(self.mock_repo, self.config)
+        self.queue.start()
+        await self.queue.put(*self.record(1))
+        await self.queue.put(*self.record(2))
+
+        await self.queue.stop()
+
+        self.mock_repo.create_displays.assert_awaited_once_with([self.record(1), self.record(2)])
+
+    async def test_backpressure(self):
+        blocked = asyncio.Event()
+
+        async def slow_write(batch):
+            await blocked.wait()
+            return len(batch)
+
+        self.mock_repo.create_displays = AsyncMock(side_effect=slow_write)
+        self.queue.start()
+        # First batch taken by the task, then stuck in the database write
+        for i in range(3):
+            await self.queue.put(*self.record(i))
+        await asyncio.sleep(0.01)
+        for i in range(5):
+            await self.queue.put(*self.record(i))
+        self.assertEqual(self.queue.metrics()["depth"], 5)
+
+        put = asyncio.create_task(self.queue.put(*self.record(5)))
+        await asyncio.sleep(0.01)
+        self.assertFalse(put.done())
+
+        blocked.set()
+        await asyncio.wait_for(put, 1)
+
+    async def test_failed_write(self):
+        self.mock_repo.create_displays = AsyncMock(side_effect=Exception("database is locked"))
+        self.queue.start()
+        for i in range(3):
+            await self.queue.put(*self.record(i))
+        await asyncio.sleep(0.01)
+
+        metrics = self.queue.metrics()
+        self.assertEqual(metrics["failed"], 3)
+        self.assertEqual(metrics["written"], 0)
+
+    async def test_stop_after_task_died(self):
+        self.queue.start()
+        self.queue._worker.cancel()
+        await asyncio.sleep(0)
+        await self.queue.put(*self.record(1))
+        await self.queue.put(*self.record(2))
+
+        await asyncio.wait_for(self.queue.stop(), 1)
+
+        self.mock_repo.create_displays.assert_awaited_once_with([self.record(1), self.record(2)])
+
+    async def test_stop_timeout(self):
+        blocked = asyncio.Event()
+
+        async def stuck_write(batch):
+            await blocked.wait()
+            return len(batch)
+
+        self.mock_repo.create_displays = AsyncMock(side_effect=stuck_write)
+        self.queue.STOP_TIMEOUT = 0.05
+        self.queue.start()
+        await self.queue.put(*self.record(1))
+        await asyncio.sleep(0.06)
+
+        # Gives up on the stuck write instead of waiting forever
+        with self.assertLogs(level="ERROR") as logs:
+            await asyncio.wait_for(self.queue.stop(), 1)
+        self.assertEqual(self.queue.metrics()["written"], 0)
+        # The records of the cancelled write are reported
+        self.assertEqual(self.queue.metrics()["failed"], 1)
+        self.assertIn("1 displays discarded", logs.output[-1])
@@ -0,0 +1,216 @@
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+import importlib.util
+import os
+import signal
+import time
+import unittest
+from unittest.mock import Mock
+
+from models.comment import SentimentEnum
+from utils.inference_pool import InferencePool
+from utils.nlp import LanguageModels, NlpPreprocess, SentimentAnalysis
+from utils.onnx_sentiment import onnx_model_path
+
+MODELS_FOLDER = os.environ.get("SENTIMENT_ANALYSIS_MODELS_FOLDER", "./data/sentiment_models")
+
+
+class FakeSentimentAnalysis:
+    """
+    Stands for the loaded models, inherited by the forked workers
+    """
+
+    analysis_enabled = True
+    backend = "onnx"
+    LANGUAGES = SentimentAnalysis.LANGUAGES
+
+    def __init__(self, ttl=0):
+        self.models = LanguageModels(lambda lang: object(), self.LANGUAGES, ttl)
+
+    def analyze_batch(self, texts, lang):
+        if "crash" in texts:
+            os._exit(1)
+        # The score tells which process ran the batch
+        return [(SentimentEnum.POSITIVE, float(os.getpid()))] * len(texts)
+
+
+class FakeNlpPreprocess:
+    nlp_enabled = True
+    LANGUAGES = NlpPreprocess.LANGUAGES
+
+    def __init__(self):
+        self.pipelines = LanguageModels(lambda lang: object(), self.LANGUAGES)
+
+    def texts_preprocess(self, texts, n_process=1):
+        return [text.lower().split() for text, _ in texts]
+
+
+class TestInferencePoolThread(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.sentiment_analysis = Mock(spec=SentimentAnalysis)
+        self.sentiment_analysis.analyze_batch.return_value = [(SentimentEnum.NEGATIVE, 0.8)]
+        self.nlp_preprocess = Mock(spec=NlpPreprocess)
+        self.nlp_preprocess.texts_preprocess.return_value = [["bad"]]
+        self.pool = InferencePool(self.sentiment_analysis, self.nlp_preprocess, {})
+
+    async def asyncTearDown(self):
+        await self.pool.stop()
+
+    async def test_in_process(self):
+        self.assertFalse(self.pool.enabled)
+
+        self.assertEqual(await self.pool.analyze_batch(["Bad"], "en"), [(SentimentEnum.NEGATIVE, 0.8)])
+        self.assertEqual(await self.pool.texts_preprocess([("Bad", "en")]), [["bad"]])
+
+        self.sentiment_analysis.analyze_batch.assert_called_once_with(["Bad"], "en")
+        self.nlp_preprocess.texts_preprocess.assert_called_once_with([("Bad", "en")])
+        # The models are loaded out of the inference thread
+        self.sentiment_analysis.load_models.assert_awaited_once_with("en")
+        self.nlp_preprocess.load_pipelines.assert_awaited_once_with({"en"})
+        metrics = await self.pool.metrics()
+        self.assertEqual(metrics["status"], "ok")
+        self.assertEqual((metrics["workers"], metrics["tasks"], metrics["restarts"]), (0, 2, 0))
+
+    async def test_errors_raised(self):
+        self.sentiment_analysis.analyze_batch.side_effect = NotImplementedError()
+
+        with self.assertRaises(NotImplementedError):
+            await self.pool.analyze_batch(["Schlecht"], "de")
+
+    async def test_timeout(self):
+        pool = InferencePool(self.sentiment_analysis, self.nlp_preprocess, {"inference_timeout": 0.05})
+        self.sentiment_analysis.analyze_batch.side_effect = lambda texts, lang: time.sleep(0.2)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await pool.analyze_batch(["Bad"], "en")
+
+        # Still running in the inference thread
+        self.assertEqual((await pool.health())["status"], "unavailable")
+        metrics = await pool.metrics()
+        self.assertEqual((metrics["tasks"], metrics["timeouts"]), (0, 1))
+        await asyncio.sleep(0.2)
+        self.assertEqual((await pool.health())["status"], "ok")
+        await pool.stop()
+
+    async def test_no_workers_with_tensorflow(self):
+        self.sentiment_analysis.analysis_enabled = True
+        self.sentiment_analysis.backend = "tensorflow"
+        pool = InferencePool(self.sentiment_analysis, self.nlp_preprocess, {"inference_workers": 2})
+
+        with self.assertLogs(level="WARNING"):
+            pool.start()
+
+        self.assertFalse(pool.enabled)
+        self.assertEqual((await pool.metrics())["workers"], 0)
+        self.assertEqual(await pool.analyze_batch(["Bad"], "en"), [(SentimentEnum.NEGATIVE, 0.8)])
+        await pool.stop()
+
+
+class TestInferencePoolProcesses(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = InferencePool(FakeSentimentAnalysis(), FakeNlpPreprocess(), {"inference_workers": 2})
+        self.pool.start()
+
+    async def asyncTearDown(self):
+        await self.pool.stop()
+
+    async def worker_pid(self) -> int:
+        (_, pid), = await self.pool.analyze_batch(["Great"], "en")
+        return int(pid)
+
+    async def test_run_in_workers(self):
+        results = await asyncio.gather(
+            self.pool.analyze_batch(["Great", "Nice"], "en"),
+            self.pool.texts_preprocess([("Très bien", "fr")]),
+        )
+
+        self.assertEqual([sentiment for sentiment, _ in results[0]], [SentimentEnum.POSITIVE] * 2)
+        self.assertNotEqual(int(results[0][0][1]), os.getpid())
+        self.assertEqual(results[1], [["très", "bien"]])
+        self.assertEqual(self.pool.tasks, 2)
+        # The health checks are not tasks
+        await self.pool.health()
+        self.assertEqual(self.pool.tasks, 2)
+
+    async def test_restart_killed_worker(self):
+        os.kill(await self.worker_pid(), signal.SIGKILL)
+        # Leaves the pool the time to notice
+        await asyncio.sleep(0.5)
+
+        self.assertNotEqual(await self.worker_pid(), os.getpid())
+        self.assertEqual(self.pool.restarts, 1)
+        self.assertEqual((await self.pool.health())["status"], "ok")
+
+    async def test_crash_during_batch(self):
+        # Retried once on the restarted workers, where it crashes again
+        with self.assertRaises(BrokenProcessPool):
+            await self.pool.analyze_batch(["crash"], "en")
+
+        self.assertEqual(self.pool.restarts, 1)
+        self.assertNotEqual(await self.worker_pid(), os.getpid())
+        self.assertEqual(self.pool.restarts, 2)
+
+    async def test_models_loaded_before_fork(self):
+        sentiment_analysis = FakeSentimentAnalysis(ttl=60)
+        pool = InferencePool(sentiment_analysis, FakeNlpPreprocess(), {"inference_workers": 1})
+
+        with self.assertLogs(level="WARNING"):
+            pool.start()
+
+        # Shared with the workers, and never unloaded
+        self.assertEqual(sentiment_analysis.models.loaded(), ["en", "fr"])
+        self.assertEqual(pool.nlp_preprocess.pipelines.loaded(), ["en", "fr"])
+        self.assertEqual(sentiment_analysis.models.ttl, 0)
+        await pool.stop()
+
+    async def test_health(self):
+        health = await self.pool.health()
+
+        self.assertEqual(health["status"], "ok")
+        self.assertGreaterEqual(health["latency_ms"], 0)
+
+
+@unittest.skipUnless(
+    os.path.exists(onnx_model_path(os.path.join(MODELS_FOLDER, "english"), True))
+    and os.path.exists(onnx_model_path(os.path.join(MODELS_FOLDER, "french"), True))
+    and importlib.util.find_spec("onnxruntime"),
+    "needs the sentiment analysis models exported to ONNX and ONNX Runtime",
+)
+class TestInferencePoolOnnx(unittest.IsolatedAsyncioTestCase):
+    """
+    Runs the exported ONNX models in the worker processes
+    """
+
+    async def asyncSetUp(self):
+        self.sentiment_analysis = SentimentAnalysis(
+            {
+                "use_sentiment_analysis": True,
+                "sentiment_analysis_backend": "onnx",
+                "sentiment_analysis_models_folder": MODELS_FOLDER,
+                "nlp_preload_languages": [],
+            }
+        )
+        self.pool = InferencePool(
+            self.sentiment_analysis, FakeNlpPreprocess(), {"inference_workers": 2}
+        )
+        self.pool.start()
+
+    async def asyncTearDown(self):
+        await self.pool.stop()
+
+    async def test_analyze_in_workers(self):
+        results = await asyncio.gather(
+            self.pool.analyze_batch(["I love this new feature, great work!"], "en"),
+            self.pool.analyze_batch(["Impossible de valider, rien ne marche."], "fr"),
+        )
+
+        self.assertEqual(
+            [sentiment for (sentiment, _), in results],
+            [SentimentEnum.POSITIVE, SentimentEnum.NEGATIVE],
+        )
+        self.assertEqual(self.sentiment_analysis.models.loaded(), ["en", "fr"])
+        self.assertEqual(self.pool.tasks, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+from survey_logic import metrics as logic
+from repository.display_queue import DisplayQueue
+from repository.sentiment_queue import SentimentQueue
+from utils.inference_pool import InferencePool
+from utils.model_unloader import ModelUnloader
+from utils.sentiment_cache import SentimentCache
+from utils.sentiment_scheduler import SentimentScheduler
+from repository.yaml_rule_repository import YamlRulesRepository
+
+
+class TestMetrics(unittest.IsolatedAsyncioTestCase):
+    async def test_get_metrics(self):
+        cache_info = {
+            "rules_version": 1,
+            "hits": 3,
+            "misses": 1,
+            "size": 1,
+            "max_size": 1024,
+        }
+        mock_yaml_repo = Mock(spec=YamlRulesRepository)
+        mock_yaml_repo.getFeatureCacheInfo.return_value = cache_info
+        queue_metrics = {
+            "depth": 2,
+            "max_size": 10000,
+            "written": 40,
+            "failed": 0,
+            "batches": 4,
+            "last_batch_size": 10,
+        }
+        mock_display_queue = Mock(spec=DisplayQueue)
+        mock_display_queue.metrics.return_value = queue_metrics
+        sentiment_metrics = {
+            "mode": "background",
+            "depth": 3,
+            "analyzed": 12,
+            "errors": 0,
+            "failed": 0,
+            "batches": 2,
+            "last_batch_size": 4,
+        }
+        mock_sentiment_queue = Mock(spec=SentimentQueue)
+        mock_sentiment_queue.metrics.return_value = sentiment_metrics
+        inference_metrics = {
+            "batch_size": 8,
+            "timeout_ms": 20,
+            "depth": 0,
+            "analyzed": 12,
+            "errors": 0,
+            "batches": 3,
+            "batch_sizes": {2: 1, 5: 2},
+            "latency_ms": {"p50": 120.5, "p95": 240.1, "p99": 251.0, "max": 251.0},
+        }
+        mock_sentiment_scheduler = Mock(spec=SentimentScheduler)
+        mock_sentiment_scheduler.metrics.return_value = inference_metrics
+        models_metrics = {"ttl": 3600, "sentiment_analysis": ["en"], "nlp_preprocess": [], "unloaded": 2}
+        mock_model_unloader = Mock(spec=ModelUnloader)
+        mock_model_unloader.metrics.return_value = models_metrics
+        cache_metrics = {
+            "model_version": "3f2a9c1d0b7e4a65",
+            "size": 120,
+            "max_size": 10000,
+            "persistent": True,
+            "hits": 300,
+            "persistent_hits": 20,
+            "misses": 180,
+            "hit_rate": 0.64,
+        }
+        mock_sentiment_cache = Mock(spec=SentimentCache)
+        mock_sentiment_cache.metrics.return_value = cache_metrics
+        pool_metrics = {
+            "workers": 2, "tasks": 40, "restarts": 1, "timeouts": 0, "status": "ok", "latency_ms": 1.2, "stuck": 0
+        }
+        mock_inference_pool = Mock(spec=InferencePool)
+        mock_inference_pool.metrics = AsyncMock(return_value=pool_metrics)
+
+        result = await logic.get_metrics(
+            rules_config=mock_yaml_repo,
+            display_queue=mock_display_queue,
+            sentiment_queue=mock_sentiment_queue,
+            sentiment_scheduler=mock_sentiment_scheduler,
+            model_unloader=mock_model_unloader,
+            sentiment_cache=mock_sentiment_cache,
+            inference_pool=mock_inference_pool,
+        )
+
+        self.assertEqual(
+            result,
+            {
+                "rules_cache": cache_info,
+                "display_queue": queue_metrics,
+                "sentiment_queue": sentiment_metrics,
+                "sentiment_inference": inference_metrics,
+                "sentiment_cache": cache_metrics,
+                "models": models_metrics,
+                "inference_pool": pool_metrics,
+            },
+        )
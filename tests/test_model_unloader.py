@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+from unittest.mock import Mock, patch
+
+from utils.model_unloader import ModelUnloader
+from utils.nlp import LanguageModels, NlpPreprocess, SentimentAnalysis
+
+
+class TestModelUnloader(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.sentiment_analysis = Mock(spec=SentimentAnalysis)
+        self.sentiment_analysis.models = LanguageModels(lambda lang: Mock(), ["en", "fr"], ttl=60)
+        self.nlp_preprocess = Mock(spec=NlpPreprocess)
+        self.nlp_preprocess.pipelines = LanguageModels(lambda lang: Mock(), ["en", "fr"], ttl=60)
+        self.unloader = ModelUnloader(self.sentiment_analysis, self.nlp_preprocess, {"nlp_models_ttl": 60})
+
+    async def asyncTearDown(self):
+        await self.unloader.stop()
+
+    def test_unload_idle(self):
+        with patch("utils.nlp.time.monotonic", return_value=1000):
+            self.sentiment_analysis.models.get("en")
+            self.sentiment_analysis.models.get("fr")
+            self.nlp_preprocess.pipelines.get("fr")
+        with patch("utils.nlp.time.monotonic", return_value=1050):
+            self.sentiment_analysis.models.get("en")
+
+        with patch("utils.nlp.time.monotonic", return_value=1070):
+            self.assertEqual(self.unloader.unload_idle(), ["fr", "fr"])
+
+        self.assertEqual(
+            self.unloader.metrics(),
+            {"ttl": 60, "sentiment_analysis": ["en"], "nlp_preprocess": [], "unloaded": 2},
+        )
+
+    async def test_disabled_without_ttl(self):
+        unloader = ModelUnloader(self.sentiment_analysis, self.nlp_preprocess, {"nlp_models_ttl": 0})
+        unloader.start()
+        self.assertIsNone(unloader._worker)
+
+    async def test_checked_periodically(self):
+        self.unloader.interval = 0.01
+        self.unloader.unload_idle = Mock(return_value=[])
+        self.unloader.start()
+        await self.wait_for_calls(self.unloader.unload_idle, 2)
+
+    async def wait_for_calls(self, mock, count):
+        for _ in range(100):
+            if mock.call_count >= count:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"Called {mock.call_count} times")
@@ -1,7 +1,33 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
 import nltk
+import numpy as np
+import spacy
+from spacy.language import Language
 
-from utils.nlp import NlpPreprocess, SentimentAnalysis
+from models.comment import SentimentEnum
+from utils.nlp import LanguageModels, NlpPreprocess, SentimentAnalysis
+
+
+@Language.component("fake_lemmatizer")
+def fake_lemmatizer(doc):
+    # Stands for the tagger and lemmatizer of the real models
+    for token in doc:
+        token.lemma_ = token.lower_.rstrip("s")
+        token.pos_ = "PUNCT" if token.is_punct else "NOUN"
+    return doc
+
+
+def load_test_pipeline(name, exclude=()):
+    nlp = spacy.blank(name[:2])
+    nlp.add_pipe("fake_lemmatizer")
+    return nlp
 
 class TestPreprocess(unittest.TestCase):
 
@@ -28,9 +54,201 @@ class TestPreprocess(unittest.TestCase):
         result = nlp.text_preprocess("something")
         self.assertIsNone(result)
 
+class TestBatchPreprocess(unittest.TestCase):
+
+    def setUp(self):
+        with patch("utils.nlp.spacy.load", side_effect=load_test_pipeline) as self.mock_load, \
+                patch("utils.nlp.stopwords", Mock(words=Mock(return_value=["the", "are", "and", "sont"]))):
+            self.nlp_preprocess = NlpPreprocess(
+                config={"use_nlp_preprocess": True, "nlp_batch_size": 2}
+            )
+
+    def test_unused_components_excluded(self):
+        for call in self.mock_load.call_args_list:
+            self.assertEqual(call.kwargs["exclude"], ["parser", "senter", "ner"])
+
+    def test_texts_preprocess(self):
+        texts = [
+            ("The cats are sitting.", "en"),
+            ("Les chats sont assis.", "fr"),
+            ("Something", "de"),
+            ("Bats and rats!", "en"),
+            ("Three mats, two hats", "en"),
+        ]
+
+        result = self.nlp_preprocess.texts_preprocess(texts)
+
+        self.assertEqual(
+            result,
+            [["cat", "sitting"], ["le", "chat", "assi"], None, ["bat", "rat"], ["three", "mat", "two", "hat"]],
+        )
+        # Same result as preprocessing the texts one by one
+        for (text, lang), words in zip(texts, result):
+            if lang != "de":
+                self.assertEqual(self.nlp_preprocess.text_preprocess(text, lang), words)
+
+    def test_texts_preprocess_disabled(self):
+        nlp = NlpPreprocess(config={"use_nlp_preprocess": False})
+        self.assertEqual(nlp.texts_preprocess([("something", "en"), ("autre", "fr")]), [None, None])
+
+
+class TestLanguageModels(unittest.TestCase):
+
+    def setUp(self):
+        self.load = Mock(side_effect=lambda lang: f"{lang} model")
+        self.models = LanguageModels(self.load, ["en", "fr"], ttl=60)
+
+    def test_loaded_on_first_use(self):
+        self.assertEqual(self.models.loaded(), [])
+        self.assertEqual(self.models.get("fr"), "fr model")
+        self.assertEqual(self.models.get("fr"), "fr model")
+
+        self.load.assert_called_once_with("fr")
+        self.assertEqual(self.models.loaded(), ["fr"])
+
+    def test_loaded_once_by_concurrent_uses(self):
+        def slow_load(lang):
+            time.sleep(0.05)
+            return f"{lang} model"
+
+        self.load.side_effect = slow_load
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(self.models.get, ["en", "en", "fr", "en"]))
+
+        self.assertEqual(results, ["en model", "en model", "fr model", "en model"])
+        self.assertCountEqual([call.args[0] for call in self.load.call_args_list], ["en", "fr"])
+
+    def test_load_from_coroutines(self):
+        def slow_load(lang):
+            time.sleep(0.1)
+            return f"{lang} model"
+
+        async def load_while_serving():
+            ticks = 0
+
+            async def serve():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            server = asyncio.create_task(serve())
+            results = await asyncio.gather(*(self.models.load(lang) for lang in ["en", "en", "fr"]))
+            server.cancel()
+            return results, ticks
+
+        self.load.side_effect = slow_load
+        results, ticks = asyncio.run(load_while_serving())
+
+        self.assertEqual(results, ["en model", "en model", "fr model"])
+        self.assertCountEqual([call.args[0] for call in self.load.call_args_list], ["en", "fr"])
+        # The event loop kept running during the loads
+        self.assertGreater(ticks, 3)
+
+    def test_preload(self):
+        self.models.preload(["en", "de"])
+        self.assertEqual(self.models.loaded(), ["en"])
+
+    def test_unload_idle(self):
+        with patch("utils.nlp.time.monotonic", return_value=1000):
+            self.models.get("en")
+        with patch("utils.nlp.time.monotonic", return_value=1050):
+            self.models.get("fr")
+
+        with patch("utils.nlp.time.monotonic", return_value=1070):
+            self.assertEqual(self.models.unload_idle(), ["en"])
+        self.assertEqual(self.models.loaded(), ["fr"])
+
+        # Loaded again by the next use
+        self.models.get("en")
+        self.assertEqual(self.load.call_count, 3)
+
+    def test_never_unloaded_without_ttl(self):
+        models = LanguageModels(self.load, ["en", "fr"])
+        with patch("utils.nlp.time.monotonic", return_value=1000):
+            models.get("en")
+        with patch("utils.nlp.time.monotonic", return_value=100000):
+            self.assertEqual(models.unload_idle(), [])
+        self.assertEqual(models.loaded(), ["en"])
+
+
+class TestLazyPreprocess(unittest.TestCase):
+
+    def setUp(self):
+        for patcher in [
+            patch("utils.nlp.spacy.load", side_effect=load_test_pipeline),
+            patch("utils.nlp.stopwords", Mock(words=Mock(return_value=["the", "le"]))),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_preloaded_languages(self):
+        nlp_preprocess = NlpPreprocess(
+            config={"use_nlp_preprocess": True, "nlp_preload_languages": ["fr"]}
+        )
+        self.assertEqual(nlp_preprocess.pipelines.loaded(), ["fr"])
+
+    def test_loaded_by_first_text(self):
+        nlp_preprocess = NlpPreprocess(
+            config={"use_nlp_preprocess": True, "nlp_preload_languages": []}
+        )
+        self.assertEqual(nlp_preprocess.pipelines.loaded(), [])
+
+        self.assertEqual(nlp_preprocess.texts_preprocess([("Les chats", "fr")]), [["chat"]])
+        self.assertEqual(nlp_preprocess.pipelines.loaded(), ["fr"])
+
+
 class TestSentimentAnalysis(unittest.TestCase):
 
     def test_analysis_disabled(self):
         analysis = SentimentAnalysis(config={"use_sentiment_analysis": False})
         result = analysis.analyze("something")
         self.assertEqual(result, (None, None))
+        self.assertEqual(analysis.analyze_batch(["something", "else"]), [(None, None), (None, None)])
+
+    def test_model_version(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        for language_folder in ["english", "french"]:
+            os.mkdir(os.path.join(folder, language_folder))
+            with open(os.path.join(folder, language_folder, "tf_model.h5"), "w") as model_file:
+                model_file.write("weights")
+        config = {
+            "use_sentiment_analysis": True,
+            "sentiment_analysis_models_folder": folder,
+            "nlp_preload_languages": [],
+        }
+
+        version = SentimentAnalysis(config).model_version()
+        self.assertEqual(SentimentAnalysis(config).model_version(), version)
+        self.assertNotEqual(SentimentAnalysis({**config, "sentiment_analysis_backend": "onnx"}).model_version(), version)
+        self.assertEqual(SentimentAnalysis({"use_sentiment_analysis": False}).model_version(), "disabled")
+
+        # Downloaded again
+        with open(os.path.join(folder, "french", "tf_model.h5"), "w") as model_file:
+            model_file.write("new weights")
+        self.assertNotEqual(SentimentAnalysis(config).model_version(), version)
+
+    def test_analyze_batch(self):
+        analysis = SentimentAnalysis(config={"use_sentiment_analysis": False})
+        analysis.analysis_enabled = True
+        tokenizer = Mock(return_value={"input_ids": "ids", "attention_mask": "mask"})
+        model = Mock()
+        model.config.id2label = {0: "NEGATIVE", 1: "POSITIVE"}
+        model.return_value.logits.numpy.return_value = np.array([[0.0, 0.0], [2.0, 0.0], [0.0, 3.0]])
+        analysis.models = LanguageModels(lambda lang: (model, tokenizer), ["en", "fr"])
+
+        results = analysis.analyze_batch(["fine", "bad", "great"], "en")
+
+        # A single padded pass of the model
+        tokenizer.assert_called_once_with(
+            ["fine", "bad", "great"], padding=True, truncation=True, return_tensors="tf"
+        )
+        model.assert_called_once_with(input_ids="ids", attention_mask="mask")
+        self.assertEqual([sentiment for sentiment, _ in results], [SentimentEnum.NEGATIVE, SentimentEnum.NEGATIVE, SentimentEnum.POSITIVE])
+        self.assertAlmostEqual(results[0][1], 0.5)
+        self.assertAlmostEqual(results[1][1], 0.8808, places=4)
+        self.assertAlmostEqual(results[2][1], 0.9526, places=4)
+
+        with self.assertRaises(NotImplementedError):
+            analysis.analyze_batch(["gut"], "de")
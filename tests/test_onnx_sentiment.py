@@ -0,0 +1,142 @@
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import numpy as np
+
+from models.comment import SentimentEnum
+from utils import onnx_sentiment
+from utils.nlp import LanguageModels, SentimentAnalysis
+from utils.onnx_sentiment import OnnxSentimentModel, export_onnx_model, onnx_model_path
+
+MODELS_FOLDER = os.environ.get("SENTIMENT_ANALYSIS_MODELS_FOLDER", "./data/sentiment_models")
+
+
+class TestOnnxSentimentModel(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.onnxruntime = Mock()
+        self.session = self.onnxruntime.InferenceSession.return_value
+        self.session.get_inputs.return_value = [Mock(), Mock()]
+        self.session.get_inputs.return_value[0].name = "input_ids"
+        self.session.get_inputs.return_value[1].name = "attention_mask"
+        self.session.run.return_value = [np.array([[0.0, 1.0]])]
+
+        self.stack = [
+            patch.dict(sys.modules, {"onnxruntime": self.onnxruntime}),
+            patch.object(onnx_sentiment, "AutoConfig"),
+        ]
+        for patcher in self.stack:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.stack:
+            patcher.stop()
+        shutil.rmtree(self.folder)
+
+    def test_missing_model(self):
+        with self.assertRaises(FileNotFoundError):
+            OnnxSentimentModel(self.folder)
+
+    def test_run(self):
+        open(onnx_model_path(self.folder, True), "w").close()
+        model = OnnxSentimentModel(self.folder)
+
+        logits = model(
+            input_ids=np.array([[0, 12, 2]], dtype=np.int32),
+            attention_mask=np.array([[1, 1, 1]], dtype=np.int32),
+            token_type_ids=np.array([[0, 0, 0]], dtype=np.int32),
+        )
+
+        self.assertEqual(logits.tolist(), [[0.0, 1.0]])
+        self.assertEqual(
+            self.onnxruntime.InferenceSession.call_args.args[0],
+            os.path.join(self.folder, "model.int8.onnx"),
+        )
+        _, feed = self.session.run.call_args.args
+        # Only the inputs of the graph, as int64
+        self.assertEqual(set(feed), {"input_ids", "attention_mask"})
+        self.assertEqual(feed["input_ids"].dtype, np.int64)
+
+    def test_export_done_once(self):
+        open(onnx_model_path(self.folder, False), "w").close()
+        open(onnx_model_path(self.folder, True), "w").close()
+
+        with patch.object(onnx_sentiment, "TFAutoModelForSequenceClassification") as model_class:
+            self.assertEqual(export_onnx_model(self.folder), os.path.join(self.folder, "model.int8.onnx"))
+            self.assertEqual(export_onnx_model(self.folder, False), os.path.join(self.folder, "model.onnx"))
+        model_class.from_pretrained.assert_not_called()
+
+    def test_sentiment_analysis_backend(self):
+        analysis = SentimentAnalysis(config={"use_sentiment_analysis": False, "sentiment_analysis_backend": "onnx"})
+        analysis.analysis_enabled = True
+        tokenizer = Mock(return_value={"input_ids": "ids", "attention_mask": "mask"})
+        model = Mock(return_value=np.array([[0.0, 3.0], [2.0, 0.0]]))
+        model.config.id2label = {0: "NEGATIVE", 1: "POSITIVE"}
+        analysis.models = LanguageModels(lambda lang: (model, tokenizer), ["en", "fr"])
+
+        results = analysis.analyze_batch(["great", "bad"], "en")
+
+        tokenizer.assert_called_once_with(["great", "bad"], padding=True, truncation=True, return_tensors="np")
+        model.assert_called_once_with(input_ids="ids", attention_mask="mask")
+        self.assertEqual([sentiment for sentiment, _ in results], [SentimentEnum.POSITIVE, SentimentEnum.NEGATIVE])
+        self.assertAlmostEqual(results[0][1], 0.9526, places=4)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            SentimentAnalysis(config={"use_sentiment_analysis": False, "sentiment_analysis_backend": "torch"})
+
+
+@unittest.skipUnless(
+    os.path.exists(os.path.join(MODELS_FOLDER, "english"))
+    and os.path.exists(os.path.join(MODELS_FOLDER, "french"))
+    and importlib.util.find_spec("tensorflow")
+    and importlib.util.find_spec("onnxruntime"),
+    "needs the downloaded sentiment analysis models, TensorFlow and ONNX Runtime",
+)
+class TestOnnxParity(unittest.TestCase):
+    """
+    Checks that the ONNX models, with and without int8 weights,
+    give the same labels as the TensorFlow models
+    """
+
+    TEXTS = {
+        "en": [
+            "The new dashboard is great, but the export button is hard to find.",
+            "It crashed twice while I was uploading my files, please fix it!",
+            "I like how fast the search results show up now.",
+            "Not sure what this feature is for, the documentation does not explain it.",
+            "Perfect.",
+        ],
+        "fr": [
+            "La nouvelle page est très claire, merci pour le travail.",
+            "Impossible de valider le formulaire, le bouton ne répond pas.",
+            "Les filtres sont pratiques mais un peu lents à charger.",
+            "Je ne trouve plus l'historique de mes commandes depuis la mise à jour.",
+            "Nul.",
+        ],
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        config = {"use_sentiment_analysis": True, "sentiment_analysis_models_folder": MODELS_FOLDER}
+        for language_folder in SentimentAnalysis.LANGUAGES.values():
+            export_onnx_model(os.path.join(MODELS_FOLDER, language_folder), True)
+        cls.tensorflow = SentimentAnalysis({**config, "sentiment_analysis_backend": "tensorflow"})
+        cls.onnx = SentimentAnalysis({**config, "sentiment_analysis_backend": "onnx", "sentiment_onnx_quantize": False})
+        cls.quantized = SentimentAnalysis({**config, "sentiment_analysis_backend": "onnx", "sentiment_onnx_quantize": True})
+
+    def test_same_labels(self):
+        for lang, texts in self.TEXTS.items():
+            expected = self.tensorflow.analyze_batch(texts, lang)
+            onnx_results = self.onnx.analyze_batch(texts, lang)
+            quantized_results = self.quantized.analyze_batch(texts, lang)
+
+            self.assertEqual([label for label, _ in onnx_results], [label for label, _ in expected])
+            self.assertEqual([label for label, _ in quantized_results], [label for label, _ in expected])
+            for (_, score), (_, expected_score) in zip(onnx_results, expected):
+                self.assertAlmostEqual(score, expected_score, places=3)
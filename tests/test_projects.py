@@ -3,10 +3,11 @@ from unittest.mock import MagicMock
 from fastapi import HTTPException
 
 from survey_logic import projects as logic
-from models.project import Project
+from models.project import Project, ProjectEncryption
 from models.rule import Rule
 from repository.sqlite_repository import SQLiteRepository
 from repository.yaml_rule_repository import YamlRulesRepository
+from utils.encryption import Encryption
 
 
 class TestProjects(unittest.IsolatedAsyncioTestCase):
@@ -49,8 +50,11 @@ class TestProjects(unittest.IsolatedAsyncioTestCase):
         # Create a mock SQLiteRepository instance with a get_project_by_id method that returns the mock project
         self.mock_sqlite_repo.get_project_by_id.return_value = mock_project
 
-        # Create a mock SQLiteRepository instance with a get_feature_avg_rating method that returns the expected ratings
-        self.mock_sqlite_repo.get_feature_avg_rating.side_effect = [4.5, 3.2]
+        # Create a mock SQLiteRepository instance with a get_feature_avg_ratings method that returns the expected ratings
+        self.mock_sqlite_repo.get_feature_avg_ratings.return_value = {
+            "http://example.com/feature1": 4.5,
+            "http://example.com/feature2": 3.2,
+        }
 
         # Create a mock YamlRulesRepository instance with a getProjectNames method that returns a list with the mock project name
         self.mock_yaml_repo.getFeatureUrlsFromProjectName.return_value = [
@@ -68,6 +72,22 @@ class TestProjects(unittest.IsolatedAsyncioTestCase):
         )
 
         self.assertEqual(response, expected_output)
+        self.mock_sqlite_repo.get_feature_avg_ratings.assert_called_once_with(1)
+        self.mock_sqlite_repo.get_feature_avg_rating.assert_not_called()
+
+    async def test_get_projects_feature_rating_without_comments(self):
+        self.mock_sqlite_repo.get_project_by_id.return_value = Project(id=1, name="project1")
+        self.mock_sqlite_repo.get_feature_avg_ratings.return_value = {}
+        self.mock_yaml_repo.getFeatureUrlsFromProjectName.return_value = ["http://example.com/feature1"]
+        self.mock_yaml_repo.getProjectNames.return_value = ["project1"]
+
+        response = await logic.get_avg_rating_by_feature_from_project_id(
+            1,
+            sqlite_repo=self.mock_sqlite_repo,
+            yaml_repo=self.mock_yaml_repo,
+        )
+
+        self.assertEqual(response, [{"url": "http://example.com/feature1", "rating": 0}])
 
     async def test_get_projects_feature_rating_with_wrong_id(self):
         # Create a mock SQLiteRepository instance with a get_project_by_id method that returns None
@@ -180,3 +200,46 @@ class TestProjects(unittest.IsolatedAsyncioTestCase):
         # Assert
         self.assertEqual(cm.exception.status_code, 404)
         self.mock_sqlite_repo.get_project_avg_rating.assert_not_called()
+
+
+class TestProjectEncryption(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.mock_sqlite_repo = MagicMock(spec=SQLiteRepository)
+        self.crypt_key = "rg3ENcA7oBCxtxvJ1kk4oAXLizePSnGqPykRi4hvWqY="
+        self.project = Project(id=1, name="project1")
+        logic._encryptions.clear()
+
+    def tearDown(self):
+        logic._encryptions.clear()
+
+    async def test_load_encryptions(self):
+        self.mock_sqlite_repo.get_projects_encryptions.return_value = [
+            (self.project, ProjectEncryption(id=1, project_id=1, encryption_key=self.crypt_key))
+        ]
+
+        await logic.load_encryptions(sqlite_repo=self.mock_sqlite_repo)
+        encryption = await logic.get_encryption_from_project_name(
+            "project1", sqlite_repo=self.mock_sqlite_repo
+        )
+
+        self.assertIsInstance(encryption, Encryption)
+        self.assertEqual(encryption.key, self.crypt_key)
+        self.mock_sqlite_repo.get_encryption_key_by_project_name.assert_not_called()
+
+    async def test_encryption_cached_after_first_use(self):
+        self.mock_sqlite_repo.get_encryption_key_by_project_name.return_value = self.crypt_key
+
+        first = await logic.get_encryption_from_project_name(
+            "project1", sqlite_repo=self.mock_sqlite_repo
+        )
+        second = await logic.get_encryption_from_project_name(
+            "project1", sqlite_repo=self.mock_sqlite_repo
+        )
+
+        self.assertIs(first, second)
+        self.assertEqual(first.key, self.crypt_key)
+        self.mock_sqlite_repo.get_encryption_key_by_project_name.assert_called_once_with(
+            "project1"
+        )
+        self.mock_sqlite_repo.get_project_by_name.assert_not_called()
+        self.mock_sqlite_repo.get_encryption_by_project_id.assert_not_called()
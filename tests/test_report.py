@@ -0,0 +1,99 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+
+import sqlalchemy
+
+from models.comment import Comment
+from repository.sqlite_repository import SQLiteRepository
+from repository.yaml_rule_repository import YamlRulesRepository
+from survey_logic import report as logic
+from utils.static_assets import StaticAssets
+
+
+class TestReportEventLoop(unittest.IsolatedAsyncioTestCase):
+    """
+    Checks that the database queries of a report request do not block the event loop,
+    so that the other requests keep being served while they run
+    """
+
+    # Duration added to every query of the report
+    QUERY_DELAY = 0.2
+    # Longest time the event loop may go without running the other tasks
+    MAX_BLOCKING = 0.1
+
+    async def asyncSetUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.db_name = os.path.join(self.folder, "test_report.sqlite3")
+        conn = sqlite3.connect(self.db_name)
+        conn.executescript(
+            """
+            CREATE TABLE Comment (
+                id INTEGER PRIMARY KEY, project_id INTEGER, feature_url VARCHAR,
+                rating INTEGER, timestamp VARCHAR
+            );
+            CREATE TABLE Display (id INTEGER PRIMARY KEY, project_id INTEGER, timestamp VARCHAR);
+            INSERT INTO Comment (project_id, feature_url, rating, timestamp) VALUES
+                (1, 'http://test.com/a', 4, '2023-01-01'),
+                (1, 'http://test.com/b', 2, '2023-01-01');
+            INSERT INTO Display (project_id, timestamp) VALUES (1, '2023-01-01');
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        self.repository = SQLiteRepository({"survey_db": self.db_name})
+        await self.repository.create_summary_triggers()
+        self.repository.get_project_ids = AsyncMock(return_value={"project1": 1})
+
+        self.engine = sqlalchemy.create_engine(f"sqlite:///{self.db_name}")
+        sqlalchemy.event.listen(self.engine, "before_cursor_execute", self.slow_down)
+        self.patch = patch.object(Comment, "__metadata__", Mock(database=Mock(engine=self.engine)), create=True)
+        self.patch.start()
+
+        self.rules = Mock(spec=YamlRulesRepository)
+        self.rules.getProjectNames.return_value = ["project1"]
+        self.rules.getRulesFromProjectName.return_value = []
+        self.static_assets = Mock(spec=StaticAssets, urls={})
+
+    async def asyncTearDown(self):
+        self.patch.stop()
+        self.engine.dispose()
+        shutil.rmtree(self.folder)
+
+    def slow_down(self, conn, cursor, statement, parameters, context, executemany):
+        time.sleep(self.QUERY_DELAY)
+
+    async def measure_blocking(self, stop: asyncio.Event, delays: list):
+        interval = 0.01
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            delays.append(time.perf_counter() - start - interval)
+
+    async def test_report_does_not_block_event_loop(self):
+        stop = asyncio.Event()
+        delays = []
+        monitor = asyncio.create_task(self.measure_blocking(stop, delays))
+        await asyncio.sleep(0)
+
+        start = time.perf_counter()
+        html = await logic.generate_project_report(
+            sqlite_repo=self.repository,
+            rulesYamlConfig=self.rules,
+            static_assets=self.static_assets,
+        )
+        duration = time.perf_counter() - start
+        stop.set()
+        await monitor
+
+        self.assertIn("project1", html)
+        self.repository.get_project_ids.assert_awaited_once_with(["project1"])
+        # The queries did run, while the loop kept running the monitor
+        self.assertGreaterEqual(duration, self.QUERY_DELAY)
+        self.assertLess(max(delays), self.MAX_BLOCKING)
@@ -31,15 +31,13 @@ class TestRules(unittest.IsolatedAsyncioTestCase):
         )
 
     async def test_show_modal(self):
-        self.mock_yaml_repo.getProjectNameFromFeature.return_value = "project1"
-
         with patch("survey_logic.rules.random.random") as mock_random, \
-            patch("survey_logic.rules._get_rule_from_feature") as mock_rule, \
+            patch("survey_logic.rules._match_feature") as mock_rule, \
             patch("survey_logic.rules.get_encryption_from_project_name") as mock_crypto, \
             patch("survey_logic.rules._log_display"):
 
             mock_random.return_value = 0.4
-            mock_rule.return_value = self.rule
+            mock_rule.return_value = "project1", self.rule
             mock_crypto.return_value = self.encryption
 
             result = await logic.show_modal_or_not(
@@ -58,15 +56,13 @@ class TestRules(unittest.IsolatedAsyncioTestCase):
 
     async def test_not_show_modal_not_active(self):
         self.rule.is_active = False
-        self.mock_yaml_repo.getProjectNameFromFeature.return_value = "project1"
-
         with patch("survey_logic.rules.random.random") as mock_random, \
-            patch("survey_logic.rules._get_rule_from_feature") as mock_rule, \
+            patch("survey_logic.rules._match_feature") as mock_rule, \
             patch("survey_logic.rules.get_encryption_from_project_name") as mock_crypto, \
             patch("survey_logic.rules._log_display"):
 
             mock_random.return_value = 0.4
-            mock_rule.return_value = self.rule
+            mock_rule.return_value = "project1", self.rule
             mock_crypto.return_value = self.encryption
 
             result = await logic.show_modal_or_not(
@@ -83,15 +79,13 @@ class TestRules(unittest.IsolatedAsyncioTestCase):
         Case when the last modal display is too recent compared to the delay_before_reanswer
         """
         short_timestamp = (datetime.now() - timedelta(days=10)).timestamp()
-        self.mock_yaml_repo.getProjectNameFromFeature.return_value = "project1"
-
         with patch("survey_logic.rules.random.random") as mock_random, \
-            patch("survey_logic.rules._get_rule_from_feature") as mock_rule, \
+            patch("survey_logic.rules._match_feature") as mock_rule, \
             patch("survey_logic.rules.get_encryption_from_project_name") as mock_crypto, \
             patch("survey_logic.rules._log_display"):
 
             mock_random.return_value = 0.4
-            mock_rule.return_value = self.rule
+            mock_rule.return_value = "project1", self.rule
             mock_crypto.return_value = self.encryption
 
             result = await logic.show_modal_or_not(
@@ -104,15 +98,13 @@ class TestRules(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result, False)
 
     async def test_not_show_modal_notWithinRatio(self):
-        self.mock_yaml_repo.getProjectNameFromFeature.return_value = "project1"
-
         with patch("survey_logic.rules.random.random") as mock_random, \
-            patch("survey_logic.rules._get_rule_from_feature") as mock_rule, \
+            patch("survey_logic.rules._match_feature") as mock_rule, \
             patch("survey_logic.rules.get_encryption_from_project_name") as mock_crypto, \
             patch("survey_logic.rules._log_display"):
 
             mock_random.return_value = 1
-            mock_rule.return_value = self.rule
+            mock_rule.return_value = "project1", self.rule
             mock_crypto.return_value = self.encryption
 
             result = await logic.show_modal_or_not(
@@ -130,15 +122,14 @@ class TestRules(unittest.IsolatedAsyncioTestCase):
         - new user who doesn't have a user_id
         - no previous display of the modal so no timestamp
         """
-        self.mock_yaml_repo.getProjectNameFromFeature.return_value = "project1"
         
         with patch("survey_logic.rules.random.random") as mock_random, \
-            patch("survey_logic.rules._get_rule_from_feature") as mock_rule, \
+            patch("survey_logic.rules._match_feature") as mock_rule, \
             patch("survey_logic.rules.get_encryption_from_project_name") as mock_crypto, \
             patch("survey_logic.rules._log_display"):
 
             mock_random.return_value = 0.4
-            mock_rule.return_value = self.rule
+            mock_rule.return_value = "project1", self.rule
             mock_crypto.return_value = self.encryption
 
             result = await logic.show_modal_or_not(
@@ -153,15 +144,13 @@ class TestRules(unittest.IsolatedAsyncioTestCase):
         self.response.set_cookie.assert_any_call(key="user_id", value=ANY)
 
     async def test_invalid_timestamp(self):
-        self.mock_yaml_repo.getProjectNameFromFeature.return_value = "project1"
-
         with patch("survey_logic.rules.random.random") as mock_random, \
-            patch("survey_logic.rules._get_rule_from_feature") as mock_rule, \
+            patch("survey_logic.rules._match_feature") as mock_rule, \
             patch("survey_logic.rules.get_encryption_from_project_name") as mock_crypto, \
             patch("survey_logic.rules._log_display"):
 
             mock_random.return_value = 0.4
-            mock_rule.return_value = self.rule
+            mock_rule.return_value = "project1", self.rule
             mock_crypto.return_value = self.encryption
             
             with self.assertRaises(HTTPException) as cm:
@@ -188,12 +177,12 @@ class TestRuleFromFeature(unittest.TestCase):
             delay_to_answer=3,
             is_active=True,
         )
-        self.mock_yaml.getRuleFromFeature.return_value = return_rule
-        result = logic._get_rule_from_feature(self.feature_url, rulesYamlConfig=self.mock_yaml)
-        self.assertEqual(result, return_rule)
+        self.mock_yaml.matchFeature.return_value = "project1", return_rule
+        result = logic._match_feature(self.feature_url, rulesYamlConfig=self.mock_yaml)
+        self.assertEqual(result, ("project1", return_rule))
         
     def test_feature_not_found(self):
-        self.mock_yaml.getRuleFromFeature.return_value = None
+        self.mock_yaml.matchFeature.return_value = None, None
         with self.assertRaises(HTTPException) as cm:
-            logic._get_rule_from_feature(self.feature_url, rulesYamlConfig=self.mock_yaml)
+            logic._match_feature(self.feature_url, rulesYamlConfig=self.mock_yaml)
         self.assertEqual(cm.exception.status_code, 404)
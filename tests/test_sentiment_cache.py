@@ -0,0 +1,160 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+from models.comment import SentimentEnum
+from repository.sqlite_repository import SQLiteRepository
+from utils.nlp import SentimentAnalysis
+from utils.sentiment_cache import SentimentCache, normalize_text
+from utils.sentiment_scheduler import SentimentScheduler
+
+
+class TestSentimentCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.mock_repo = Mock(spec=SQLiteRepository)
+        self.mock_repo.get_cached_sentiments = AsyncMock(return_value={})
+        self.mock_repo.save_cached_sentiments = AsyncMock()
+        self.mock_repo.create_sentiment_cache = AsyncMock()
+        self.mock_nlp = Mock(spec=SentimentAnalysis)
+        self.mock_nlp.model_version.return_value = "v1"
+        self.config = {"sentiment_cache_size": 2}
+        self.cache = SentimentCache(self.mock_repo, self.mock_nlp, self.config)
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("  Ne   marche\tPAS \n"), "ne marche pas")
+        self.assertEqual(SentimentCache.key("Great!"), SentimentCache.key(" great! "))
+        self.assertNotEqual(SentimentCache.key("great"), SentimentCache.key("great!"))
+
+    async def test_memory_cache(self):
+        self.assertIsNone(await self.cache.get("great"))
+        await self.cache.put("great", ("en", SentimentEnum.POSITIVE, 0.99))
+
+        self.assertEqual(await self.cache.get("Great"), ("en", SentimentEnum.POSITIVE, 0.99))
+        metrics = self.cache.metrics()
+        self.assertEqual((metrics["hits"], metrics["misses"], metrics["hit_rate"]), (1, 1, 0.5))
+        self.mock_repo.get_cached_sentiments.assert_not_awaited()
+
+    async def test_least_recently_used_evicted(self):
+        await self.cache.put("great", ("en", SentimentEnum.POSITIVE, 0.99))
+        await self.cache.put("bad", ("en", SentimentEnum.NEGATIVE, 0.98))
+        await self.cache.get("great")
+        await self.cache.put("ok", ("en", SentimentEnum.POSITIVE, 0.7))
+
+        self.assertIsNone(await self.cache.get("bad"))
+        self.assertIsNotNone(await self.cache.get("great"))
+        self.assertEqual(self.cache.metrics()["size"], 2)
+
+    async def test_invalidated_by_new_models(self):
+        await self.cache.put("great", ("en", SentimentEnum.POSITIVE, 0.99))
+        self.mock_nlp.model_version.return_value = "v2"
+
+        # Not checked again before VERSION_CHECK_INTERVAL
+        self.assertIsNotNone(await self.cache.get("great"))
+        self.assertEqual(self.mock_nlp.model_version.call_count, 1)
+
+        self.cache.VERSION_CHECK_INTERVAL = 0
+        self.assertIsNone(await self.cache.get("great"))
+        self.assertEqual(self.cache.metrics()["model_version"], "v2")
+
+    async def test_disabled(self):
+        cache = SentimentCache(self.mock_repo, self.mock_nlp, {"sentiment_cache_size": 0, "sentiment_cache_persistent": True})
+        await cache.put("great", ("en", SentimentEnum.POSITIVE, 0.99))
+        self.assertIsNone(await cache.get("great"))
+        self.assertFalse(cache.persistent)
+        self.assertIsNone(cache.metrics()["hit_rate"])
+
+    async def test_persistent_tier(self):
+        self.config["sentiment_cache_persistent"] = True
+        self.config["sentiment_cache_persistent_size"] = 500
+        cache = SentimentCache(self.mock_repo, self.mock_nlp, self.config)
+        await cache.start()
+        self.mock_repo.create_sentiment_cache.assert_awaited_once_with("v1", 500)
+
+        await cache.put("great", ("en", SentimentEnum.POSITIVE, 0.99))
+        await cache.put("bad", ("en", SentimentEnum.NEGATIVE, 0.98))
+        # Saved together by the background task
+        self.mock_repo.save_cached_sentiments.assert_not_awaited()
+        await cache.stop()
+        self.mock_repo.save_cached_sentiments.assert_awaited_once_with(
+            "v1",
+            {
+                SentimentCache.key("great"): ("en", SentimentEnum.POSITIVE, 0.99),
+                SentimentCache.key("bad"): ("en", SentimentEnum.NEGATIVE, 0.98),
+            },
+        )
+
+        # Saved before a restart
+        self.mock_repo.get_cached_sentiments.return_value = {
+            SentimentCache.key("ne marche pas"): ("fr", SentimentEnum.NEGATIVE, 0.9)
+        }
+        self.assertEqual(await cache.get("ne marche pas"), ("fr", SentimentEnum.NEGATIVE, 0.9))
+        self.mock_repo.get_cached_sentiments.assert_awaited_once_with([SentimentCache.key("ne marche pas")], "v1")
+        # Then kept in memory
+        await cache.get("ne marche pas")
+        self.assertEqual(self.mock_repo.get_cached_sentiments.await_count, 1)
+        self.assertEqual(cache.metrics()["persistent_hits"], 1)
+        self.assertEqual(cache.metrics()["hits"], 1)
+
+    async def test_persistent_lookups_gathered(self):
+        self.config["sentiment_cache_persistent"] = True
+        cache = SentimentCache(self.mock_repo, self.mock_nlp, self.config)
+        self.mock_repo.get_cached_sentiments.return_value = {
+            SentimentCache.key("great"): ("en", SentimentEnum.POSITIVE, 0.99)
+        }
+
+        results = await asyncio.gather(cache.get("great"), cache.get("bad"), cache.get("Great"))
+
+        self.assertEqual(results, [("en", SentimentEnum.POSITIVE, 0.99), None, ("en", SentimentEnum.POSITIVE, 0.99)])
+        self.mock_repo.get_cached_sentiments.assert_awaited_once_with(
+            [SentimentCache.key("great"), SentimentCache.key("bad")], "v1"
+        )
+
+    async def test_persistent_lookups_failed(self):
+        self.config["sentiment_cache_persistent"] = True
+        cache = SentimentCache(self.mock_repo, self.mock_nlp, self.config)
+        self.mock_repo.get_cached_sentiments.side_effect = OSError("disk I/O error")
+
+        results = await asyncio.gather(cache.get("great"), cache.get("bad"), return_exceptions=True)
+
+        self.assertTrue(all(isinstance(result, OSError) for result in results))
+
+    async def test_flushed_by_size(self):
+        self.config["sentiment_cache_persistent"] = True
+        self.config["sentiment_cache_size"] = 10
+        cache = SentimentCache(self.mock_repo, self.mock_nlp, self.config)
+        cache.FLUSH_SIZE = 2
+        await cache.start()
+
+        await cache.put("great", ("en", SentimentEnum.POSITIVE, 0.99))
+        await cache.put("bad", ("en", SentimentEnum.NEGATIVE, 0.98))
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(len(self.mock_repo.save_cached_sentiments.await_args.args[1]), 2)
+        await cache.stop()
+        self.mock_repo.save_cached_sentiments.assert_awaited_once()
+
+
+class TestSchedulerWithCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.mock_nlp = Mock(spec=SentimentAnalysis)
+        self.mock_nlp.analysis_enabled = True
+        self.mock_nlp.model_version.return_value = "v1"
+        self.mock_nlp.analyze_batch.side_effect = lambda texts, lang: [(SentimentEnum.POSITIVE, 0.9)] * len(texts)
+        self.cache = SentimentCache(Mock(spec=SQLiteRepository), self.mock_nlp, {"sentiment_cache_size": 10})
+        self.scheduler = SentimentScheduler(self.mock_nlp, {}, self.cache)
+
+    async def test_repeated_phrase_analyzed_once(self):
+        first = await self.scheduler.analyze_comment("This is a great feature")
+        second = await self.scheduler.analyze_comment("this is a  great feature ")
+
+        self.assertEqual(first, ("en", SentimentEnum.POSITIVE, 0.9))
+        self.assertEqual(second, first)
+        self.mock_nlp.analyze_batch.assert_called_once()
+
+    async def test_failures_not_cached(self):
+        self.mock_nlp.analyze_batch.side_effect = RuntimeError("out of memory")
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(await self.scheduler.analyze_comment("great", "en"), ("en", None, None))
+
+        self.mock_nlp.analyze_batch.side_effect = lambda texts, lang: [(SentimentEnum.POSITIVE, 0.9)]
+        self.assertEqual(await self.scheduler.analyze_comment("great", "en"), ("en", SentimentEnum.POSITIVE, 0.9))
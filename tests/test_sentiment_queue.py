@@ -0,0 +1,173 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock
+
+from models.comment import Comment, SentimentEnum
+from repository.sentiment_queue import SentimentQueue
+from repository.sqlite_repository import SQLiteRepository
+from utils.nlp import NlpPreprocess, SentimentAnalysis
+from utils.sentiment_scheduler import SentimentScheduler
+
+
+class TestSentimentQueue(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.queued = []
+        self.comments = {
+            1: Comment(id=1, project_id=1, user_id="1", timestamp="2023-05-01T10:00:00",
+                       feature_url="http://test.com", rating=5, comment="Great feature", language="unknown"),
+            2: Comment(id=2, project_id=1, user_id="2", timestamp="2023-05-01T10:00:00",
+                       feature_url="http://test.com", rating=1, comment="", language="unknown"),
+            3: Comment(id=3, project_id=1, user_id="3", timestamp="2023-05-01T10:00:00",
+                       feature_url="http://test.com", rating=4, comment="Très bien", language="unknown"),
+        }
+
+        self.mock_repo = Mock(spec=SQLiteRepository)
+        self.mock_repo.count_sentiment_queue = AsyncMock(side_effect=lambda: len(self.queued))
+        self.mock_repo.enqueue_sentiment = AsyncMock(side_effect=self.queued.append)
+        self.mock_repo.get_sentiment_queue = AsyncMock(
+            side_effect=lambda limit: [self.comments[i] for i in sorted(self.queued)[:limit]]
+        )
+        self.mock_repo.save_sentiments = AsyncMock(side_effect=self.save_sentiments)
+        self.mock_repo.save_comment_lemmas = AsyncMock()
+
+        self.mock_nlp = Mock(spec=SentimentAnalysis)
+        self.mock_nlp.analysis_enabled = True
+        self.mock_nlp.analyze_batch.side_effect = lambda texts, lang: [(SentimentEnum.POSITIVE, 0.9)] * len(texts)
+        self.scheduler = SentimentScheduler(self.mock_nlp, {})
+        self.mock_preprocess = Mock(spec=NlpPreprocess)
+        self.mock_preprocess.nlp_enabled = False
+
+        self.config = {"sentiment_analysis_mode": "background", "sentiment_batch_size": 2}
+        self.queue = SentimentQueue(self.mock_repo, self.scheduler, self.mock_preprocess, self.config)
+
+    async def asyncTearDown(self):
+        await self.queue.stop()
+
+    def save_sentiments(self, results):
+        for comment_id in results:
+            self.queued.remove(comment_id)
+
+    async def wait_empty(self):
+        for _ in range(100):
+            if not self.queued:
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"Comments left in the queue: {self.queued}")
+
+    async def test_disabled(self):
+        queue = SentimentQueue(self.mock_repo, self.scheduler, self.mock_preprocess, {})
+        self.assertFalse(queue.enabled)
+        await queue.start()
+        self.mock_repo.count_sentiment_queue.assert_not_awaited()
+        self.assertEqual(queue.metrics()["mode"], "sync")
+
+    async def test_process_by_batches(self):
+        await self.queue.start()
+        for comment_id in [1, 2, 3]:
+            await self.queue.put(comment_id)
+        await self.wait_empty()
+
+        results = {}
+        for call in self.mock_repo.save_sentiments.await_args_list:
+            self.assertLessEqual(len(call.args[0]), 2)
+            results.update(call.args[0])
+        self.assertEqual(results[1], ("en", SentimentEnum.POSITIVE, 0.9))
+        # Empty comments are not analyzed
+        self.assertEqual(results[2][1:], (None, None))
+        self.assertEqual(results[3], ("fr", SentimentEnum.POSITIVE, 0.9))
+        self.mock_repo.save_comment_lemmas.assert_not_awaited()
+
+        metrics = self.queue.metrics()
+        self.assertEqual(metrics["mode"], "background")
+        self.assertEqual(metrics["depth"], 0)
+        self.assertEqual(metrics["analyzed"], 3)
+        self.assertEqual(metrics["errors"], 0)
+
+    async def test_resume_after_restart(self):
+        # Left in the database by the previous run
+        self.queued.extend([1, 3])
+
+        await self.queue.start()
+        self.assertEqual(self.queue.metrics()["depth"], 2)
+        await self.wait_empty()
+
+        self.assertEqual(self.queue.metrics()["analyzed"], 2)
+        self.assertEqual(self.queue.metrics()["batches"], 1)
+
+    async def test_save_lemmas(self):
+        self.mock_preprocess.nlp_enabled = True
+        self.mock_preprocess.texts_preprocess.return_value = [["great", "feature"]]
+        await self.queue.start()
+        await self.queue.put(1)
+        await self.wait_empty()
+        await asyncio.sleep(0.01)
+
+        self.mock_preprocess.texts_preprocess.assert_called_once_with([("Great feature", "en")])
+        self.mock_repo.save_comment_lemmas.assert_awaited_once_with({1: ["great", "feature"]})
+
+    async def test_failed_batch_stays_in_queue(self):
+        self.queue.RETRY_DELAY = 0.01
+        failures = [Exception("database is locked")]
+
+        def save_once_available(results):
+            if failures:
+                raise failures.pop()
+            self.save_sentiments(results)
+
+        self.mock_repo.save_sentiments.side_effect = save_once_available
+        await self.queue.start()
+        await self.queue.put(1)
+        await self.wait_empty()
+
+        self.assertEqual(self.mock_repo.save_sentiments.await_count, 2)
+        self.assertEqual(self.queue.metrics()["errors"], 1)
+        self.assertEqual(self.queue.metrics()["analyzed"], 1)
+
+    async def test_failed_analysis_stays_in_queue(self):
+        self.queue.RETRY_DELAY = 0.5
+        failures = [TimeoutError("inference timeout")]
+
+        def analyze_once_available(texts, lang):
+            if failures:
+                raise failures.pop()
+            return [(SentimentEnum.POSITIVE, 0.9)] * len(texts)
+
+        self.mock_nlp.analyze_batch.side_effect = analyze_once_available
+        await self.queue.start()
+        await self.queue.put(1)
+        for _ in range(300):
+            if self.queue.errors:
+                break
+            await asyncio.sleep(0.01)
+
+        # Not saved without its sentiment
+        self.assertEqual(self.queue.metrics()["errors"], 1)
+        self.assertEqual(self.queued, [1])
+        self.mock_repo.save_sentiments.assert_not_awaited()
+
+        await self.wait_empty()
+        self.mock_repo.save_sentiments.assert_awaited_once_with({1: ("en", SentimentEnum.POSITIVE, 0.9)})
+        self.assertEqual(self.queue.metrics()["failed"], 0)
+
+    async def test_failing_comment_leaves_queue(self):
+        self.queue.RETRY_DELAY = 0.01
+
+        def fail_on_poison(results):
+            if 1 in results and results[1][1] is not None:
+                raise Exception("cannot be saved")
+            self.save_sentiments(results)
+
+        self.mock_repo.save_sentiments.side_effect = fail_on_poison
+        await self.queue.start()
+        for comment_id in [1, 2, 3]:
+            await self.queue.put(comment_id)
+        await self.wait_empty()
+
+        saved = [call.args[0] for call in self.mock_repo.save_sentiments.await_args_list]
+        self.assertIn({1: ("unknown", None, None)}, saved)
+        # The other comment of the batch was tried again alone
+        self.assertIn({2: ("unknown", None, None)}, saved)
+        self.assertEqual(self.queue.metrics()["failed"], 1)
+        self.assertEqual(self.queue.metrics()["errors"], SentimentQueue.MAX_ATTEMPTS)
+        self.assertEqual(self.queue.metrics()["analyzed"], 2)
+
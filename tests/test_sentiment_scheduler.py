@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import Mock
+
+from models.comment import SentimentEnum
+from utils.nlp import SentimentAnalysis
+from utils.sentiment_scheduler import SentimentScheduler
+
+
+class TestSentimentScheduler(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.mock_nlp = Mock(spec=SentimentAnalysis)
+        self.mock_nlp.analysis_enabled = True
+        self.mock_nlp.analyze_batch.side_effect = self.analyze_batch
+        self.config = {
+            "sentiment_inference_batch_size": 3,
+            "sentiment_inference_timeout_ms": 50,
+        }
+        self.scheduler = SentimentScheduler(self.mock_nlp, self.config)
+
+    async def asyncTearDown(self):
+        await self.scheduler.stop()
+
+    def analyze_batch(self, texts, lang):
+        return [(SentimentEnum.POSITIVE, len(text) / 10) for text in texts]
+
+    def batches(self):
+        return [call.args for call in self.mock_nlp.analyze_batch.call_args_list]
+
+    async def test_analyze_without_task(self):
+        result = await self.scheduler.analyze("great", "en")
+
+        self.assertEqual(result, (SentimentEnum.POSITIVE, 0.5))
+        self.assertEqual(self.batches(), [(["great"], "en")])
+
+    async def test_batch_full(self):
+        self.config["sentiment_inference_timeout_ms"] = 60000
+        self.scheduler = SentimentScheduler(self.mock_nlp, self.config)
+        self.scheduler.start()
+
+        results = await asyncio.wait_for(
+            asyncio.gather(*(self.scheduler.analyze(text, "en") for text in ["a", "bb", "ccc"])), 1
+        )
+
+        # Run before the timeout
+        self.assertEqual([score for _, score in results], [0.1, 0.2, 0.3])
+        self.assertEqual(self.batches(), [(["a", "bb", "ccc"], "en")])
+
+    async def test_batch_after_timeout(self):
+        self.scheduler.start()
+        task = asyncio.create_task(self.scheduler.analyze("great", "en"))
+        await asyncio.sleep(0.01)
+        self.mock_nlp.analyze_batch.assert_not_called()
+        self.assertEqual(self.scheduler.metrics()["depth"], 1)
+
+        self.assertEqual(await asyncio.wait_for(task, 1), (SentimentEnum.POSITIVE, 0.5))
+        self.assertEqual(self.batches(), [(["great"], "en")])
+
+    async def test_batches_by_language(self):
+        self.scheduler.start()
+        await asyncio.gather(
+            self.scheduler.analyze("great", "en"),
+            self.scheduler.analyze("super", "fr"),
+            self.scheduler.analyze("good", "en"),
+        )
+
+        self.assertCountEqual(self.batches(), [(["good", "great"], "en"), (["super"], "fr")])
+
+    async def test_backlog_sorted_by_length(self):
+        self.config["sentiment_inference_batch_size"] = 2
+        self.scheduler = SentimentScheduler(self.mock_nlp, self.config)
+        released = threading.Event()
+
+        def blocked_analyze_batch(texts, lang):
+            released.wait(1)
+            return self.analyze_batch(texts, lang)
+
+        self.mock_nlp.analyze_batch.side_effect = blocked_analyze_batch
+        self.scheduler.start()
+        # First batch taken by the task, then stuck in the model
+        first = asyncio.gather(*(self.scheduler.analyze(text, "en") for text in ["x", "y"]))
+        await asyncio.sleep(0.01)
+        backlog = asyncio.gather(*(self.scheduler.analyze(text, "en") for text in ["dddd", "a", "ccc", "bb"]))
+        await asyncio.sleep(0.01)
+        released.set()
+
+        results = await asyncio.wait_for(backlog, 1)
+        await first
+
+        # Results in the order of the calls
+        self.assertEqual([score for _, score in results], [0.4, 0.1, 0.3, 0.2])
+        self.assertEqual(
+            self.batches(), [(["x", "y"], "en"), (["a", "bb"], "en"), (["ccc", "dddd"], "en")]
+        )
+        self.assertEqual(self.scheduler.metrics()["batch_sizes"], {2: 3})
+
+    async def test_stop_analyzes_waiting_texts(self):
+        self.config["sentiment_inference_timeout_ms"] = 60000
+        self.scheduler = SentimentScheduler(self.mock_nlp, self.config)
+        self.scheduler.start()
+        task = asyncio.create_task(self.scheduler.analyze("great", "en"))
+        await asyncio.sleep(0.01)
+
+        await self.scheduler.stop()
+
+        self.assertEqual(await task, (SentimentEnum.POSITIVE, 0.5))
+
+    async def test_analysis_disabled(self):
+        self.mock_nlp.analysis_enabled = False
+        self.scheduler.start()
+
+        self.assertEqual(await self.scheduler.analyze("great", "en"), (None, None))
+        self.mock_nlp.analyze_batch.assert_not_called()
+
+    async def test_unsupported_language(self):
+        with self.assertRaises(NotImplementedError):
+            await self.scheduler.analyze("großartig", "de")
+
+    async def test_failed_batch(self):
+        self.mock_nlp.analyze_batch.side_effect = RuntimeError("out of memory")
+        self.scheduler.start()
+
+        with self.assertRaises(RuntimeError):
+            await self.scheduler.analyze("great", "en")
+        self.assertEqual(self.scheduler.metrics()["errors"], 1)
+
+        # Logged, the comment is saved without sentiment
+        with self.assertLogs(level="ERROR"):
+            result = await self.scheduler.analyze_comment("great", "en")
+        self.assertEqual(result, ("en", None, None))
+
+        # Raised to the callers trying again later
+        with self.assertRaises(RuntimeError):
+            await self.scheduler.analyze_comment("great", "en", raise_errors=True)
+        # Unless the language is not supported
+        with self.assertLogs(level="ERROR"):
+            result = await self.scheduler.analyze_comment("großartig", "de", raise_errors=True)
+        self.assertEqual(result, ("de", None, None))
+
+    async def test_analyze_comment(self):
+        self.assertEqual(
+            await self.scheduler.analyze_comment("This is a great feature"),
+            ("en", SentimentEnum.POSITIVE, 2.3),
+        )
+        self.assertEqual(await self.scheduler.analyze_comment("", "en"), ("en", None, None))
+
+    async def test_metrics(self):
+        self.assertIsNone(self.scheduler.metrics()["latency_ms"]["p50"])
+        self.scheduler.start()
+        await asyncio.gather(*(self.scheduler.analyze(text, "en") for text in ["a", "bb", "ccc", "dddd"]))
+
+        metrics = self.scheduler.metrics()
+        self.assertEqual(metrics["analyzed"], 4)
+        self.assertEqual(metrics["batches"], 2)
+        self.assertEqual(metrics["batch_sizes"], {1: 1, 3: 1})
+        self.assertEqual(metrics["depth"], 0)
+        # Already waiting, the last text was run right after the full batch
+        self.assertLess(metrics["latency_ms"]["max"], 45)
+        self.assertLessEqual(metrics["latency_ms"]["p50"], metrics["latency_ms"]["max"])
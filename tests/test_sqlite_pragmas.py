@@ -0,0 +1,101 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from models.display import Display
+from models.project import Project
+from repository.sqlite_pragmas import (
+    PROFILES,
+    PragmaDatabase,
+    apply_pragmas,
+    connection_factory,
+    connection_pragmas,
+    parse_pragmas,
+    persistent_pragmas,
+    read_pragmas,
+)
+from repository.sqlite_repository import SQLiteRepository
+
+
+class TestSQLitePragmas(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.db_name = os.path.join(self.folder, "test_pragmas.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_parse_pragmas(self):
+        self.assertEqual(parse_pragmas(), {})
+        self.assertEqual(parse_pragmas("default", ""), {})
+        self.assertEqual(parse_pragmas("performance"), PROFILES["performance"])
+
+        pragmas = parse_pragmas("performance", " cache_size=-2000, Busy_Timeout = 100 ,")
+        self.assertEqual(pragmas["cache_size"], "-2000")
+        self.assertEqual(pragmas["busy_timeout"], "100")
+        self.assertEqual(pragmas["journal_mode"], "WAL")
+
+    def test_parse_pragmas_invalid(self):
+        with self.assertRaises(ValueError):
+            parse_pragmas("fastest")
+        for overrides in ["cache_size", "cache_size=1; DROP TABLE Comment", "cache-size=1"]:
+            with self.assertRaises(ValueError):
+                parse_pragmas("default", overrides)
+
+    def test_apply_pragmas(self):
+        conn = sqlite3.connect(self.db_name)
+        apply_pragmas(conn, PROFILES["performance"])
+        self.assertEqual(
+            read_pragmas(conn, ["journal_mode", "synchronous", "cache_size", "temp_store", "busy_timeout"]),
+            {
+                "journal_mode": "wal",
+                "synchronous": "1",
+                "cache_size": "-65536",
+                "temp_store": "2",
+                "busy_timeout": "5000",
+            },
+        )
+        conn.close()
+
+    def test_repository_connections(self):
+        repository = SQLiteRepository({"survey_db": self.db_name, "survey_db_profile": "performance"})
+
+        conn = repository._connect()
+        self.assertEqual(read_pragmas(conn, ["synchronous"]), {"synchronous": "1"})
+        conn.close()
+        # The views were created in WAL mode, which is kept by the database file
+        conn = sqlite3.connect(self.db_name)
+        self.assertEqual(read_pragmas(conn, ["journal_mode"]), {"journal_mode": "wal"})
+        conn.close()
+
+    def test_split_pragmas(self):
+        pragmas = PROFILES["performance"]
+
+        self.assertEqual(persistent_pragmas(pragmas), {"journal_mode": "WAL"})
+        self.assertNotIn("journal_mode", connection_pragmas(pragmas))
+        self.assertEqual(len(connection_pragmas(pragmas)), len(pragmas) - 1)
+
+    def test_connection_factory(self):
+        factory = connection_factory({"cache_size": "-1234", "journal_mode": "WAL"})
+
+        conn = sqlite3.connect(self.db_name, factory=factory)
+        self.assertEqual(
+            read_pragmas(conn, ["cache_size", "journal_mode"]), {"cache_size": "-1234", "journal_mode": "delete"}
+        )
+        conn.close()
+
+    async def test_pydbantic_connections(self):
+        database = await PragmaDatabase.create(
+            f"sqlite:///{self.db_name}", tables=[Project, Display], pragmas={"cache_size": "-1234", "journal_mode": "WAL"}
+        )
+
+        async with database as connection:
+            self.assertEqual(await connection.fetch_val("PRAGMA cache_size"), -1234)
+            # Applied once by the repository instead
+            self.assertEqual(await connection.fetch_val("PRAGMA journal_mode"), "delete")
+        with database.engine.connect() as connection:
+            self.assertEqual(connection.exec_driver_sql("PRAGMA cache_size").scalar(), -1234)
+        database.engine.dispose()
+
@@ -1,11 +1,17 @@
 from collections import namedtuple
+from contextlib import ExitStack
+import os
+import shutil
 import sqlite3
+import tempfile
 import unittest
 
 from datetime import datetime
-from unittest.mock import AsyncMock, Mock, PropertyMock, patch
+from unittest.mock import AsyncMock, MagicMock, Mock, PropertyMock, patch
 
-from models.comment import Comment, CommentPostBody
+import sqlalchemy
+
+from models.comment import Comment, CommentPostBody, SearchModeEnum, SentimentEnum
 from models.display import Display
 from models.project import Project, ProjectEncryption
 from models.views import NumberDisplayByProject
@@ -34,6 +40,8 @@ class TestSQLiteRepository(unittest.IsolatedAsyncioTestCase):
                 feature_url TEXT NOT NULL,
                 rating INTEGER NOT NULL,
                 timestamp DATETIME NOT NULL,
+                comment TEXT,
+                language TEXT,
                 FOREIGN KEY(project_id) REFERENCES Project(id)
             );
         ''')
@@ -54,11 +62,11 @@ class TestSQLiteRepository(unittest.IsolatedAsyncioTestCase):
         ''')
 
         cls.cursor.execute('''
-            INSERT INTO Comment (id, project_id, feature_url, rating, timestamp) VALUES
-            (1, 1, 'http://example.com/feature1', 3, '2023-05-01 10:00:00'),
-            (2, 1, 'http://example.com/feature1', 5, '2023-05-01 11:00:00'),
-            (3, 1, 'http://example.com/feature2', 4, '2023-05-01 12:00:00'),
-            (4, 2, 'http://example.com/feature1', 2, '2023-05-01 13:00:00');
+            INSERT INTO Comment (id, project_id, feature_url, rating, timestamp, comment, language) VALUES
+            (1, 1, 'http://example.com/feature1', 3, '2023-05-01 10:00:00', 'ok', 'en'),
+            (2, 1, 'http://example.com/feature1', 5, '2023-05-01 11:00:00', 'great feature', 'en'),
+            (3, 1, 'http://example.com/feature2', 4, '2023-05-01 12:00:00', 'really great', 'en'),
+            (4, 2, 'http://example.com/feature1', 2, '2023-05-01 13:00:00', 'bad', 'en');
         ''')
 
         cls.cursor.execute('''
@@ -72,6 +80,8 @@ class TestSQLiteRepository(unittest.IsolatedAsyncioTestCase):
 
     @classmethod
     def tearDownClass(cls):
+        cls.cursor.execute('DROP TABLE IF EXISTS comment_search')
+        cls.cursor.execute('DROP TABLE IF EXISTS comment_lemmas')
         cls.cursor.execute('DROP TABLE Comment')
         cls.cursor.execute('DROP TABLE Display')
         cls.cursor.execute('DROP TABLE Project')
@@ -145,6 +155,61 @@ class TestSQLiteRepository(unittest.IsolatedAsyncioTestCase):
         Project.insert.assert_not_called()
         ProjectEncryption.insert.assert_not_called()
     
+    async def test_encryption_key_of_created_project(self):
+        Project.filter = AsyncMock(return_value=[])
+        Project.insert = AsyncMock(return_value=5)
+        ProjectEncryption.insert = AsyncMock()
+        fetch = AsyncMock()
+
+        with patch("repository.sqlite_repository.Encryption.generate_key", return_value="new_key"):
+            project = await self.repository.create_project(Project(name=self.project_name))
+        with patch.object(Project, "__metadata__", Mock(database=Mock(fetch=fetch)), create=True):
+            result = await self.repository.get_encryption_key_by_project_name(project.name)
+
+        self.assertEqual(result, "new_key")
+        fetch.assert_not_awaited()
+
+    async def test_get_encryption_key_by_project_name(self):
+        metadata = sqlalchemy.MetaData()
+        project_table = sqlalchemy.Table(
+            "Project",
+            metadata,
+            sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+            sqlalchemy.Column("name", sqlalchemy.String),
+        )
+        encryption_table = sqlalchemy.Table(
+            "ProjectEncryption",
+            metadata,
+            sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+            sqlalchemy.Column("project_id", sqlalchemy.Integer),
+            sqlalchemy.Column("encryption_key", sqlalchemy.String),
+        )
+        fetch = AsyncMock(side_effect=[[("key_a",)], []])
+
+        with patch.object(Project, "get_table", Mock(return_value=project_table), create=True), \
+            patch.object(ProjectEncryption, "get_table", Mock(return_value=encryption_table), create=True), \
+            patch.object(Project, "__metadata__", Mock(database=Mock(fetch=fetch)), create=True):
+            first = await self.repository.get_encryption_key_by_project_name("project_a")
+            second = await self.repository.get_encryption_key_by_project_name("project_a")
+            missing = await self.repository.get_encryption_key_by_project_name("unknown")
+
+        self.assertEqual(first, "key_a")
+        self.assertEqual(second, "key_a")
+        self.assertIsNone(missing)
+        self.assertEqual(fetch.await_count, 2)
+
+    async def test_get_projects_encryptions(self):
+        project_a = Project(id=1, name="project_a")
+        project_b = Project(id=2, name="project_b")
+        encryption_a = ProjectEncryption(id=1, project_id=1, encryption_key="key_a")
+        encryption_b = ProjectEncryption(id=2, project_id=2, encryption_key="key_b")
+
+        with patch.object(Project, "all", AsyncMock(return_value=[project_a, project_b])), \
+            patch.object(ProjectEncryption, "all", AsyncMock(return_value=[encryption_b, encryption_a])):
+            result = await self.repository.get_projects_encryptions()
+
+        self.assertEqual(result, [(project_b, encryption_b), (project_a, encryption_a)])
+
     async def test_get_all_comments(self):
         comment_a = Comment(
             id=1,
@@ -202,67 +267,273 @@ class TestSQLiteRepository(unittest.IsolatedAsyncioTestCase):
         Comment.all.assert_called_once()
 
 
-    async def test_read_comments_with_feature_url(self):
-        comment_a = Comment(
-            id=1,
-            project_id=1,
-            user_id="1",
-            timestamp=datetime.now().isoformat(),
-            feature_url="http://test.com/test",
-            rating=4,
-            comment="test",
-            language="en",
+    def patch_comment_queries(self):
+        """
+        Runs the comment queries of the repository on the test database,
+        and returns the ids of the rows instead of parsing them
+        """
+        metadata = sqlalchemy.MetaData()
+        project_table = sqlalchemy.Table(
+            "Project",
+            metadata,
+            sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+            sqlalchemy.Column("name", sqlalchemy.String),
+        )
+        comment_table = sqlalchemy.Table(
+            "Comment",
+            metadata,
+            sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+            sqlalchemy.Column("project_id", sqlalchemy.Integer),
+            sqlalchemy.Column("feature_url", sqlalchemy.String),
+            sqlalchemy.Column("rating", sqlalchemy.Integer),
+            sqlalchemy.Column("timestamp", sqlalchemy.String),
+            sqlalchemy.Column("comment", sqlalchemy.String),
+        )
+        engine = sqlalchemy.create_engine(f"sqlite:///{self.db_name}")
+        self.statements = []
+        sqlalchemy.event.listen(
+            engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: self.statements.append(statement),
         )
 
-        with patch('models.comment.Comment.filter') as mock_filter:
-            mock_filter.return_value = [comment_a]
-            Comment.feature_url = AsyncMock(return_value=comment_a.feature_url)
-            result = await self.repository.read_comments(feature_url="http://test.com/test")
-            mock_filter.assert_called_once_with(Comment.feature_url == "http://test.com/test")
-            self.assertEqual(result, [comment_a])
+        async def fetch(statement, table_name):
+            with engine.connect() as connection:
+                return connection.execute(statement).all()
+
+        stack = ExitStack()
+        stack.enter_context(patch.object(Comment, "get_table", Mock(return_value=comment_table), create=True))
+        stack.enter_context(patch.object(Project, "get_table", Mock(return_value=project_table), create=True))
+        stack.enter_context(patch.object(Comment, "__metadata__", Mock(database=Mock(fetch=fetch, engine=engine)), create=True))
+        stack.enter_context(patch.object(Project, "__metadata__", Mock(database=Mock(fetch=fetch, engine=engine)), create=True))
+        stack.enter_context(patch.object(Comment, "parse_results", Mock(side_effect=lambda rows, *args: [row[0] for row in rows]), create=True))
+        return stack
+
+    async def test_read_comments_with_feature_url(self):
+        with self.patch_comment_queries():
+            result = await self.repository.read_comments(feature_url="http://example.com/feature2")
+        self.assertEqual(result, [3])
 
     async def test_read_comments_with_project_name(self):
-        comment_a = Comment(
-            id=1,
-            project_id=1,
-            user_id="1",
-            timestamp=datetime.now().isoformat(),
-            feature_url="http://test.com/test",
-            rating=4,
-            comment="test",
-            language="en",
+        with self.patch_comment_queries():
+            result = await self.repository.read_comments(project_name="Project B")
+            self.assertEqual(result, [4])
+            result = await self.repository.read_comments(project_name="unknown")
+            self.assertEqual(result, [])
+
+    async def test_read_comments_with_timestamp_start(self):
+        with self.patch_comment_queries():
+            result = await self.repository.read_comments(timestamp_start="2023-05-01 11:00:00")
+        self.assertEqual(result, [2, 3, 4])
+
+    async def test_read_comments_single_query(self):
+        with self.patch_comment_queries():
+            result = await self.repository.read_comments(
+                project_name="Project A",
+                feature_url="http://example.com/feature1",
+                content_search="^(good|great)",
+                rating_min=4,
+            )
+
+        self.assertEqual(result, [2])
+        # The project, the other filters and the search are all applied by one statement
+        self.assertEqual(len(self.statements), 1)
+        self.assertIn("REGEXP", self.statements[0])
+
+    async def test_read_comments_page(self):
+        with self.patch_comment_queries():
+            result = await self.repository.read_comments(page=2, page_size=3)
+            self.assertEqual(result, [4])
+            result = await self.repository.read_comments(rating_min=3, page=1, page_size=2)
+            self.assertEqual(result, [1, 2])
+
+        self.assertEqual(len(self.statements), 2)
+        self.assertIn("LIMIT", str(self.statements[0]))
+        self.assertIn("OFFSET", str(self.statements[0]))
+
+    async def test_read_comments_invalid_page(self):
+        with self.assertRaises(ValueError):
+            await self.repository.read_comments(page=0, page_size=10)
+
+    async def test_read_comments_after(self):
+        with self.patch_comment_queries():
+            result = await self.repository.read_comments_after(limit=2)
+            self.assertEqual(result, [1, 2])
+            result = await self.repository.read_comments_after(
+                after=("2023-05-01 11:00:00", 2), limit=2
+            )
+            self.assertEqual(result, [3, 4])
+            result = await self.repository.read_comments_after(
+                after=("2023-05-01 11:00:00", 2), limit=2, content_search="great"
+            )
+            self.assertEqual(result, [3])
+
+    async def test_get_rates_from_features(self):
+        with self.patch_comment_queries():
+            result = await self.repository.get_rates_from_features(
+                ["http://example.com/feature2", "http://example.com/feature3"]
+            )
+
+        self.assertEqual(
+            result,
+            {
+                "http://example.com/feature2": [{"rate": 4, "timestamp": "2023-05-01 12:00:00"}],
+                "http://example.com/feature3": [],
+            },
         )
-        project = Project(
-            id=1,
-            name="project1",
+        self.assertEqual(len(self.statements), 1)
+
+    async def test_get_rates_from_many_features(self):
+        feature_urls = [f"http://example.com/unknown{i}" for i in range(1500)]
+        feature_urls.append("http://example.com/feature2")
+        with self.patch_comment_queries():
+            result = await self.repository.get_rates_from_features(feature_urls)
+
+        self.assertEqual(len(result), 1501)
+        self.assertEqual(
+            result["http://example.com/feature2"],
+            [{"rate": 4, "timestamp": "2023-05-01 12:00:00"}],
         )
-        with patch('models.comment.Comment.filter') as mock_filter:
-            mock_filter.return_value = [comment_a]
-            Comment.project_id = AsyncMock(return_value=comment_a.project_id)
-            result = await self.repository.read_comments(project_name=project.name)
-            mock_filter.assert_called_once_with(Comment.project_id == 1)
-            self.assertEqual(result, [comment_a])
+        # A statement per MAX_VARIABLES features
+        self.assertEqual(len(self.statements), 2)
+
+    async def test_get_project_ids(self):
+        with self.patch_comment_queries():
+            result = await self.repository.get_project_ids(["Project A", "Project B", "unknown"])
+
+        self.assertEqual(result, {"Project A": 1, "Project B": 2})
+        self.assertEqual(len(self.statements), 1)
+
+    async def test_get_project_names(self):
+        with self.patch_comment_queries():
+            result = await self.repository.get_project_names({1, 2, 3})
+
+        self.assertEqual(result, {1: "Project A", 2: "Project B"})
+        self.assertEqual(len(self.statements), 1)
+
+    async def test_comment_lemmas(self):
+        await self.repository.create_lemma_table()
+        try:
+            await self.repository.save_comment_lemmas({1: ["ok"], 2: ["great", "feature"], 4: None})
+            self.assertEqual(
+                await self.repository.get_comment_lemmas([1, 2, 3, 4]),
+                {1: ["ok"], 2: ["great", "feature"], 4: None},
+            )
+            # More comments than the variables allowed in a statement
+            self.assertEqual(
+                await self.repository.get_comment_lemmas([*range(5, 2500), 4, 2]),
+                {2: ["great", "feature"], 4: None},
+            )
+            with self.patch_comment_queries():
+                result = await self.repository.get_comments_without_lemmas(0, 10)
+            self.assertEqual(result, [3])
+
+            # The lemmas are removed when the text of the comment changes
+            self.cursor.execute("UPDATE Comment SET comment = 'fine' WHERE id = 1")
+            self.cursor.execute("UPDATE Comment SET rating = 1 WHERE id = 2")
+            self.conn.commit()
+            self.assertEqual(
+                await self.repository.get_comment_lemmas([1, 2]), {2: ["great", "feature"]}
+            )
+        finally:
+            self.cursor.execute("UPDATE Comment SET comment = 'ok' WHERE id = 1")
+            self.cursor.execute("UPDATE Comment SET rating = 5 WHERE id = 2")
+            self.cursor.execute("DELETE FROM comment_lemmas")
+            self.conn.commit()
+
+    async def test_count_comments(self):
+        with self.patch_comment_queries():
+            self.assertEqual(await self.repository.count_comments(), 4)
+            self.assertEqual(await self.repository.count_comments(rating_min=3), 3)
+            self.assertEqual(await self.repository.count_comments(project_name="unknown"), 0)
+            self.assertEqual(await self.repository.count_comments(content_search="great"), 2)
+
+        self.assertIn("count(*)", str(self.statements[0]))
+
+    async def test_read_comments_page_with_total(self):
+        with self.patch_comment_queries():
+            result, total = await self.repository.read_comments_page(2, 2, rating_min=3)
+            self.assertEqual((result, total), ([3], 3))
+            result, total = await self.repository.read_comments_page(1, 2, content_search="great")
+            self.assertEqual((result, total), ([2, 3], 2))
+
+        # The count and the page are read in the same transaction
+        self.assertEqual(self.statements[0], "BEGIN")
+        self.assertIn("count(*)", self.statements[1])
+        self.assertIn("LIMIT", self.statements[2])
+
+    async def test_read_comments_page_invalid(self):
+        with self.assertRaises(ValueError):
+            await self.repository.read_comments_page(0, 10)
+
+    def test_search_query(self):
+        self.assertEqual(SQLiteRepository._to_search_query("great  feature"), '"great" "feature"')
+        self.assertEqual(
+            SQLiteRepository._to_search_query('"great feature" NOT ok*'),
+            '"great feature" "NOT" "ok*"',
+        )
+        self.assertEqual(SQLiteRepository._to_search_query('   ""'), "")
 
-    async def test_read_comments_with_timestamp_start(self):
-        comment_a = Comment(
-            id=1,
-            project_id=1,
-            user_id="1",
-            timestamp=datetime.now().isoformat(),
-            feature_url="http://test.com/test",
-            rating=4,
-            comment="test",
-            language="en",
+    async def test_read_comments_text_search(self):
+        await self.repository.create_search_index()
+        # Does nothing once the index exists
+        await self.repository.create_search_index()
+
+        with self.patch_comment_queries():
+            result = await self.repository.read_comments(
+                content_search="GREAT", search_mode=SearchModeEnum.TEXT
+            )
+            self.assertEqual(result, [2, 3])
+            result = await self.repository.read_comments(
+                content_search='"feature great"', search_mode=SearchModeEnum.TEXT
+            )
+            self.assertEqual(result, [])
+            count = await self.repository.count_comments(
+                content_search="great", rating_min=5, search_mode=SearchModeEnum.TEXT
+            )
+            self.assertEqual(count, 1)
+
+        # The index follows the changes of the table
+        self.cursor.execute("UPDATE Comment SET comment = 'great' WHERE id = 1")
+        self.cursor.execute("INSERT INTO Comment (id, project_id, feature_url, rating, timestamp, comment, language) VALUES (5, 2, 'http://example.com/feature1', 1, '2023-05-02 10:00:00', 'not great', 'en')")
+        self.cursor.execute("DELETE FROM Comment WHERE id = 5")
+        self.conn.commit()
+        try:
+            with self.patch_comment_queries():
+                result = await self.repository.read_comments(
+                    content_search="great", search_mode=SearchModeEnum.TEXT
+                )
+            self.assertEqual(result, [1, 2, 3])
+        finally:
+            self.cursor.execute("UPDATE Comment SET comment = 'ok' WHERE id = 1")
+            self.conn.commit()
+
+    async def test_search_index_not_updated_by_other_columns(self):
+        # Definition of a previous version, updating the index on any change
+        self.cursor.execute('DROP TABLE IF EXISTS comment_search')
+        self.cursor.execute("DROP TRIGGER IF EXISTS comment_search_update")
+        self.cursor.execute(
+            "CREATE TRIGGER comment_search_update AFTER UPDATE ON Comment BEGIN SELECT 1; END;"
         )
-        timestamp_start = datetime(2023, 5, 1).isoformat()
+        self.conn.commit()
+        await self.repository.create_search_index()
+
+        (sql,) = self.cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'comment_search_update'"
+        ).fetchone()
+        self.assertIn("AFTER UPDATE OF comment, language ON Comment", sql)
+
+    async def test_create_search_index_backfill(self):
+        self.cursor.execute('DROP TABLE IF EXISTS comment_search')
+        self.conn.commit()
+
+        await self.repository.create_search_index()
+
+        rows = self.cursor.execute(
+            "SELECT rowid FROM comment_search WHERE comment_search MATCH 'great' ORDER BY rowid"
+        ).fetchall()
+        self.assertEqual(rows, [(2,), (3,)])
 
-        with patch('models.comment.Comment.filter') as mock_filter:
-            mock_filter.return_value = [comment_a]
-            Comment.timestamp = PropertyMock(return_value=comment_a.timestamp)
-            result = await self.repository.read_comments(timestamp_start=timestamp_start)
-            mock_filter.assert_called_once_with(Comment.timestamp >= timestamp_start)
-            self.assertEqual(result, [comment_a])
-            
     async def test_create_display(self):
         user_id = "123"
         timestamp_dt = datetime.now().isoformat()
@@ -290,6 +561,58 @@ class TestSQLiteRepository(unittest.IsolatedAsyncioTestCase):
             ),
         )
 
+    async def test_create_displays(self):
+        timestamp = datetime.now().isoformat()
+        mock_table = Mock()
+        mock_database = MagicMock()
+        mock_connection = MagicMock()
+        mock_connection.execute = AsyncMock()
+        mock_database.__aenter__.return_value = mock_connection
+        self.repository.create_project = AsyncMock(
+            return_value=Project(id=2, name="new_project")
+        )
+
+        with patch.object(Project, "filter", AsyncMock(return_value=[Project(id=1, name="test_project")])), \
+            patch.object(Project, "name", Mock(), create=True), \
+            patch.object(Display, "get_table", Mock(return_value=mock_table), create=True), \
+            patch.object(Display, "__metadata__", Mock(database=mock_database), create=True):
+            result = await self.repository.create_displays([
+                ("test_project", "1", timestamp, "http://test.com/a"),
+                ("new_project", "2", timestamp, "http://test.com/b"),
+            ])
+
+        self.assertEqual(result, 2)
+        self.repository.create_project.assert_called_once_with(Project(name="new_project"))
+        mock_table.insert.return_value.values.assert_called_once_with([
+            {"project_id": 1, "user_id": "1", "timestamp": timestamp, "feature_url": "http://test.com/a"},
+            {"project_id": 2, "user_id": "2", "timestamp": timestamp, "feature_url": "http://test.com/b"},
+        ])
+        mock_connection.execute.assert_awaited_once()
+        mock_connection.transaction.assert_called_once()
+
+    async def test_create_displays_chunked(self):
+        mock_table = Mock()
+        mock_database = MagicMock()
+        mock_connection = MagicMock()
+        mock_connection.execute = AsyncMock()
+        mock_database.__aenter__.return_value = mock_connection
+        displays = [("test_project", str(i), "2023-05-01T10:00:00", "http://test.com") for i in range(5)]
+
+        with patch.object(Project, "filter", AsyncMock(return_value=[Project(id=1, name="test_project")])), \
+            patch.object(Project, "name", Mock(), create=True), \
+            patch.object(Display, "get_table", Mock(return_value=mock_table), create=True), \
+            patch.object(Display, "__metadata__", Mock(database=mock_database), create=True), \
+            patch.object(SQLiteRepository, "MAX_VARIABLES", 8):
+            result = await self.repository.create_displays(displays)
+
+        self.assertEqual(result, 5)
+        # 4 columns per row, 2 rows per statement
+        self.assertEqual(
+            [len(call.args[0]) for call in mock_table.insert.return_value.values.call_args_list], [2, 2, 1]
+        )
+        self.assertEqual(mock_connection.execute.await_count, 3)
+        mock_connection.transaction.assert_called_once()
+
     def test_get_number_of_display_with_existing_project_id(self):
         # Mocking the Session object and query method
         mock_session = Mock()
@@ -494,10 +817,10 @@ class TestSQLiteRepository(unittest.IsolatedAsyncioTestCase):
             comment="test",
             language="en",
         )
-        with patch('models.comment.Comment.filter') as mock_filter:
+        with patch('models.comment.Comment.filter') as mock_filter, \
+            patch.object(Comment, "timestamp", PropertyMock(return_value=comment_a.timestamp), create=True), \
+            patch.object(Comment, "feature_url", PropertyMock(return_value=comment_a.feature_url), create=True):
             mock_filter.return_value = [comment_a]
-            Comment.timestamp = PropertyMock(return_value=comment_a.timestamp)
-            Comment.feature_url = PropertyMock(return_value=comment_a.feature_url)
 
             rates = await self.repository.get_rates_from_feature(
                 feature_url="http://example.com/feature1"
@@ -580,3 +903,371 @@ class TestSQLiteRepository(unittest.IsolatedAsyncioTestCase):
 
             # Assert that the query was called with the correct filter
             mock_query.filter.assert_called_once_with(NumberDisplayByProject.project_id == project_id)
+
+
+# Same tables as the ones created by pydbantic for the models
+SCHEMA = '''
+    CREATE TABLE Project (id INTEGER PRIMARY KEY, name VARCHAR UNIQUE);
+    CREATE TABLE Comment (
+        id INTEGER PRIMARY KEY, project_id INTEGER, feature_url VARCHAR, rating INTEGER,
+        comment VARCHAR, user_id VARCHAR, timestamp VARCHAR, language VARCHAR,
+        sentiment VARCHAR, sentiment_score FLOAT
+    );
+    CREATE TABLE Display (
+        id INTEGER PRIMARY KEY, project_id INTEGER, user_id VARCHAR,
+        timestamp VARCHAR, feature_url VARCHAR
+    );
+'''
+
+
+class TestSQLiteIndexes(unittest.IsolatedAsyncioTestCase):
+    """
+    Checks with EXPLAIN QUERY PLAN that the queries of the repository
+    use the secondary indexes instead of scanning the tables
+    """
+
+    async def asyncSetUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.db_name = os.path.join(self.folder, "test_indexes.sqlite3")
+        conn = sqlite3.connect(self.db_name)
+        conn.executescript(SCHEMA)
+        conn.commit()
+        conn.close()
+
+        self.repository = SQLiteRepository({"survey_db": self.db_name})
+        await self.repository.create_indexes()
+        await self.repository.create_search_index()
+
+        self.engine = sqlalchemy.create_engine(f"sqlite:///{self.db_name}")
+        metadata = sqlalchemy.MetaData()
+        metadata.reflect(bind=self.engine, only=["Project", "Comment", "Display"])
+        self.plans = []
+        sqlalchemy.event.listen(self.engine, "before_cursor_execute", self.explain)
+
+        async def fetch(statement, table_name):
+            with self.engine.connect() as connection:
+                return connection.execute(statement).all()
+
+        self.stack = ExitStack()
+        self.stack.enter_context(patch.object(Comment, "get_table", Mock(return_value=metadata.tables["Comment"]), create=True))
+        self.stack.enter_context(patch.object(Project, "get_table", Mock(return_value=metadata.tables["Project"]), create=True))
+        self.stack.enter_context(patch.object(Comment, "__metadata__", Mock(database=Mock(fetch=fetch, engine=self.engine)), create=True))
+        self.stack.enter_context(patch.object(Comment, "parse_results", Mock(return_value=[]), create=True))
+
+    def tearDown(self):
+        self.stack.close()
+        self.engine.dispose()
+        shutil.rmtree(self.folder)
+
+    def explain(self, conn, cursor, statement, parameters, context, executemany):
+        rows = conn.connection.cursor().execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        self.plans.append([row[3] for row in rows])
+
+    def assertUsesIndex(self, index_name):
+        plan = self.plans.pop()
+        self.assertTrue(
+            any(index_name in step and step.startswith("SEARCH") for step in plan),
+            f"{index_name} not used: {plan}",
+        )
+        self.assertFalse(
+            any(step in ("SCAN Comment", "SCAN Display") for step in plan),
+            f"Full table scan: {plan}",
+        )
+
+    async def test_create_indexes(self):
+        conn = sqlite3.connect(self.db_name)
+        conn.execute("CREATE INDEX idx_survey_comment_obsolete ON Comment(language)")
+        conn.execute("CREATE INDEX idx_comment_timestamp_id ON Comment(timestamp, id)")
+        conn.execute("CREATE INDEX idx_comment_language ON Comment(language)")
+        conn.commit()
+
+        await self.repository.create_indexes()
+
+        names = {
+            row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")
+        }
+        conn.close()
+        # The index added by an operator is kept
+        self.assertEqual(names, set(SQLiteRepository.INDEXES) | {"idx_comment_language"})
+
+    async def test_comment_queries(self):
+        await self.repository.read_comments(project_name="project", page=1, page_size=20)
+        self.assertUsesIndex("idx_survey_comment_project_feature_timestamp")
+
+        await self.repository.read_comments(
+            project_name="project", feature_url="http://test.com", timestamp_start="2023-01-01", page=1, page_size=20
+        )
+        self.assertUsesIndex("idx_survey_comment_project_feature_timestamp")
+
+        await self.repository.read_comments(feature_url="http://test.com", page=1, page_size=20)
+        self.assertUsesIndex("idx_survey_comment_feature_timestamp")
+
+        await self.repository.read_comments(user_id="1", timestamp_end="2023-01-01", page=1, page_size=20)
+        self.assertUsesIndex("idx_survey_comment_user_timestamp")
+
+        await self.repository.read_comments(timestamp_start="2023-01-01", timestamp_end="2023-02-01", page=1, page_size=20)
+        self.assertUsesIndex("idx_survey_comment_timestamp_id")
+
+        await self.repository.read_comments_after(after=("2023-01-01", 3), limit=20)
+        self.assertUsesIndex("idx_survey_comment_timestamp_id")
+
+        await self.repository.count_comments(project_name="project")
+        self.assertUsesIndex("idx_survey_comment_project_feature_timestamp")
+
+        await self.repository.count_comments(user_id="1")
+        self.assertUsesIndex("idx_survey_comment_user_timestamp")
+
+    async def test_view_queries(self):
+        # The statistics are read from one row of the summary tables
+        await self.repository.get_project_avg_rating(1)
+        self.assertUsesIndex("project_rating_summary USING INTEGER PRIMARY KEY")
+
+        await self.repository.get_feature_avg_rating(1, "http://test.com")
+        self.assertUsesIndex("feature_rating_summary USING INDEX sqlite_autoindex_feature_rating_summary_1")
+
+        await self.repository.get_number_of_comment(1)
+        self.assertUsesIndex("project_rating_summary USING INTEGER PRIMARY KEY")
+
+        await self.repository.get_number_of_display(1)
+        self.assertUsesIndex("project_display_summary USING INTEGER PRIMARY KEY")
+
+
+class TestSQLiteSummaryTables(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.db_name = os.path.join(self.folder, "test_summaries.sqlite3")
+        self.conn = sqlite3.connect(self.db_name)
+        self.conn.executescript(SCHEMA)
+        self.insert_comment(1, "http://test.com/a", 4)
+        self.insert_comment(1, "http://test.com/b", 1)
+        self.conn.execute("INSERT INTO Display (project_id) VALUES (1), (1), (2)")
+        self.conn.commit()
+
+        self.repository = SQLiteRepository({"survey_db": self.db_name})
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.folder)
+
+    def insert_comment(self, project_id, feature_url, rating):
+        self.conn.execute(
+            "INSERT INTO Comment (project_id, feature_url, rating, timestamp) VALUES (?, ?, ?, '2023-01-01')",
+            (project_id, feature_url, rating),
+        )
+
+    def assertViewsMatchTables(self):
+        """
+        The views on the summary tables give the same results as aggregating the tables
+        """
+        queries = [
+            (
+                "SELECT project_id, feature_url, average_rating FROM feature_rating_avg",
+                "SELECT project_id, feature_url, AVG(rating) FROM Comment GROUP BY project_id, feature_url",
+            ),
+            (
+                "SELECT project_id, average_rating FROM project_rating_avg",
+                "SELECT project_id, AVG(rating) FROM Comment GROUP BY project_id",
+            ),
+            (
+                "SELECT project_id, number_comment FROM number_comment_by_project",
+                "SELECT project_id, COUNT(*) FROM Comment GROUP BY project_id",
+            ),
+            (
+                "SELECT project_id, number_display FROM number_display_by_project",
+                "SELECT project_id, COUNT(*) FROM Display GROUP BY project_id",
+            ),
+        ]
+        for view_query, table_query in queries:
+            self.assertEqual(
+                sorted(self.conn.execute(view_query).fetchall()),
+                sorted(self.conn.execute(table_query).fetchall()),
+            )
+
+    async def test_summaries_backfilled(self):
+        await self.repository.create_summary_triggers()
+        self.assertViewsMatchTables()
+        self.assertEqual(
+            self.conn.execute("SELECT average_rating FROM project_rating_avg WHERE project_id = 1").fetchall(),
+            [(2.5,)],
+        )
+
+    async def test_summaries_follow_changes(self):
+        await self.repository.create_summary_triggers()
+        # Does nothing once the triggers exist
+        await self.repository.create_summary_triggers()
+
+        self.insert_comment(1, "http://test.com/a", 5)
+        self.insert_comment(2, "http://test.com/c", 3)
+        self.conn.execute("UPDATE Comment SET rating = 2, feature_url = 'http://test.com/c' WHERE id = 2")
+        self.conn.execute("DELETE FROM Comment WHERE id = 1")
+        self.conn.execute("INSERT INTO Display (project_id) VALUES (2)")
+        self.conn.execute("UPDATE Display SET project_id = 3 WHERE id = 3")
+        self.conn.execute("DELETE FROM Display WHERE id = 1")
+        self.conn.commit()
+        self.assertViewsMatchTables()
+
+        # A feature without comments anymore is not listed
+        self.conn.execute("DELETE FROM Comment WHERE feature_url = 'http://test.com/c'")
+        self.conn.commit()
+        self.assertViewsMatchTables()
+
+    async def test_summaries_ignore_other_columns(self):
+        # Definition of a previous version, firing on any update
+        self.conn.execute("CREATE TRIGGER comment_summary_update AFTER UPDATE ON Comment BEGIN SELECT 1; END;")
+        self.conn.commit()
+        await self.repository.create_summary_triggers()
+
+        changes = self.conn.total_changes
+        self.conn.execute("UPDATE Comment SET sentiment = 'POSITIVE', sentiment_score = 0.9 WHERE id = 1")
+        self.conn.commit()
+
+        # The comment alone, the summary tables are not written
+        self.assertEqual(self.conn.total_changes - changes, 1)
+        self.conn.execute("UPDATE Comment SET rating = 5 WHERE id = 1")
+        self.conn.commit()
+        self.assertViewsMatchTables()
+
+    async def test_rebuild_summary_tables(self):
+        await self.repository.create_summary_triggers()
+        self.conn.execute("UPDATE project_rating_summary SET rating_sum = 100")
+        self.conn.execute("DELETE FROM project_display_summary")
+        self.conn.commit()
+
+        await self.repository.rebuild_summary_tables()
+        self.assertViewsMatchTables()
+
+    async def test_statistics_of_all_projects(self):
+        await self.repository.create_summary_triggers()
+        self.insert_comment(2, "http://test.com/c", 3)
+        self.conn.commit()
+
+        engine = sqlalchemy.create_engine(f"sqlite:///{self.db_name}")
+        with patch.object(Comment, "__metadata__", Mock(database=Mock(engine=engine)), create=True):
+            self.assertEqual(
+                await self.repository.get_all_feature_avg_ratings(),
+                {1: {"http://test.com/a": 4.0, "http://test.com/b": 1.0}, 2: {"http://test.com/c": 3.0}},
+            )
+            self.assertEqual(
+                await self.repository.get_feature_avg_ratings(1),
+                {"http://test.com/a": 4.0, "http://test.com/b": 1.0},
+            )
+            self.assertEqual(await self.repository.get_feature_avg_ratings(3), {})
+            self.assertEqual(await self.repository.get_all_project_avg_ratings(), {1: 2.5, 2: 3.0})
+            self.assertEqual(await self.repository.get_all_number_of_comments(), {1: 2, 2: 1})
+            self.assertEqual(await self.repository.get_all_number_of_displays(), {1: 2, 2: 1})
+        engine.dispose()
+
+
+class TestSQLiteSentimentQueue(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.db_name = os.path.join(self.folder, "test_sentiment_queue.sqlite3")
+        self.conn = sqlite3.connect(self.db_name)
+        self.conn.executescript(SCHEMA)
+        self.conn.executescript(
+            """
+            INSERT INTO Comment (id, project_id, feature_url, rating, comment, timestamp, language) VALUES
+                (1, 1, 'http://test.com/a', 4, 'great', '2023-01-01', 'unknown'),
+                (2, 1, 'http://test.com/a', 1, 'bad', '2023-01-01', 'unknown'),
+                (3, 1, 'http://test.com/b', 3, 'fine', '2023-01-01', 'unknown');
+            """
+        )
+        self.conn.commit()
+
+        self.repository = SQLiteRepository({"survey_db": self.db_name})
+        await self.repository.create_sentiment_queue()
+
+        self.engine = sqlalchemy.create_engine(f"sqlite:///{self.db_name}")
+        metadata = sqlalchemy.MetaData()
+        metadata.reflect(bind=self.engine, only=["Comment"])
+
+        async def fetch(statement, table_name):
+            with self.engine.connect() as connection:
+                return connection.execute(statement).all()
+
+        self.stack = ExitStack()
+        self.stack.enter_context(patch.object(Comment, "get_table", Mock(return_value=metadata.tables["Comment"]), create=True))
+        self.stack.enter_context(patch.object(Comment, "__metadata__", Mock(database=Mock(fetch=fetch)), create=True))
+        self.stack.enter_context(
+            patch.object(Comment, "parse_results", Mock(side_effect=lambda rows, *args: [row.id for row in rows]), create=True)
+        )
+
+    def tearDown(self):
+        self.stack.close()
+        self.engine.dispose()
+        self.conn.close()
+        shutil.rmtree(self.folder)
+
+    async def test_queue(self):
+        # Does nothing once the table exists
+        await self.repository.create_sentiment_queue()
+        for comment_id in [3, 1, 2, 1]:
+            await self.repository.enqueue_sentiment(comment_id)
+
+        self.assertEqual(await self.repository.count_sentiment_queue(), 3)
+        self.assertEqual(await self.repository.get_sentiment_queue(2), [1, 2])
+
+    async def test_save_sentiments(self):
+        for comment_id in [1, 2, 3]:
+            await self.repository.enqueue_sentiment(comment_id)
+
+        await self.repository.save_sentiments(
+            {1: ("en", SentimentEnum.POSITIVE, 0.9), 2: ("fr", None, None)}
+        )
+
+        self.assertEqual(
+            self.conn.execute("SELECT id, language, sentiment, sentiment_score FROM Comment ORDER BY id").fetchall(),
+            [(1, "en", "POSITIVE", 0.9), (2, "fr", None, None), (3, "unknown", None, None)],
+        )
+        self.assertEqual(await self.repository.get_sentiment_queue(10), [3])
+
+    async def test_deleted_comment_leaves_queue(self):
+        await self.repository.enqueue_sentiment(1)
+        await self.repository.enqueue_sentiment(2)
+        self.conn.execute("DELETE FROM Comment WHERE id = 1")
+        self.conn.commit()
+
+        self.assertEqual(await self.repository.count_sentiment_queue(), 1)
+        self.assertEqual(await self.repository.get_sentiment_queue(10), [2])
+
+
+class TestSQLiteSentimentCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.db_name = os.path.join(self.folder, "test_sentiment_cache.sqlite3")
+        self.repository = SQLiteRepository({"survey_db": self.db_name})
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    async def test_cache(self):
+        await self.repository.create_sentiment_cache("v1", 10)
+        await self.repository.save_cached_sentiments(
+            "v1", {"hash1": ("en", SentimentEnum.POSITIVE, 0.9), "hash2": ("fr", None, None)}
+        )
+
+        self.assertEqual(
+            await self.repository.get_cached_sentiments(["hash1", "hash2", "hash3"], "v1"),
+            {"hash1": ("en", SentimentEnum.POSITIVE, 0.9), "hash2": ("fr", None, None)},
+        )
+        # Given by other models
+        self.assertEqual(await self.repository.get_cached_sentiments(["hash1"], "v2"), {})
+
+    async def test_cleaned_at_startup(self):
+        await self.repository.create_sentiment_cache("v1", 10)
+        await self.repository.save_cached_sentiments(
+            "v1", {f"old{i}": ("en", SentimentEnum.POSITIVE, 0.9) for i in range(3)}
+        )
+        await self.repository.save_cached_sentiments(
+            "v2", {f"new{i}": ("en", SentimentEnum.NEGATIVE, 0.8) for i in range(3)}
+        )
+        conn = sqlite3.connect(self.db_name)
+        conn.execute("UPDATE sentiment_cache SET created_at = '2023-01-01' WHERE text_hash = 'new0'")
+        conn.commit()
+
+        await self.repository.create_sentiment_cache("v2", 2)
+
+        self.assertEqual(
+            sorted(row[0] for row in conn.execute("SELECT text_hash FROM sentiment_cache")), ["new1", "new2"]
+        )
+        conn.close()
@@ -0,0 +1,87 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from main import app
+from utils.html_report import HTMLReport
+from utils.static_assets import StaticAssets
+
+
+class TestStaticAssets(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.content = b"console.log('library');" * 100
+        with open(os.path.join(self.folder, "library.min.js"), "wb") as f:
+            f.write(self.content)
+        self.static_assets = StaticAssets(
+            url_path="/api/v1/static", folder=self.folder, files=["library.min.js"]
+        )
+        self.hashed_name = self.static_assets.urls["library.min.js"].split("/")[-1]
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_hashed_url(self):
+        self.assertRegex(
+            self.static_assets.urls["library.min.js"],
+            r"^/api/v1/static/library\.min\.[0-9a-f]{16}\.js$",
+        )
+
+    def test_identity_response(self):
+        response = self.static_assets.get_response(self.hashed_name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.body, self.content)
+        self.assertIn("immutable", response.headers["cache-control"])
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertTrue(response.headers["content-type"].startswith("application/javascript"))
+
+    def test_gzip_response(self):
+        response = self.static_assets.get_response(
+            self.hashed_name, accept_encoding="deflate, gzip;q=0.8"
+        )
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.body), self.content)
+        self.assertEqual(response.headers["vary"], "Accept-Encoding")
+
+    def test_refused_encoding(self):
+        response = self.static_assets.get_response(self.hashed_name, accept_encoding="gzip;q=0")
+        self.assertEqual(response.body, self.content)
+
+    def test_not_modified(self):
+        response = self.static_assets.get_response(self.hashed_name, accept_encoding="gzip")
+        etag = response.headers["etag"]
+
+        response = self.static_assets.get_response(
+            self.hashed_name, if_none_match=etag, accept_encoding="gzip"
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.body, b"")
+
+        # The ETag of the gzip variant does not validate the uncompressed one
+        response = self.static_assets.get_response(self.hashed_name, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_file(self):
+        with self.assertRaises(HTTPException) as cm:
+            self.static_assets.get_response("library.min.js")
+        self.assertEqual(cm.exception.status_code, 404)
+
+    def test_report_references_assets(self):
+        static_assets = StaticAssets(url_path="/api/v1/static")
+        report = HTMLReport("surveyReport.html", asset_urls=static_assets.urls).generate_report([])
+
+        self.assertLess(len(report), 10000)
+        for url in static_assets.urls.values():
+            self.assertIn(url, report)
+
+    def test_urls_follow_router_prefix(self):
+        static_assets = app.container.static_assets()
+
+        for url in static_assets.urls.values():
+            self.assertTrue(url.startswith("/api/v1/static/"))
+        response = TestClient(app).get(static_assets.urls["bootstrap.min.css"])
+        self.assertEqual(response.status_code, 200)
@@ -1,14 +1,17 @@
 from math import ceil
+import random
+import re
 import unittest
 from datetime import datetime
 from unittest.mock import AsyncMock, Mock
 
 from models.comment import Comment, CommentGetBody
 from models.pagination import Pagination
-from models.project import Project
 from repository.sqlite_repository import SQLiteRepository
-from utils.formatter import comment_to_comment_get_body, paginate_results
+from utils.formatter import comments_to_comment_get_bodies, paginate_cursor, paginate_page
+from utils.inference_pool import InferencePool
 from utils.nlp import NlpPreprocess
+from utils.url_matcher import FeatureUrlMatcher
 
 
 class TestUtils(unittest.IsolatedAsyncioTestCase):
@@ -25,31 +28,68 @@ class TestUtils(unittest.IsolatedAsyncioTestCase):
             language="en",
         )
 
-    async def test_comment_to_comment_get_body(self):
-        self.sqliterepo.get_project_by_id = AsyncMock(
-            return_value=Project(id=1, name="test_project")
+    async def test_comments_to_comment_get_bodies(self):
+        comments = [
+            self.comment,
+            Comment(**{**self.comment.dict(), "id": 2, "project_id": 2}),
+            Comment(**{**self.comment.dict(), "id": 3}),
+        ]
+        self.sqliterepo.get_project_names = AsyncMock(
+            return_value={1: "test_project", 2: "other_project"}
         )
+        self.sqliterepo.get_comment_lemmas = AsyncMock(return_value={1: ["stored"], 3: None})
         nlp = Mock(spec=NlpPreprocess)
-        nlp.text_preprocess.return_value = None
-        
-        result = await comment_to_comment_get_body(
-            self.comment, sqliterepo=self.sqliterepo, nlp_preprocess=nlp
+        nlp.nlp_enabled = True
+        inference_pool = Mock(spec=InferencePool)
+        inference_pool.texts_preprocess.return_value = [["test", "comment"]]
+
+        result = await comments_to_comment_get_bodies(
+            comments, sqliterepo=self.sqliterepo, nlp_preprocess=nlp, inference_pool=inference_pool
         )
+
+        self.assertEqual([c.id for c in result], [1, 2, 3])
         self.assertEqual(
-            result,
+            [c.project_name for c in result], ["test_project", "other_project", "test_project"]
+        )
+        self.assertEqual(
+            result[0],
             CommentGetBody(
-                id=1,
+                **{k: v for k, v in self.comment.dict().items() if k != "project_id"},
                 project_name="test_project",
-                user_id=123,
-                timestamp=self.comment.timestamp,
-                feature_url="http://test.com",
-                rating=5,
-                comment="This is a test comment",
-                language="en",
+                comment_nlp=["stored"],
             ),
         )
-        self.sqliterepo.get_project_by_id.assert_called_once_with(1)
-    
+        self.assertEqual([c.comment_nlp for c in result], [["stored"], ["test", "comment"], None])
+        # The project names are read in a single query
+        self.sqliterepo.get_project_names.assert_awaited_once_with({1, 2})
+        self.sqliterepo.get_project_by_id.assert_not_called()
+        # Only the comment never preprocessed goes through the pipeline, out of the event loop,
+        # and its lemmas are stored
+        inference_pool.texts_preprocess.assert_awaited_once_with([(self.comment.comment, "en")])
+        nlp.texts_preprocess.assert_not_called()
+        self.sqliterepo.save_comment_lemmas.assert_awaited_once_with({2: ["test", "comment"]})
+
+    async def test_comments_to_comment_get_bodies_preprocess_disabled(self):
+        self.sqliterepo.get_project_names = AsyncMock(return_value={1: "test_project"})
+        nlp = Mock(spec=NlpPreprocess)
+        nlp.nlp_enabled = False
+        inference_pool = Mock(spec=InferencePool)
+
+        result = await comments_to_comment_get_bodies(
+            [self.comment], sqliterepo=self.sqliterepo, nlp_preprocess=nlp, inference_pool=inference_pool
+        )
+
+        self.assertIsNone(result[0].comment_nlp)
+        self.sqliterepo.get_comment_lemmas.assert_not_called()
+        inference_pool.texts_preprocess.assert_not_called()
+
+    async def test_comments_to_comment_get_bodies_empty(self):
+        result = await comments_to_comment_get_bodies(
+            [], sqliterepo=self.sqliterepo, nlp_preprocess=Mock(spec=NlpPreprocess)
+        )
+        self.assertEqual(result, [])
+        self.sqliterepo.get_project_names.assert_not_called()
+
     def test_pagination(self):
         items = ["1", "2", "3", "4", "5"]
 
@@ -69,8 +109,9 @@ class TestUtils(unittest.IsolatedAsyncioTestCase):
             next_page=f"{resource_url}?page={page + 1}&page_size={page_size}&key=value&number=7",
             previous_page=None,
         )
-        result = paginate_results(
-            items,
+        result = paginate_page(
+            items[:page_size],
+            len(items),
             page_size,
             page,
             resource_url,
@@ -90,8 +131,9 @@ class TestUtils(unittest.IsolatedAsyncioTestCase):
             next_page=f"{resource_url}?page={page + 1}&page_size={page_size}&key=value",
             previous_page=f"{resource_url}?page={page - 1}&page_size={page_size}&key=value",
         )
-        result = paginate_results(
-            items,
+        result = paginate_page(
+            items[page_size : page_size * 2],
+            len(items),
             page_size,
             page,
             resource_url,
@@ -111,8 +153,9 @@ class TestUtils(unittest.IsolatedAsyncioTestCase):
             next_page=None,
             previous_page=f"{resource_url}?page={page - 1}&page_size={page_size}",
         )
-        result = paginate_results(
-            items,
+        result = paginate_page(
+            items[page_size * 2 :],
+            len(items),
             page_size,
             page,
             resource_url,
@@ -120,10 +163,51 @@ class TestUtils(unittest.IsolatedAsyncioTestCase):
         )
         self.assertEqual(result, expected_pagination)
 
+    def test_paginate_page(self):
+        resource_url = "/test"
+        page_values = [{"id": 3}, {"id": 4}]
+        expected_pagination = Pagination(
+            results=page_values,
+            total_pages=3,
+            page=2,
+            page_size=2,
+            total=5,
+            next_page=f"{resource_url}?page=3&page_size=2&key=value",
+            previous_page=f"{resource_url}?page=1&page_size=2&key=value",
+        )
+        result = paginate_page(page_values, 5, 2, 2, resource_url, {"key": "value"})
+        self.assertEqual(result, expected_pagination)
+
+        # No result at all is still one empty page
+        result = paginate_page([], 0, 20, 1, resource_url)
+        self.assertEqual(result.total_pages, 1)
+        self.assertEqual(result.results, [])
+
+    def test_paginate_cursor(self):
+        resource_url = "/test"
+        result = paginate_cursor([{"id": 1}, {"id": 2}], 2, 3, "abc", resource_url, {"key": "value"})
+        self.assertEqual(
+            result,
+            Pagination(
+                results=[{"id": 1}, {"id": 2}],
+                total_pages=None,
+                page=3,
+                page_size=2,
+                total=None,
+                next_page=f"{resource_url}?cursor=abc&page_size=2&key=value",
+                previous_page=None,
+            ),
+        )
+
+        # Last page
+        result = paginate_cursor([{"id": 3}], 2, 4, None, resource_url)
+        self.assertIsNone(result.next_page)
+
     def test_pagination_invalid_page_nb(self):
         with self.assertRaises(ValueError) as cm:
-            paginate_results(
+            paginate_page(
                 [],
+                0,
                 2,
                 0,
                 "/test",
@@ -132,10 +216,58 @@ class TestUtils(unittest.IsolatedAsyncioTestCase):
     
     def test_pagination_invalid_page_size(self):
          with self.assertRaises(ValueError) as cm:
-            paginate_results(
+            paginate_page(
                 [],
                 0,
+                0,
                 1,
                 "/test",
                 None
-            )
\ No newline at end of file
+            )
+
+
+class TestFeatureUrlMatcher(unittest.TestCase):
+    @staticmethod
+    def first_match(feature_urls, url):
+        """
+        Reference implementation the matcher replaces
+        """
+        for index, feature_url in enumerate(feature_urls):
+            if re.search(fr"\b{re.escape(feature_url)}\b", url):
+                return index
+        return None
+
+    def test_first_rule_wins_over_leftmost_match(self):
+        feature_urls = ["/test2", "example.com", "https://www.example.com/test2"]
+        matcher = FeatureUrlMatcher(feature_urls)
+        self.assertEqual(matcher.match("https://www.example.com/test2"), 0)
+
+    def test_word_boundaries(self):
+        matcher = FeatureUrlMatcher(["https://www.example.com/test", "/test"])
+        self.assertIsNone(matcher.match("https://www.example.com/test2"))
+        self.assertEqual(matcher.match("https://www.example.com/test/page"), 0)
+        # \b never matches between the start of the string and a non-word character
+        self.assertIsNone(matcher.match("/test"))
+        self.assertEqual(matcher.match("https://other.com/test"), 1)
+
+    def test_no_feature_urls(self):
+        matcher = FeatureUrlMatcher([])
+        self.assertIsNone(matcher.match("https://www.example.com/test"))
+
+    def test_same_result_as_regex_search(self):
+        rand = random.Random(42)
+        alphabet = "ab/._-:1é"
+
+        def random_text(max_length):
+            return "".join(rand.choice(alphabet) for _ in range(rand.randint(0, max_length)))
+
+        for _ in range(300):
+            feature_urls = [random_text(4) for _ in range(rand.randint(0, 8))]
+            matcher = FeatureUrlMatcher(feature_urls)
+            for _ in range(20):
+                url = random_text(12)
+                self.assertEqual(
+                    matcher.match(url),
+                    self.first_match(feature_urls, url),
+                    f"{feature_urls} / {url}",
+                )
@@ -1,8 +1,12 @@
+import asyncio
+import os
+import shutil
+import tempfile
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 from models.rule import Rule
-from repository.yaml_rule_repository import YamlRulesRepository
+from repository.yaml_rule_repository import RulesSnapshot, YamlRulesRepository
 
 
 class TestGetRulesFromProjectName(unittest.TestCase):
@@ -113,8 +117,8 @@ class TestGetRuleFromFeature(unittest.TestCase):
     def test_regex_matching(self):
         feature_url = "https://www.example.com/test2"
         with patch(
-            "repository.yaml_rule_repository.YamlRulesRepository._getRulesConfig",
-            return_value=self.data,
+            "repository.yaml_rule_repository.YamlRulesRepository._getSnapshot",
+            return_value=RulesSnapshot(self.data),
         ):
             rule = YamlRulesRepository.getRuleFromFeature(feature_url)
 
@@ -128,8 +132,8 @@ class TestGetRuleFromFeature(unittest.TestCase):
     def test_regex_non_matching(self):
         feature_url = "https://www.example.com/nonmatching"
         with patch(
-            "repository.yaml_rule_repository.YamlRulesRepository._getRulesConfig",
-            return_value=self.data,
+            "repository.yaml_rule_repository.YamlRulesRepository._getSnapshot",
+            return_value=RulesSnapshot(self.data),
         ):
             rule = YamlRulesRepository.getRuleFromFeature(feature_url)
 
@@ -196,19 +200,29 @@ class TestGetProjectNameFromFeature(unittest.TestCase):
 
 
 class TestGetFeatureUrlsFromProjectName(unittest.TestCase):
+    @staticmethod
+    def rule(feature_url):
+        return {
+            "feature_url": feature_url,
+            "ratio": 0.5,
+            "delay_before_reanswer": 10,
+            "delay_to_answer": 2,
+            "is_active": True,
+        }
+
     def setUp(self):
         self.data = {
             "projects": {
                 "Project 1": {
                     "rules": [
-                        {"feature_url": "http://example.com/feature1"},
-                        {"feature_url": "http://example.com/feature2"},
+                        self.rule("http://example.com/feature1"),
+                        self.rule("http://example.com/feature2"),
                     ]
                 },
                 "Project 2": {
                     "rules": [
-                        {"feature_url": "http://example.com/feature3"},
-                        {"feature_url": "http://example.com/feature4"},
+                        self.rule("http://example.com/feature3"),
+                        self.rule("http://example.com/feature4"),
                     ]
                 },
             }
@@ -221,8 +235,8 @@ class TestGetFeatureUrlsFromProjectName(unittest.TestCase):
         name = "Project 1"
 
         with patch(
-            "repository.yaml_rule_repository.YamlRulesRepository._getRulesConfig",
-            return_value=self.data,
+            "repository.yaml_rule_repository.YamlRulesRepository._getSnapshot",
+            return_value=RulesSnapshot(self.data),
         ):
             # Act
             feature_urls = self.yaml_repo.getFeatureUrlsFromProjectName(name)
@@ -238,8 +252,8 @@ class TestGetFeatureUrlsFromProjectName(unittest.TestCase):
         name = "Project 3"
 
         with patch(
-            "repository.yaml_rule_repository.YamlRulesRepository._getRulesConfig",
-            return_value=self.data,
+            "repository.yaml_rule_repository.YamlRulesRepository._getSnapshot",
+            return_value=RulesSnapshot(self.data),
         ):
             # Act
             feature_urls = self.yaml_repo.getFeatureUrlsFromProjectName(name)
@@ -257,17 +271,15 @@ class TestGetFeatureUrlsFromProjectName(unittest.TestCase):
                 "Project 1": {"rules": []},
                 "Project 2": {
                     "rules": [
-                        {"feature_url": "http://example.com/feature3"},
-                        {"feature_url": "http://example.com/feature4"},
+                        self.rule("http://example.com/feature3"),
+                        self.rule("http://example.com/feature4"),
                     ]
                 },
             }
         }
-        self.yaml_repo._getRulesConfig = MagicMock(return_value=data)
-
         with patch(
-            "repository.yaml_rule_repository.YamlRulesRepository._getRulesConfig",
-            return_value=data,
+            "repository.yaml_rule_repository.YamlRulesRepository._getSnapshot",
+            return_value=RulesSnapshot(data),
         ):
             # Act
             feature_urls = self.yaml_repo.getFeatureUrlsFromProjectName(name)
@@ -276,5 +288,133 @@ class TestGetFeatureUrlsFromProjectName(unittest.TestCase):
         self.assertEqual(feature_urls, [])
 
 
+class TestRulesSnapshot(unittest.IsolatedAsyncioTestCase):
+    VALID_RULES = (
+        "projects:\n"
+        "  project3:\n"
+        "    rules:\n"
+        "    - feature_url: https://www.example.com/test3\n"
+        "      ratio: 0.5\n"
+        "      delay_before_reanswer: 30\n"
+        "      delay_to_answer: 5\n"
+        "      is_active: true\n"
+    )
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.rules_file = os.path.join(self.tmp_dir, "rules.yaml")
+        shutil.copy("tests/mocks/test_rules.yaml", self.rules_file)
+        self.previous_file = YamlRulesRepository._RULES_CONFIG_FILE
+        YamlRulesRepository._RULES_CONFIG_FILE = self.rules_file
+
+    def tearDown(self):
+        YamlRulesRepository._RULES_CONFIG_FILE = self.previous_file
+        shutil.rmtree(self.tmp_dir)
+
+    def test_file_parsed_once(self):
+        with patch.object(
+            YamlRulesRepository,
+            "_getRulesConfig",
+            wraps=YamlRulesRepository._getRulesConfig,
+        ) as mock_config:
+            YamlRulesRepository.getProjectNames()
+            YamlRulesRepository.getRuleFromFeature("https://www.example.com/test2")
+            YamlRulesRepository.getProjectNameFromFeature("https://www.example.com/test2")
+            YamlRulesRepository.getRulesFromProjectName("project1")
+            YamlRulesRepository.getFeatureUrlsFromProjectName("project1")
+
+        mock_config.assert_called_once_with(self.rules_file)
+
+    def test_file_change_creates_new_snapshot(self):
+        snapshot = YamlRulesRepository._getSnapshot()
+        self.assertEqual(YamlRulesRepository.getProjectNames(), ["project1", "project2"])
+
+        with open(self.rules_file, "w") as f:
+            f.write(self.VALID_RULES)
+
+        # Requests keep using the current snapshot until the file is reloaded
+        self.assertIs(YamlRulesRepository._getSnapshot(), snapshot)
+        self.assertTrue(YamlRulesRepository.reloadRules())
+
+        new_snapshot = YamlRulesRepository._getSnapshot()
+        self.assertGreater(new_snapshot.version, snapshot.version)
+        self.assertEqual(YamlRulesRepository.getProjectNames(), ["project3"])
+        self.assertEqual(
+            YamlRulesRepository.getProjectNameFromFeature("https://www.example.com/test3"),
+            "project3",
+        )
+
+    def test_invalid_file_keeps_last_snapshot(self):
+        snapshot = YamlRulesRepository._getSnapshot()
+
+        with open(self.rules_file, "w") as f:
+            f.write("projects:\n  project3:\n    rules: 42\n")
+
+        self.assertFalse(YamlRulesRepository.reloadRules())
+        self.assertIs(YamlRulesRepository._getSnapshot(), snapshot)
+        self.assertEqual(YamlRulesRepository.getProjectNames(), ["project1", "project2"])
+
+    def test_feature_cache(self):
+        YamlRulesRepository.reloadRules()
+        for _ in range(3):
+            rule = YamlRulesRepository.getRuleFromFeature("https://www.example.com/test2")
+            self.assertEqual(rule.feature_url, "https://www.example.com/test2")
+            self.assertIsNone(YamlRulesRepository.getRuleFromFeature("https://www.example.com/unknown"))
+
+        info = YamlRulesRepository.getFeatureCacheInfo()
+        self.assertEqual(info["misses"], 2)
+        self.assertEqual(info["hits"], 4)
+        self.assertEqual(info["size"], 2)
+
+    def test_match_feature_single_lookup(self):
+        YamlRulesRepository.reloadRules()
+
+        project_name, rule = YamlRulesRepository.matchFeature("https://www.example.com/test2")
+
+        self.assertEqual(project_name, "project2")
+        self.assertEqual(rule.feature_url, "https://www.example.com/test2")
+        self.assertEqual(YamlRulesRepository.matchFeature("https://www.example.com/unknown"), (None, None))
+        info = YamlRulesRepository.getFeatureCacheInfo()
+        self.assertEqual((info["hits"], info["misses"]), (0, 2))
+
+    def test_feature_cache_size(self):
+        repository = YamlRulesRepository({"rules_cache_size": 16})
+
+        self.assertEqual(repository.feature_cache_size, 16)
+        self.assertEqual(YamlRulesRepository._FEATURE_CACHE_SIZE, 1024)
+        self.assertEqual(YamlRulesRepository.getFeatureCacheInfo()["max_size"], 16)
+        # Kept by the next reloads
+        YamlRulesRepository.reloadRules()
+        self.assertEqual(YamlRulesRepository.getFeatureCacheInfo()["max_size"], 16)
+        YamlRulesRepository.reloadRules(cache_size=1024)
+
+    def test_feature_cache_invalidated_on_reload(self):
+        self.assertIsNone(YamlRulesRepository.getProjectNameFromFeature("https://www.example.com/test3"))
+
+        with open(self.rules_file, "w") as f:
+            f.write(self.VALID_RULES)
+        YamlRulesRepository.reloadRules()
+
+        self.assertEqual(
+            YamlRulesRepository.getProjectNameFromFeature("https://www.example.com/test3"),
+            "project3",
+        )
+        self.assertEqual(YamlRulesRepository.getFeatureCacheInfo()["hits"], 0)
+
+    async def test_watcher_reloads_modified_file(self):
+        snapshot = YamlRulesRepository._getSnapshot()
+        watcher = asyncio.create_task(YamlRulesRepository.watchRulesFile(0.01))
+        try:
+            with open(self.rules_file, "w") as f:
+                f.write(self.VALID_RULES)
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if YamlRulesRepository._getSnapshot() is not snapshot:
+                    break
+        finally:
+            watcher.cancel()
+
+        self.assertEqual(YamlRulesRepository.getProjectNames(), ["project3"])
+
 if __name__ == "__main__":
     unittest.main()
@@ -2,7 +2,14 @@ from dependency_injector import containers, providers
 
 from repository.yaml_rule_repository import YamlRulesRepository
 from repository.sqlite_repository import SQLiteRepository
+from repository.display_queue import DisplayQueue
+from repository.sentiment_queue import SentimentQueue
+from utils.inference_pool import InferencePool
 from utils.nlp import SentimentAnalysis, NlpPreprocess
+from utils.model_unloader import ModelUnloader
+from utils.sentiment_cache import SentimentCache
+from utils.sentiment_scheduler import SentimentScheduler
+from utils.static_assets import StaticAssets
 
 
 class Container(containers.DeclarativeContainer):
@@ -14,7 +21,9 @@ class Container(containers.DeclarativeContainer):
             "survey_logic.rules",
             "survey_logic.report",
             "survey_logic.projects",
+            "survey_logic.metrics",
             "routes.projects",
+            "routes.static",
             "utils.formatter",
             "routes.middlewares.security",
             "survey_logic.security",
@@ -23,8 +32,36 @@ class Container(containers.DeclarativeContainer):
 
     config = providers.Configuration()
 
-    rules_config = providers.Singleton(YamlRulesRepository)
+    rules_config = providers.Singleton(YamlRulesRepository, config=config)
     sqlite_repo = providers.Singleton(SQLiteRepository, config=config)
+    display_queue = providers.Singleton(DisplayQueue, sqlite_repo=sqlite_repo, config=config)
+
+    # Served by routes.static, its URL path is set by main.init_fastapi where the router is mounted
+    static_assets = providers.Singleton(StaticAssets)
 
     sentiment_analysis = providers.Singleton(SentimentAnalysis, config=config)
     nlp_preprocess = providers.Singleton(NlpPreprocess, config=config)
+    model_unloader = providers.Singleton(
+        ModelUnloader, sentiment_analysis=sentiment_analysis, nlp_preprocess=nlp_preprocess, config=config
+    )
+    inference_pool = providers.Singleton(
+        InferencePool, sentiment_analysis=sentiment_analysis, nlp_preprocess=nlp_preprocess, config=config
+    )
+    sentiment_cache = providers.Singleton(
+        SentimentCache, sqlite_repo=sqlite_repo, sentiment_analysis=sentiment_analysis, config=config
+    )
+    sentiment_scheduler = providers.Singleton(
+        SentimentScheduler,
+        sentiment_analysis=sentiment_analysis,
+        config=config,
+        sentiment_cache=sentiment_cache,
+        inference_pool=inference_pool,
+    )
+    sentiment_queue = providers.Singleton(
+        SentimentQueue,
+        sqlite_repo=sqlite_repo,
+        sentiment_scheduler=sentiment_scheduler,
+        nlp_preprocess=nlp_preprocess,
+        config=config,
+        inference_pool=inference_pool,
+    )
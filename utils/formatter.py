@@ -1,12 +1,12 @@
 from math import ceil
 from typing import Dict, List, Optional, TypeVar, Union
 from models.comment import Comment, CommentGetBody
-from models.project import Project
 from dependency_injector.wiring import Provide, inject
 from repository.sqlite_repository import SQLiteRepository
 import logging
 
 from utils.container import Container
+from utils.inference_pool import InferencePool
 from utils.nlp import NlpPreprocess
 from models.pagination import Pagination
 
@@ -20,26 +20,75 @@ def str_to_bool(string: str):
         logging.error(f"String value {string} cannot be converted to bool")
         raise Exception(f"String value {string} cannot be converted to bool")
 
+def preprocess_comments(
+    comments: List[Comment], nlp_preprocess: NlpPreprocess, n_process: int = 1
+) -> Dict[int, Optional[List[str]]]:
+    """
+    Runs the NLP preprocessing of several comments by batches,
+    returning the result by comment ID, None for the languages that are not supported
+    """
+    _log_unsupported_languages(comments)
+    processed_texts = nlp_preprocess.texts_preprocess(
+        [(comment.comment, comment.language) for comment in comments], n_process
+    )
+    return {comment.id: words for comment, words in zip(comments, processed_texts)}
+
+
+def _log_unsupported_languages(comments: List[Comment]):
+    for comment in comments:
+        if comment.language not in NlpPreprocess.LANGUAGES:
+            logging.error(f"Could not preprocess text of language {comment.language}")
+            logging.debug(f"Unable to do NLP preprocess on this text: {comment.comment}")
+
+
 @inject
-async def comment_to_comment_get_body(
-    comment: Comment,
+async def comments_to_comment_get_bodies(
+    comments: List[Comment],
     sqliterepo: SQLiteRepository = Provide[Container.sqlite_repo],
     nlp_preprocess: NlpPreprocess = Provide[Container.nlp_preprocess],
-) -> CommentGetBody:
+    inference_pool: InferencePool = Provide[Container.inference_pool],
+) -> List[CommentGetBody]:
     """
-    Convert a Comment to a CommentGetBody with project name
+    Convert a page of Comments to CommentGetBody objects,
+    reading the names of all their projects in a single query.
+
+    The preprocessed texts are read from the database, only the comments
+    that were never preprocessed go through the NLP pipeline, in the inference pool,
+    and their result is stored.
     """
-    project: Project = await sqliterepo.get_project_by_id(comment.project_id)
-    try:
-        processed_text = nlp_preprocess.text_preprocess(comment.comment, comment.language)
-    except NotImplementedError:
-        logging.error(f"Could not preprocess text of language {comment.language}")
-        logging.debug(f"Unable to do NLP preprocess on this text: {comment.comment}")
-        processed_text = None
-    
-    new_comment = CommentGetBody(
+    if not comments:
+        return []
+    project_names = await sqliterepo.get_project_names(
+        {comment.project_id for comment in comments}
+    )
+
+    lemmas = {}
+    if nlp_preprocess.nlp_enabled:
+        lemmas = await sqliterepo.get_comment_lemmas([comment.id for comment in comments])
+        # Comments created before the lemmas were stored, or while the preprocessing was disabled
+        missing = [comment for comment in comments if comment.id not in lemmas]
+        if missing:
+            _log_unsupported_languages(missing)
+            processed_texts = await inference_pool.texts_preprocess(
+                [(comment.comment, comment.language) for comment in missing]
+            )
+            missing_lemmas = {comment.id: words for comment, words in zip(missing, processed_texts)}
+            await sqliterepo.save_comment_lemmas(missing_lemmas)
+            lemmas.update(missing_lemmas)
+
+    return [
+        _to_comment_get_body(comment, project_names[comment.project_id], lemmas.get(comment.id))
+        for comment in comments
+    ]
+
+
+def _to_comment_get_body(
+    comment: Comment, project_name: str, processed_text: Optional[List[str]]
+) -> CommentGetBody:
+    # The fields of the comment were validated when it was loaded, they are not validated again
+    new_comment = CommentGetBody.construct(
         id=comment.id,
-        project_name=project.name,
+        project_name=project_name,
         user_id=comment.user_id,
         timestamp=comment.timestamp,
         feature_url=comment.feature_url,
@@ -55,18 +104,20 @@ async def comment_to_comment_get_body(
 
 T = TypeVar("T")
 
-def paginate_results(
-    all_values: List[T],
+def paginate_page(
+    page_values: List[T],
+    total: int,
     page_size: int,
     page: int,
     resource_url: str,
     request_filters: Optional[Dict[str, Union[str, int]]] = None,
 ) -> Pagination[T]:
     """
-    Create a paginated result from the full list of items
+    Create a paginated result from a page already read from the database
 
     Args:
-        - all_values: the full list of items to slice into pages
+        - page_values: the items of the page
+        - total: the total number of items across all pages
         - page_size: the number of items to display in one page
         - page: the number of the page to return
         - resource_url: the URL of the request without the query string
@@ -79,22 +130,51 @@ def paginate_results(
     if page_size < 1 or page < 1:
         raise ValueError("Invalid page or page size")
 
-    total = len(all_values)
     if total > 0:
         total_pages = ceil(total / page_size)
-        start_index = (page - 1) * page_size
-        end_index = start_index + page_size
-        page_of_values = all_values[start_index:end_index]
     else:
         total_pages = 1
-        page_of_values = []
+        page_values = []
 
     return Pagination.paginate(
-        results=page_of_values,
+        results=page_values,
         page=page,
         total=total,
         total_pages=total_pages,
         resource_url=resource_url,
         request_filters=request_filters,
         page_size=page_size,
-    )
\ No newline at end of file
+    )
+
+def paginate_cursor(
+    page_values: List[T],
+    page_size: int,
+    page: int,
+    next_cursor: Optional[str],
+    resource_url: str,
+    request_filters: Optional[Dict[str, Union[str, int]]] = None,
+) -> Pagination[T]:
+    """
+    Create a paginated result for a page read after a cursor, without totals
+
+    Args:
+        - page_values: the items of the page
+        - page_size: the number of items to display in one page
+        - page: the number of the page
+        - next_cursor: the cursor of the next page, None if it is the last one
+        - resource_url: the URL of the request without the query string
+        - request_filters: a dictionary representing the additional params in the request URL, apart from page, page_size and cursor
+    
+    Returns:
+        A Pagination object reprensenting the page to return
+    """
+    return Pagination.paginate(
+        results=page_values,
+        page=page,
+        total=None,
+        total_pages=None,
+        resource_url=resource_url,
+        request_filters=request_filters,
+        page_size=page_size,
+        next_cursor=next_cursor,
+    )
@@ -1,6 +1,6 @@
 import logging
 import os
-from typing import List
+from typing import Dict, List
 import jinja2
 import plotly.graph_objects as go
 
@@ -9,7 +9,9 @@ class HTMLReport:
     Generate an HTML report
     """
 
-    def __init__(self, reportFile: str) -> None:
+    def __init__(self, reportFile: str, asset_urls: Dict[str, str] = None) -> None:
+        # URL of the CSS and JavaScript libraries, by file name
+        self.asset_urls = asset_urls if asset_urls is not None else {}
         # Load HTML template
         self.template_path = os.path.join(
             os.path.dirname(os.path.realpath(__file__)), "../templates/"
@@ -23,7 +25,7 @@ class HTMLReport:
     def generate_report(self, projects) -> str:
         logging.info("Generate HTML report")
 
-        data = {"projects": projects}
+        data = {"projects": projects, "assets": self.asset_urls}
 
         # Render the template and return Report
         html_report = self.template.render(data)
@@ -45,6 +47,7 @@ class HTMLReport:
             "timestamp_end": timestamp_end,
             "graphs": graphs,
             "timerange":timerange,
+            "assets": self.asset_urls,
         }
 
         # Render the template and return Report
@@ -0,0 +1,212 @@
+import asyncio
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from models.comment import SentimentEnum
+from utils.nlp import NlpPreprocess, SentimentAnalysis
+
+# Models of the worker processes, set in the parent before forking them
+_sentiment_analysis: Optional[SentimentAnalysis] = None
+_nlp_preprocess: Optional[NlpPreprocess] = None
+
+
+def _analyze_batch(texts: List[str], lang: str):
+    return _sentiment_analysis.analyze_batch(texts, lang)
+
+
+def _texts_preprocess(texts: List[Tuple[str, str]]):
+    return _nlp_preprocess.texts_preprocess(texts)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class InferencePool:
+    """
+    Runs the sentiment analysis and the NLP preprocessing out of the event loop.
+
+    With inference_workers set, they run in worker processes, so that they neither compete
+    with the requests for the GIL nor with each other. The workers are forked from the
+    process which loaded the models, and share their memory pages as long as none of them
+    writes to them: the models of every supported language are loaded before forking, and
+    never unloaded. The texts and results go through the queues of a ProcessPoolExecutor.
+    A worker which crashes breaks the pool, which is forked again. The TensorFlow runtime
+    cannot be forked once loaded, the workers are disabled with the tensorflow backend.
+
+    Without workers, they run in a single thread of the API process. The models of a language
+    not loaded yet are loaded beforehand in another thread, so that the inference thread
+    keeps running the texts of the other languages meanwhile.
+    """
+
+    # Longest time a worker may take to answer the health check, in seconds
+    HEALTH_TIMEOUT = 5
+
+    def __init__(self, sentiment_analysis: SentimentAnalysis, nlp_preprocess: NlpPreprocess, config):
+        self.sentiment_analysis = sentiment_analysis
+        self.nlp_preprocess = nlp_preprocess
+        self.workers = config.get("inference_workers") or 0
+        self.enabled = self.workers > 0
+        # Longest time a batch may take, in seconds, no limit if None
+        self.timeout = config.get("inference_timeout") or None
+
+        self._executor: Optional[Executor] = None
+        # Start time of the tasks submitted and not finished yet
+        self._running: Dict[Future, float] = {}
+        self.tasks = 0
+        self.restarts = 0
+        self.timeouts = 0
+
+    def start(self):
+        """
+        Forks the worker processes, to be called from the startup of the server,
+        once the models to share are loaded
+        """
+        if self._executor is not None:
+            return
+        if (
+            self.enabled
+            and self.sentiment_analysis.analysis_enabled
+            and self.sentiment_analysis.backend == "tensorflow"
+        ):
+            logging.warning(
+                "The TensorFlow runtime cannot be forked once loaded, the inference runs in the API process. "
+                "Use SENTIMENT_ANALYSIS_BACKEND=onnx for inference workers"
+            )
+            self.workers = 0
+            self.enabled = False
+        if not self.enabled:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+            return
+        self._preload()
+        global _sentiment_analysis, _nlp_preprocess
+        _sentiment_analysis = self.sentiment_analysis
+        _nlp_preprocess = self.nlp_preprocess
+        self._fork()
+        logging.info(f"Inference pool started with {self.workers} worker processes")
+
+    def _preload(self):
+        """
+        Loads the models of all the languages in the parent process, a model loaded by a worker
+        would be a copy of its own, out of reach of the unloading of the idle models
+        """
+        models = []
+        if self.sentiment_analysis.analysis_enabled:
+            models.append((self.sentiment_analysis.models, self.sentiment_analysis.LANGUAGES))
+        if self.nlp_preprocess.nlp_enabled:
+            models.append((self.nlp_preprocess.pipelines, self.nlp_preprocess.LANGUAGES))
+        for language_models, languages in models:
+            if language_models.ttl:
+                logging.warning("NLP_MODELS_TTL is ignored with inference workers, the models stay loaded")
+                language_models.ttl = 0
+            language_models.preload(languages)
+
+    def _fork(self):
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("fork")
+        )
+        # Forking processes start all the workers with the first task
+        self._executor.submit(_ping)
+
+    async def stop(self):
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: executor.shutdown(wait=True, cancel_futures=True)
+        )
+
+    async def _run(self, function, *args):
+        if self._executor is None:
+            # Not started, such as in the command line tasks
+            self.start()
+        executor = self._executor
+        try:
+            result = await self._call(executor, self.timeout, function, *args)
+        except BrokenProcessPool:
+            # Other tasks of the broken pool may have restarted it already
+            if self._executor is executor:
+                self.restarts += 1
+                logging.error("An inference worker crashed, restarting the worker processes")
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._fork()
+            result = await self._call(self._executor, self.timeout, function, *args)
+        self.tasks += 1
+        return result
+
+    async def _call(self, executor: Executor, timeout: Optional[float], function, *args):
+        future = executor.submit(function, *args)
+        self._running[future] = time.monotonic()
+        future.add_done_callback(lambda done: self._running.pop(done, None))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logging.error(f"An inference task did not finish in {timeout}s")
+            raise
+
+    def stuck(self) -> int:
+        """
+        Returns the number of tasks running for longer than the timeout
+        """
+        if self.timeout is None:
+            return 0
+        now = time.monotonic()
+        return sum(1 for started in list(self._running.values()) if now - started > self.timeout)
+
+    async def analyze_batch(
+        self, texts: List[str], lang: str
+    ) -> List[Tuple[Optional[SentimentEnum], Optional[float]]]:
+        """
+        Analyzes the sentiment of several texts, see SentimentAnalysis.analyze_batch
+        """
+        if self.enabled:
+            return await self._run(_analyze_batch, texts, lang)
+        await self.sentiment_analysis.load_models(lang)
+        return await self._run(self.sentiment_analysis.analyze_batch, texts, lang)
+
+    async def texts_preprocess(self, texts: List[Tuple[str, str]]) -> List[Optional[List[str]]]:
+        """
+        Preprocesses several texts, see NlpPreprocess.texts_preprocess
+        """
+        if self.enabled:
+            return await self._run(_texts_preprocess, texts)
+        await self.nlp_preprocess.load_pipelines({lang for _, lang in texts})
+        return await self._run(self.nlp_preprocess.texts_preprocess, texts)
+
+    async def health(self) -> dict:
+        """
+        Checks that the workers answer, and that no task outlived the timeout
+
+        Returns:
+            dict: the status "ok" or "unavailable", the time a worker took to answer in milliseconds,
+                and the number of tasks running for longer than the timeout
+        """
+        if self._executor is None:
+            self.start()
+        stuck = self.stuck()
+        start = time.perf_counter()
+        try:
+            # Not counted as a task
+            await self._call(self._executor, self.HEALTH_TIMEOUT, _ping)
+        except Exception:
+            logging.exception("The inference workers do not answer")
+            return {"status": "unavailable", "latency_ms": None, "stuck": stuck}
+        latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        if stuck:
+            logging.error(f"{stuck} inference tasks are running for longer than {self.timeout}s")
+        return {"status": "unavailable" if stuck else "ok", "latency_ms": latency_ms, "stuck": stuck}
+
+    async def metrics(self) -> dict:
+        return {
+            "workers": self.workers,
+            "tasks": self.tasks,
+            "restarts": self.restarts,
+            "timeouts": self.timeouts,
+            **await self.health(),
+        }
@@ -0,0 +1,78 @@
+import asyncio
+import gc
+import logging
+from typing import List, Optional
+
+from utils.nlp import NlpPreprocess, SentimentAnalysis
+
+
+class ModelUnloader:
+    """
+    Unloads the spaCy and sentiment analysis models of the languages
+    not received for longer than nlp_models_ttl seconds.
+    They are loaded again by the next comment of their language.
+    """
+
+    # Longest time between two checks of the idle models, in seconds
+    MAX_CHECK_INTERVAL = 60
+
+    def __init__(self, sentiment_analysis: SentimentAnalysis, nlp_preprocess: NlpPreprocess, config):
+        self.sentiment_analysis = sentiment_analysis
+        self.nlp_preprocess = nlp_preprocess
+        self.models = [sentiment_analysis.models, nlp_preprocess.pipelines]
+        self.ttl = config.get("nlp_models_ttl") or 0
+        self.interval = min(self.ttl / 4, self.MAX_CHECK_INTERVAL)
+        self._worker: Optional[asyncio.Task] = None
+
+        self.unloaded = 0
+
+    def start(self):
+        """
+        Starts the background task, to be called from the event loop serving the requests
+        """
+        if not self.ttl:
+            return
+        self._worker = asyncio.create_task(self._run())
+        logging.info(f"Models unused for {self.ttl}s will be unloaded")
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # Waits for the models being loaded, out of the event loop
+                await asyncio.get_running_loop().run_in_executor(None, self.unload_idle)
+            except Exception:
+                logging.exception("Could not unload the idle models")
+
+    def unload_idle(self) -> List[str]:
+        """
+        Unloads the idle models
+
+        Returns:
+            List[str]: the languages of the unloaded models
+        """
+        unloaded = [lang for models in self.models for lang in models.unload_idle()]
+        if unloaded:
+            # The models hold reference cycles, their memory is only freed by the collector
+            gc.collect()
+            self.unloaded += len(unloaded)
+            logging.info(f"Unloaded the idle models of {', '.join(unloaded)}")
+        return unloaded
+
+    def metrics(self) -> dict:
+        return {
+            "ttl": self.ttl,
+            "sentiment_analysis": self.sentiment_analysis.models.loaded(),
+            "nlp_preprocess": self.nlp_preprocess.pipelines.loaded(),
+            "unloaded": self.unloaded,
+        }
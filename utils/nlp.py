@@ -1,11 +1,18 @@
-from typing import Optional, Tuple, List
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple, List
 from langdetect import DetectorFactory, detect, LangDetectException
+import numpy as np
 import spacy
 import os
 from nltk.corpus import stopwords
-from transformers import pipeline, TFRobertaForSequenceClassification, TFCamembertForSequenceClassification, AutoTokenizer
+from transformers import TFRobertaForSequenceClassification, TFCamembertForSequenceClassification, AutoTokenizer
 
 from models.comment import SentimentEnum
+from utils.onnx_sentiment import OnnxSentimentModel, onnx_model_path
 
 DetectorFactory.seed = 0
 
@@ -15,16 +22,136 @@ def detect_language(text: str) -> str:
     except LangDetectException:
         return 'unknown'
 
+class LanguageModels:
+    """
+    Models of each supported language, loaded the first time they are used
+    and unloaded once they have not been used for ttl seconds, so that the memory
+    only holds the models of the languages actually received.
+
+    The models are used from the threads running the analyses, a lock by language makes
+    sure a model is loaded a single time, without blocking the uses of the other languages.
+    The coroutines get them with load instead, which never waits for a lock or a load
+    on the event loop.
+    """
+
+    def __init__(self, load: Callable[[str], Any], languages: Iterable[str], ttl: float = 0):
+        """
+        Args:
+            load (Callable[[str], Any]): loads the models of a language.
+            languages (Iterable[str]): the two-character ISO639-1 codes of the supported languages.
+            ttl (float): the number of seconds after its last use a model is unloaded, never if 0.
+        """
+        self._load = load
+        self.ttl = ttl
+        self._locks = {lang: threading.Lock() for lang in languages}
+        self._models: Dict[str, Any] = {}
+        self._last_used: Dict[str, float] = {}
+        # Loads started by coroutines, by language
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    def get(self, lang: str) -> Any:
+        """
+        Returns the models of a language, loading them if needed
+        """
+        with self._locks[lang]:
+            models = self._models.get(lang)
+            if models is None:
+                start = time.perf_counter()
+                models = self._load(lang)
+                self._models[lang] = models
+                logging.info(f"Loaded the {lang} models in {time.perf_counter() - start:.1f}s")
+            self._last_used[lang] = time.monotonic()
+            return models
+
+    async def load(self, lang: str) -> Any:
+        """
+        Returns the models of a language from a coroutine, loading them in a thread
+        of the default executor if needed. The coroutines asking for a language
+        while it is loaded wait for the same load.
+        """
+        models = self._models.get(lang)
+        if models is not None:
+            self._last_used[lang] = time.monotonic()
+            return models
+        future = self._loading.get(lang)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(None, self.get, lang)
+            self._loading[lang] = future
+            future.add_done_callback(lambda _: self._loading.pop(lang, None))
+        # A cancelled coroutine does not cancel the load the others wait for
+        return await asyncio.shield(future)
+
+    def preload(self, languages: Iterable[str]):
+        for lang in languages:
+            if lang in self._locks:
+                self.get(lang)
+            else:
+                logging.warning(f"Cannot preload the models of the unsupported language {lang}")
+
+    def unload_idle(self) -> List[str]:
+        """
+        Unloads the models unused for longer than the TTL
+
+        Returns:
+            List[str]: the languages of the unloaded models
+        """
+        if not self.ttl:
+            return []
+        unloaded = []
+        for lang, lock in self._locks.items():
+            with lock:
+                if lang in self._models and time.monotonic() - self._last_used[lang] > self.ttl:
+                    # Freed once the analyses still using them are done
+                    del self._models[lang]
+                    unloaded.append(lang)
+        return unloaded
+
+    def loaded(self) -> List[str]:
+        return sorted(self._models)
+
+
 class NlpPreprocess:
+    # spaCy model and NLTK stop words language of each supported language
+    LANGUAGES = {
+        "en": ("en_core_web_md", "english"),
+        "fr": ("fr_core_news_md", "french"),
+    }
+    # Only the part-of-speech tags and lemmas are used, these components are not loaded
+    UNUSED_COMPONENTS = ["parser", "senter", "ner"]
+
     def __init__(self, config):
         self.nlp_enabled = config["use_nlp_preprocess"]
+        self.batch_size = config.get("nlp_batch_size") or 64
+        self.n_process = config.get("nlp_n_process") or 1
+        self.pipelines = LanguageModels(
+            self._load_pipeline, self.LANGUAGES, config.get("nlp_models_ttl") or 0
+        )
         if self.nlp_enabled:
-            nlp_en = spacy.load("en_core_web_md")
-            nlp_fr = spacy.load("fr_core_news_md")
-            self.pipelines = {
-                "en": nlp_en,
-                "fr": nlp_fr,
+            self.stop_words = {
+                lang: frozenset(stopwords.words(nltk_lang))
+                for lang, (_, nltk_lang) in self.LANGUAGES.items()
             }
+            self.pipelines.preload(config.get("nlp_preload_languages", self.LANGUAGES))
+
+    async def load_pipelines(self, languages: Iterable[str]):
+        """
+        Loads the pipelines of languages from a coroutine, see LanguageModels.load
+        """
+        if self.nlp_enabled:
+            await asyncio.gather(
+                *(self.pipelines.load(lang) for lang in set(languages) if lang in self.LANGUAGES)
+            )
+
+    def _load_pipeline(self, lang: str):
+        return spacy.load(self.LANGUAGES[lang][0], exclude=self.UNUSED_COMPONENTS)
+
+    def _words(self, doc, lang: str) -> List[str]:
+        # Remove stop words and punctuation
+        return [
+            token.lemma_
+            for token in doc
+            if token.lemma_ not in self.stop_words[lang] and token.pos_ != "PUNCT"
+        ]
 
     def text_preprocess(self, text: str, lang: str = "en") -> Optional[List[str]]:
         """
@@ -35,44 +162,115 @@ class NlpPreprocess:
             - List of processed tokens
             - None if preprocess is disabled
         """
-        if lang == "en":
-            nltk_lang = "english"
-        elif lang == "fr":
-            nltk_lang = "french"
-        else:
+        if lang not in self.LANGUAGES:
             raise NotImplementedError()
 
         if self.nlp_enabled:
-            doc = self.pipelines[lang](text)
-            pos_lemmas = [[token.pos_, token.lemma_] for token in doc]
-
-            # Remove stop words and punctuation
-            stop_words = set(stopwords.words(nltk_lang))
-            word_tokens = [w[1] for w in pos_lemmas if w[1] not in stop_words and w[0] != 'PUNCT']
-
-            return word_tokens
+            return self._words(self.pipelines.get(lang)(text), lang)
         else:
             return None
 
+    def texts_preprocess(
+        self, texts: List[Tuple[str, str]], n_process: int = 1
+    ) -> List[Optional[List[str]]]:
+        """
+        Does the same preprocessing as text_preprocess on several texts,
+        running each language pipeline on its texts by batches.
+
+        Args:
+            - texts: the texts to preprocess with their two-character ISO639-1 language code
+            - n_process: the number of processes running the pipelines, only worth
+              starting them for a large number of texts
+
+        Returns:
+            - The list of processed tokens of each text, in the same order,
+              None for the texts of an unsupported language
+            - None for every text if preprocess is disabled
+        """
+        results: List[Optional[List[str]]] = [None] * len(texts)
+        if not self.nlp_enabled:
+            return results
+
+        for lang in self.LANGUAGES:
+            indexes = [i for i, (_, text_lang) in enumerate(texts) if text_lang == lang]
+            if not indexes:
+                continue
+            docs = self.pipelines.get(lang).pipe(
+                (texts[i][0] for i in indexes),
+                batch_size=self.batch_size,
+                n_process=n_process,
+            )
+            for i, doc in zip(indexes, docs):
+                results[i] = self._words(doc, lang)
+        return results
+
 
 class SentimentAnalysis:
+    # Model folder of each supported language
+    LANGUAGES = {
+        "en": "english",
+        "fr": "french",
+    }
+    # TensorFlow model class of each supported language
+    TF_MODELS = {
+        "en": TFRobertaForSequenceClassification,
+        "fr": TFCamembertForSequenceClassification,
+    }
+    BACKENDS = ["tensorflow", "onnx"]
+
     def __init__(self, config):
         self.analysis_enabled = config.get("use_sentiment_analysis")
+        self.backend = config.get("sentiment_analysis_backend") or "tensorflow"
+        if self.backend not in self.BACKENDS:
+            raise ValueError(
+                f"Unknown sentiment analysis backend '{self.backend}', expected one of {', '.join(self.BACKENDS)}"
+            )
+        self.models_folder = config.get("sentiment_analysis_models_folder")
+        self.quantize = config.get("sentiment_onnx_quantize", True)
+        self.models = LanguageModels(
+            self._load_model, self.LANGUAGES, config.get("nlp_models_ttl") or 0
+        )
         if self.analysis_enabled:
-            en_folder = os.path.join(config["sentiment_analysis_models_folder"], "english")
-            model_en = TFRobertaForSequenceClassification.from_pretrained(en_folder)
-            tokenizer_en = AutoTokenizer.from_pretrained(en_folder)
-            pipeline_en = pipeline("sentiment-analysis", model=model_en, tokenizer=tokenizer_en)
-            
-            fr_folder = os.path.join(config["sentiment_analysis_models_folder"], "french")
-            model_fr = TFCamembertForSequenceClassification.from_pretrained(fr_folder)
-            tokenizer_fr = AutoTokenizer.from_pretrained(fr_folder)
-            pipeline_fr = pipeline("sentiment-analysis", model=model_fr, tokenizer=tokenizer_fr)
-
-            self.pipelines = {
-                "en": pipeline_en,
-                "fr": pipeline_fr,
-            }
+            self.models.preload(config.get("nlp_preload_languages", self.LANGUAGES))
+
+    async def load_models(self, lang: str):
+        """
+        Loads the models of a language from a coroutine, see LanguageModels.load
+        """
+        if self.analysis_enabled and lang in self.LANGUAGES:
+            await self.models.load(lang)
+
+    def _load_model(self, lang: str):
+        folder = os.path.join(self.models_folder, self.LANGUAGES[lang])
+        tokenizer = AutoTokenizer.from_pretrained(folder)
+        if self.backend == "onnx":
+            # Exported by init_nlp, see utils.onnx_sentiment
+            return OnnxSentimentModel(folder, self.quantize), tokenizer
+        return self.TF_MODELS[lang].from_pretrained(folder), tokenizer
+
+    def model_version(self) -> str:
+        """
+        Identifies the models giving the sentiments, to tell apart the results
+        of other models, other backends, or of models downloaded again.
+
+        Returns:
+            str: a hash of the backend and of the model files, "disabled" if analysis is disabled
+        """
+        if not self.analysis_enabled:
+            return "disabled"
+        parts = [self.backend, str(self.quantize) if self.backend == "onnx" else ""]
+        for lang, folder_name in self.LANGUAGES.items():
+            folder = os.path.join(self.models_folder, folder_name)
+            if self.backend == "onnx":
+                path = onnx_model_path(folder, self.quantize)
+            else:
+                path = os.path.join(folder, "tf_model.h5")
+            if os.path.exists(path):
+                stat = os.stat(path)
+                parts.append(f"{lang}:{stat.st_size}:{int(stat.st_mtime)}")
+            else:
+                parts.append(f"{lang}:missing")
+        return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
 
     def analyze(self, text: str, lang: str = "en") -> Tuple[Optional[SentimentEnum], Optional[float]]:
         """
@@ -86,11 +284,43 @@ class SentimentAnalysis:
             - The sentiment POSITIVE or NEGATIVE and the confidence score of the model
             - (None, None) if sentiment analysis is disabled
         """
-        if self.analysis_enabled:
-            if lang not in ["en", "fr"]:
-                raise NotImplementedError()
+        return self.analyze_batch([text], lang)[0]
+
+    def analyze_batch(
+        self, texts: List[str], lang: str = "en"
+    ) -> List[Tuple[Optional[SentimentEnum], Optional[float]]]:
+        """
+        Analyzes the sentiment of several texts of the same language in a single pass
+        of the model, the shorter texts being padded to the length of the longest one.
+
+        Args:
+            - texts (List[str]): the texts to analyze, better of similar lengths
+            - lang (str): the two-character ISO639-1 language code
+
+        Returns:
+            - The sentiment and the confidence score of each text, in the same order
+            - (None, None) for every text if sentiment analysis is disabled
+        """
+        if not self.analysis_enabled:
+            return [(None, None)] * len(texts)
+        if lang not in self.LANGUAGES:
+            raise NotImplementedError()
+        if not texts:
+            return []
 
-            result = self.pipelines[lang](text)
-            return SentimentEnum(result[0]['label']), result[0]['score']
+        model, tokenizer = self.models.get(lang)
+        # The texts longer than the model input are truncated instead of failing the whole batch
+        if self.backend == "onnx":
+            inputs = tokenizer(texts, padding=True, truncation=True, return_tensors="np")
+            logits = model(**inputs)
         else:
-            return None, None
+            inputs = tokenizer(texts, padding=True, truncation=True, return_tensors="tf")
+            logits = model(**inputs).logits.numpy()
+        # Softmax, as done by the sentiment-analysis pipeline
+        scores = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        scores /= scores.sum(axis=-1, keepdims=True)
+        labels = scores.argmax(axis=-1)
+        return [
+            (SentimentEnum(model.config.id2label[int(label)]), float(score[label]))
+            for label, score in zip(labels, scores)
+        ]
@@ -0,0 +1,86 @@
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+from transformers import AutoConfig, AutoTokenizer, TFAutoModelForSequenceClassification
+
+# Files written next to the saved TensorFlow model of each language
+ONNX_MODEL = "model.onnx"
+QUANTIZED_MODEL = "model.int8.onnx"
+
+
+def onnx_model_path(folder: str, quantize: bool) -> str:
+    return os.path.join(folder, QUANTIZED_MODEL if quantize else ONNX_MODEL)
+
+
+def export_onnx_model(folder: str, quantize: bool = True) -> str:
+    """
+    Exports the TensorFlow sentiment analysis model saved in a folder to ONNX,
+    and quantizes its weights to int8 if asked. Does nothing for the files already exported.
+
+    Args:
+        folder (str): the folder of the model and tokenizer saved with save_pretrained.
+        quantize (bool): whether to also write the model with int8 weights.
+
+    Returns:
+        str: the path of the ONNX model to run.
+    """
+    onnx_path = onnx_model_path(folder, False)
+    if not os.path.exists(onnx_path):
+        # Only needed once, tf2onnx is imported by the export
+        from transformers.onnx import FeaturesManager, export
+
+        logging.info(f"Exporting the sentiment analysis model of {folder} to ONNX...")
+        model = TFAutoModelForSequenceClassification.from_pretrained(folder)
+        tokenizer = AutoTokenizer.from_pretrained(folder)
+        _, onnx_config_factory = FeaturesManager.check_supported_model_or_raise(
+            model, feature="sequence-classification"
+        )
+        onnx_config = onnx_config_factory(model.config)
+        export(
+            preprocessor=tokenizer,
+            model=model,
+            config=onnx_config,
+            opset=onnx_config.default_onnx_opset,
+            output=Path(onnx_path),
+        )
+
+    if not quantize:
+        return onnx_path
+    quantized_path = onnx_model_path(folder, True)
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logging.info(f"Quantizing the ONNX sentiment analysis model of {folder} to int8...")
+        # The activations are quantized at run time, no calibration data is needed
+        quantize_dynamic(onnx_path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+class OnnxSentimentModel:
+    """
+    Runs a sentiment analysis model exported with export_onnx_model in ONNX Runtime.
+
+    Called like the TensorFlow models with the inputs of their tokenizer, as NumPy arrays,
+    and returns the logits of the labels in config.id2label.
+    """
+
+    def __init__(self, folder: str, quantize: bool = True):
+        import onnxruntime
+
+        path = onnx_model_path(folder, quantize)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No ONNX model at {path}, see export_onnx_model")
+        self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.config = AutoConfig.from_pretrained(folder)
+
+    def __call__(self, **inputs) -> np.ndarray:
+        # The exported graph takes int64 ids, and not the inputs unused by the model
+        feed = {
+            name: np.asarray(value, dtype=np.int64)
+            for name, value in inputs.items()
+            if name in self.input_names
+        }
+        return self.session.run(None, feed)[0]
@@ -0,0 +1,219 @@
+import asyncio
+from collections import OrderedDict
+import hashlib
+import logging
+import re
+import time
+from typing import Dict, Optional, Tuple
+import unicodedata
+
+from models.comment import SentimentEnum
+from repository.sqlite_repository import SQLiteRepository
+from utils.nlp import SentimentAnalysis
+
+# language, sentiment, sentiment score
+SentimentResult = Tuple[str, Optional[SentimentEnum], Optional[float]]
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes a comment so that the same phrase typed differently gets the same cache key:
+    Unicode compatibility form, case folded, without leading, trailing and repeated spaces.
+    """
+    return _SPACES.sub(" ", unicodedata.normalize("NFKC", text)).strip().casefold()
+
+
+class SentimentCache:
+    """
+    Bounded cache of the language and sentiment of the analyzed texts,
+    by hash of their normalized text, so that repeated phrases are not analyzed again.
+
+    The most recently used results are kept in memory. With the persistent tier enabled,
+    the results are also saved in the database, where they outlive the restarts. They are
+    written by a background task, by batches, and the lookups of the texts analyzed together
+    are read in a single query.
+    Each result is tied to the version of the models which gave it, the results
+    of previous models are ignored, and removed from the database at startup.
+    The version is checked again every VERSION_CHECK_INTERVAL seconds, in case the model
+    files are replaced while running.
+    """
+
+    # Seconds between two checks of the version of the model files
+    VERSION_CHECK_INTERVAL = 60
+    # Longest time a result waits to be saved in the persistent tier, in seconds
+    FLUSH_INTERVAL = 1
+    # Number of waiting results saved right away
+    FLUSH_SIZE = 100
+
+    def __init__(self, sqlite_repo: SQLiteRepository, sentiment_analysis: SentimentAnalysis, config):
+        self.sqlite_repo = sqlite_repo
+        self.sentiment_analysis = sentiment_analysis
+        self.max_size = config.get("sentiment_cache_size") or 0
+        self.persistent = bool(self.max_size) and config.get("sentiment_cache_persistent", False)
+        self.persistent_max_size = config.get("sentiment_cache_persistent_size") or 100000
+
+        self.model_version = sentiment_analysis.model_version()
+        self._version_checked = time.monotonic()
+        self._results: "OrderedDict[str, SentimentResult]" = OrderedDict()
+        # Results not saved in the persistent tier yet, by key
+        self._unsaved: Dict[str, SentimentResult] = {}
+        # Lookups of the persistent tier gathered for the next query, by key
+        self._lookups: Optional[Dict[str, asyncio.Future]] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._flush_now: Optional[asyncio.Event] = None
+
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    async def start(self):
+        """
+        Prepares the persistent tier, if enabled, and starts the background task saving the results
+        """
+        if not self.persistent:
+            return
+        await self.sqlite_repo.create_sentiment_cache(self.model_version, self.persistent_max_size)
+        self._flush_now = asyncio.Event()
+        self._worker = asyncio.create_task(self._run())
+        logging.info(f"Sentiment cache persisted for the models {self.model_version}")
+
+    async def stop(self):
+        """
+        Saves the waiting results and stops the background task
+        """
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        await self._flush()
+
+    async def _check_model_version(self):
+        # The model files may be replaced while running, and loaded again after being idle
+        if time.monotonic() - self._version_checked < self.VERSION_CHECK_INTERVAL:
+            return
+        self._version_checked = time.monotonic()
+        # Reads the model files, out of the event loop
+        model_version = await asyncio.get_running_loop().run_in_executor(
+            None, self.sentiment_analysis.model_version
+        )
+        if model_version != self.model_version:
+            logging.info(f"Sentiment models changed to {model_version}, clearing the sentiment cache")
+            self.model_version = model_version
+            self._results.clear()
+            self._unsaved.clear()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(normalize_text(text).encode()).hexdigest()
+
+    async def get(self, text: str) -> Optional[SentimentResult]:
+        """
+        Returns the cached analysis of a text, None if it was not analyzed yet
+        """
+        if not self.max_size:
+            return None
+        await self._check_model_version()
+        key = self.key(text)
+        result = self._results.get(key)
+        if result is not None:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return result
+
+        if self.persistent:
+            result = self._unsaved.get(key) or await self._lookup(key)
+            if result is not None:
+                self._remember(key, result)
+                self.persistent_hits += 1
+                return result
+        self.misses += 1
+        return None
+
+    async def put(self, text: str, result: SentimentResult):
+        """
+        Caches the analysis of a text
+        """
+        if not self.max_size:
+            return
+        key = self.key(text)
+        self._remember(key, result)
+        if self.persistent:
+            self._unsaved[key] = result
+            if self._worker is None:
+                # No background task to save it later
+                await self._flush()
+            elif len(self._unsaved) >= self.FLUSH_SIZE:
+                self._flush_now.set()
+
+    async def _lookup(self, key: str) -> Optional[SentimentResult]:
+        """
+        Reads a result from the persistent tier, along with the results
+        looked up by the other coroutines during the same iteration of the event loop
+        """
+        loop = asyncio.get_running_loop()
+        if self._lookups is not None:
+            # Read by the query being gathered
+            future = self._lookups.setdefault(key, loop.create_future())
+            return await future
+        self._lookups = lookups = {key: loop.create_future()}
+        try:
+            await asyncio.sleep(0)
+            self._lookups = None
+            results = await self.sqlite_repo.get_cached_sentiments(list(lookups), self.model_version)
+        except asyncio.CancelledError:
+            self._lookups = None
+            for future in lookups.values():
+                future.cancel()
+            raise
+        except Exception as exception:
+            for future in lookups.values():
+                future.set_exception(exception)
+        else:
+            for lookup_key, future in lookups.items():
+                future.set_result(results.get(lookup_key))
+        return await lookups[key]
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self._flush()
+
+    async def _flush(self):
+        if not self._unsaved:
+            return
+        unsaved, self._unsaved = self._unsaved, {}
+        try:
+            await self.sqlite_repo.save_cached_sentiments(self.model_version, unsaved)
+        except Exception:
+            # Still in memory, analyzed again after a restart
+            logging.exception(f"Could not save {len(unsaved)} results in the sentiment cache")
+
+    def _remember(self, key: str, result: SentimentResult):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        if len(self._results) > self.max_size:
+            # Least recently used first
+            self._results.popitem(last=False)
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "model_version": self.model_version,
+            "size": len(self._results),
+            "max_size": self.max_size,
+            "persistent": self.persistent,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.persistent_hits) / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,218 @@
+import asyncio
+from collections import Counter, deque
+import logging
+import time
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models.comment import SentimentEnum
+from utils.inference_pool import InferencePool
+from utils.nlp import SentimentAnalysis, detect_language
+from utils.sentiment_cache import SentimentCache
+
+# text, future of its result, time it was queued
+PendingText = Tuple[str, asyncio.Future, float]
+
+
+class SentimentScheduler:
+    """
+    Micro-batching of the sentiment analysis.
+
+    The texts to analyze are queued by language, and a background task runs them
+    through the models by batches, once batch_size texts of a language are waiting
+    or timeout milliseconds after the oldest waiting text. The texts queued while the
+    models are busy are sorted by length before being split into batches, so that
+    the texts of a batch need little padding.
+    The batches run in the inference pool, the event loop keeps serving the requests.
+    """
+
+    # Number of recent texts the latency percentiles are computed on
+    LATENCY_WINDOW = 1000
+
+    def __init__(
+        self,
+        sentiment_analysis: SentimentAnalysis,
+        config,
+        sentiment_cache: Optional[SentimentCache] = None,
+        inference_pool: Optional[InferencePool] = None,
+    ):
+        self.sentiment_analysis = sentiment_analysis
+        self.sentiment_cache = sentiment_cache
+        # Without a pool, the models run in a thread of their own
+        self.inference_pool = inference_pool or InferencePool(sentiment_analysis, None, {})
+        self.batch_size = config.get("sentiment_inference_batch_size") or 8
+        self.timeout_ms = config.get("sentiment_inference_timeout_ms") or 20
+        self.timeout = self.timeout_ms / 1000
+
+        self._pending: Dict[str, List[PendingText]] = {
+            lang: [] for lang in SentimentAnalysis.LANGUAGES
+        }
+        self._worker: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._closing = False
+
+        self.analyzed = 0
+        self.errors = 0
+        self.batches = 0
+        self.batch_sizes: Counter = Counter()
+        self.latencies: Deque[float] = deque(maxlen=self.LATENCY_WINDOW)
+
+    def start(self):
+        """
+        Starts the background task, to be called from the event loop serving the requests
+        """
+        if not self.sentiment_analysis.analysis_enabled:
+            return
+        self._wake = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._closing = False
+        self._worker = asyncio.create_task(self._run())
+        logging.info(
+            f"Sentiment scheduler started, batches of {self.batch_size} texts every {self.timeout}s at most"
+        )
+
+    async def stop(self):
+        """
+        Analyzes the waiting texts and stops the background task
+        """
+        if self._worker is None:
+            return
+        self._closing = True
+        self._batch_full.set()
+        self._wake.set()
+        await self._worker
+        self._worker = None
+        logging.info(f"Sentiment scheduler stopped, {self.analyzed} texts analyzed")
+
+    async def analyze(self, text: str, lang: str = "en") -> Tuple[Optional[SentimentEnum], Optional[float]]:
+        """
+        Analyzes the sentiment of a text with the next batch of its language,
+        see SentimentAnalysis.analyze
+        """
+        if not self.sentiment_analysis.analysis_enabled:
+            return None, None
+        if lang not in self._pending:
+            raise NotImplementedError()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[lang].append((text, future, time.perf_counter()))
+        if self._worker is None or self._closing:
+            # No background task to gather the batches
+            await self._run_pending()
+        else:
+            self._wake.set()
+            if len(self._pending[lang]) >= self.batch_size:
+                self._batch_full.set()
+        return await future
+
+    async def analyze_comment(
+        self, text: str, language: Optional[str] = None, raise_errors: bool = False
+    ) -> Tuple[str, Optional[SentimentEnum], Optional[float]]:
+        """
+        Detects the language of a comment, unless it is given, and analyzes its sentiment,
+        unless the same text is in the sentiment cache.
+
+        Args:
+            - text: the text of the comment
+            - language: the two-character ISO639-1 code of its language, detected if None
+            - raise_errors: whether the failures of the models are raised instead of giving
+              (None, None), for the callers which try the analysis again later
+
+        Returns:
+            - The two-character ISO639-1 code of the language, 'unknown' if it cannot be detected
+            - The sentiment and the confidence score of the model, (None, None) if the comment
+              has no text, its language is not supported or it could not be analyzed
+        """
+        if not len(text):
+            return language or detect_language(text), None, None
+        if self.sentiment_cache is not None:
+            cached = await self.sentiment_cache.get(text)
+            if cached is not None:
+                return cached
+
+        if language is None:
+            language = detect_language(text)
+        try:
+            sentiment, score = await self.analyze(text, language)
+        except Exception as exception:
+            # An unsupported language is not worth trying again
+            if raise_errors and not isinstance(exception, NotImplementedError):
+                raise
+            logging.error(f"Could not analyze sentiment of comment of language {language}")
+            logging.debug(f"Unable to do sentiment analysis on this comment: {text}")
+            # Not cached, analyzed again next time
+            return language, None, None
+
+        if self.sentiment_cache is not None:
+            await self.sentiment_cache.put(text, (language, sentiment, score))
+        return language, sentiment, score
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            oldest = min(
+                (queued for items in self._pending.values() for _, _, queued in items),
+                default=time.perf_counter(),
+            )
+            # Gives the next texts some time to arrive, unless a batch is already full
+            delay = oldest + self.timeout - time.perf_counter()
+            if delay > 0 and not self._batch_full.is_set():
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            if not self._closing:
+                self._wake.clear()
+                self._batch_full.clear()
+            await self._run_pending()
+            if self._closing:
+                return
+
+    async def _run_pending(self):
+        batches = []
+        for lang, items in self._pending.items():
+            if not items:
+                continue
+            self._pending[lang] = []
+            items.sort(key=lambda item: len(item[0]))
+            for start in range(0, len(items), self.batch_size):
+                batches.append((lang, items[start:start + self.batch_size]))
+        # The batches run in parallel when the pool has several workers
+        await asyncio.gather(*(self._run_batch(lang, batch) for lang, batch in batches))
+
+    async def _run_batch(self, lang: str, batch: List[PendingText]):
+        try:
+            results = await self.inference_pool.analyze_batch([text for text, _, _ in batch], lang)
+        except Exception as exception:
+            self.errors += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exception)
+            return
+
+        now = time.perf_counter()
+        for (_, future, queued), result in zip(batch, results):
+            self.latencies.append(now - queued)
+            if not future.done():
+                future.set_result(result)
+        self.analyzed += len(batch)
+        self.batches += 1
+        self.batch_sizes[len(batch)] += 1
+
+    def metrics(self) -> dict:
+        latencies = np.array(self.latencies) * 1000
+        return {
+            "batch_size": self.batch_size,
+            "timeout_ms": self.timeout_ms,
+            "depth": sum(len(items) for items in self._pending.values()),
+            "analyzed": self.analyzed,
+            "errors": self.errors,
+            "batches": self.batches,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "latency_ms": {
+                name: round(float(np.percentile(latencies, q)), 1) if len(latencies) else None
+                for name, q in [("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)]
+            },
+        }
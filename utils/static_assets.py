@@ -0,0 +1,151 @@
+import gzip
+import hashlib
+import logging
+import os
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Response, status
+
+try:
+    import brotli
+except ImportError:
+    # In requirements.txt, the assets are only precompressed with gzip without it
+    brotli = None
+
+MEDIA_TYPES = {
+    ".css": "text/css; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+}
+
+
+class StaticAsset:
+    """
+    A static file with its precompressed variants, by content encoding
+    """
+
+    def __init__(self, file_name: str, content: bytes):
+        self.media_type = MEDIA_TYPES.get(
+            os.path.splitext(file_name)[1], "application/octet-stream"
+        )
+        self.digest = hashlib.sha256(content).hexdigest()[:16]
+        name, extension = os.path.splitext(file_name)
+        self.hashed_name = f"{name}.{self.digest}{extension}"
+
+        self.variants: Dict[str, bytes] = {"identity": content}
+        self.variants["gzip"] = gzip.compress(content, compresslevel=9, mtime=0)
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(content)
+
+    def etag(self, encoding: str) -> str:
+        # Each encoded representation needs its own strong ETag
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"{self.digest}{suffix}"'
+
+
+class StaticAssets:
+    """
+    Serves the CSS and JavaScript libraries of the report pages under content-hashed names,
+    so that browsers can cache them for good instead of receiving them inlined in every report
+    """
+
+    _ASSET_FILES = [
+        "bootstrap.min.css",
+        "jquery-3.6.1.min.js",
+        "plotly-2.14.0.min.js",
+        "bootstrap.bundle.min.js",
+    ]
+    # A hashed name always has the same content
+    _CACHE_CONTROL = "public, max-age=31536000, immutable"
+    # Preferred encodings first
+    _ENCODINGS = ["br", "gzip", "identity"]
+
+    def __init__(self, url_path: str = "", folder: Optional[str] = None, files: Optional[List[str]] = None):
+        if folder is None:
+            folder = os.path.join(
+                os.path.dirname(os.path.realpath(__file__)), "../templates/"
+            )
+        # Path the assets are served under, set where their router is mounted
+        self.url_path = url_path
+        self.assets: Dict[str, StaticAsset] = {}
+        # Hashed name of each asset by original file name
+        self._hashed_names: Dict[str, str] = {}
+
+        for file_name in files if files is not None else self._ASSET_FILES:
+            with open(os.path.join(folder, file_name), "rb") as f:
+                asset = StaticAsset(file_name, f.read())
+            self.assets[asset.hashed_name] = asset
+            self._hashed_names[file_name] = asset.hashed_name
+        logging.info(f"{len(self.assets)} static assets ready")
+        if brotli is None:
+            logging.warning("The brotli package is not installed, the static assets are only compressed with gzip")
+
+    @property
+    def urls(self) -> Dict[str, str]:
+        """
+        URL of each asset by original file name, for the templates
+        """
+        return {
+            file_name: f"{self.url_path}/{hashed_name}"
+            for file_name, hashed_name in self._hashed_names.items()
+        }
+
+    @staticmethod
+    def _accepted_encodings(accept_encoding: Optional[str]) -> List[str]:
+        accepted = ["identity"]
+        for item in (accept_encoding or "").split(","):
+            parts = [part.strip() for part in item.split(";")]
+            if not parts[0]:
+                continue
+            quality = 1.0
+            for param in parts[1:]:
+                if param.startswith("q="):
+                    try:
+                        quality = float(param[2:])
+                    except ValueError:
+                        quality = 0
+            if quality > 0:
+                accepted.append(parts[0].lower())
+        return accepted
+
+    def get_response(
+        self,
+        hashed_name: str,
+        if_none_match: Optional[str] = None,
+        accept_encoding: Optional[str] = None,
+    ) -> Response:
+        """
+        Builds the response for an asset, in the best encoding accepted by the client
+
+        Raises:
+            HTTPException: 404 if there is no asset with this name
+        """
+        asset = self.assets.get(hashed_name)
+        if asset is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Static file not found",
+            )
+
+        accepted = self._accepted_encodings(accept_encoding)
+        encoding = next(
+            e for e in self._ENCODINGS if e in asset.variants and e in accepted
+        )
+        etag = asset.etag(encoding)
+        headers = {
+            "Cache-Control": self._CACHE_CONTROL,
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+        }
+
+        if if_none_match is not None:
+            tags = [tag.strip().replace("W/", "", 1) for tag in if_none_match.split(",")]
+            if etag in tags or "*" in tags:
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(
+            content=asset.variants[encoding],
+            media_type=asset.media_type,
+            headers=headers,
+        )
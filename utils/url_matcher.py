@@ -0,0 +1,96 @@
+import re
+from collections import deque
+from typing import List, Optional, Tuple
+
+
+def _is_word_char(char: str) -> bool:
+    # Same definition as the \w class of the re module for str patterns
+    return char.isalnum() or char == "_"
+
+
+def _is_boundary(text: str, position: int) -> bool:
+    """
+    Whether the regex \\b assertion holds in text right before the given position
+    """
+    before = position > 0 and _is_word_char(text[position - 1])
+    after = position < len(text) and _is_word_char(text[position])
+    return before != after
+
+
+class FeatureUrlMatcher:
+    """
+    Finds which of a list of feature URLs appears in a given URL.
+
+    Gives the same result as trying re.search(fr"\\b{re.escape(feature_url)}\\b", url)
+    on each feature URL in order and keeping the first one that matches,
+    but scans the URL a single time whatever the number of feature URLs,
+    using an Aho-Corasick automaton built once.
+    """
+
+    def __init__(self, feature_urls: List[str]):
+        # Automaton nodes: transitions, failure link, and (pattern index, pattern length)
+        # of the patterns ending at the node sorted by index
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, int]]] = [[]]
+        # An empty feature URL matches any URL with a word boundary
+        self._empty_index: Optional[int] = None
+
+        for index, feature_url in enumerate(feature_urls):
+            if feature_url == "":
+                if self._empty_index is None:
+                    self._empty_index = index
+                continue
+            node = 0
+            for char in feature_url:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[node][char] = next_node
+                node = next_node
+            # A duplicated feature URL can never win over its first occurrence
+            if not self._output[node]:
+                self._output[node].append((index, len(feature_url)))
+
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                # A node also ends every pattern ending at its failure node
+                self._output[child] = sorted(
+                    self._output[child] + self._output[self._fail[child]]
+                )
+
+    def match(self, url: str) -> Optional[int]:
+        """
+        Returns the index of the first feature URL found in the given URL
+        between word boundaries, or None if there is none
+        """
+        best = None
+        if self._empty_index is not None and re.search(r"\b", url):
+            best = self._empty_index
+
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for position, char in enumerate(url):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index, length in output[node]:
+                if best is not None and index >= best:
+                    break
+                if _is_boundary(url, position - length + 1) and _is_boundary(url, position + 1):
+                    best = index
+                    break
+        return best